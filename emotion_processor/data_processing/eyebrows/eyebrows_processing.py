@@ -2,6 +2,8 @@
 import numpy as np
 # Importa ABC (Abstract Base Class) y abstractmethod para crear clases abstractas
 from abc import ABC, abstractmethod
+# Importa MappingProxyType para retornar métricas de solo lectura
+from types import MappingProxyType
 
 
 # Clase abstracta base para calcular distancias entre puntos
@@ -50,8 +52,6 @@ class EyeBrowsPointsProcessing:
         self.arch_calculator = arch_calculator
         # Almacena el calculador de distancias
         self.distance_calculator = distance_calculator
-        # Diccionario para almacenar todas las métricas calculadas de las cejas
-        self.eyebrows: dict = {}
 
     # Calcula todas las distancias relevantes entre puntos de las cejas
     def calculate_distances(self, eyebrows_points: dict):
@@ -79,32 +79,35 @@ class EyeBrowsPointsProcessing:
                 left_eyebrow_to_forehead_distance, distance_between_eyebrows, distance_between_eyebrow_forehead)
 
     # Método principal que procesa todos los puntos de las cejas y calcula todas las métricas
+    # No guarda estado: cada llamada crea su propio diccionario (reentrante entre hilos)
     def main(self, eyebrows_points: dict):
+        # Diccionario nuevo con todas las métricas calculadas de las cejas
+        eyebrows: dict = {}
         # Calcula el arco (curvatura) de la ceja derecha usando los puntos del arco derecho
         right_eyebrow_arch = self.arch_calculator.calculate_eyebrow_arch(eyebrows_points['right arch'])
         # Calcula el arco (curvatura) de la ceja izquierda usando los puntos del arco izquierdo
         left_eyebrow_arch = self.arch_calculator.calculate_eyebrow_arch(eyebrows_points['left arch'])
         # Almacena el valor del arco de la ceja derecha en el diccionario
-        self.eyebrows['arch_right'] = right_eyebrow_arch
+        eyebrows['arch_right'] = right_eyebrow_arch
         # Almacena el valor del arco de la ceja izquierda en el diccionario
-        self.eyebrows['arch_left'] = left_eyebrow_arch
+        eyebrows['arch_left'] = left_eyebrow_arch
 
         # Calcula todas las distancias y las desempaqueta en variables individuales
         (right_eye_distance, left_eye_distance, right_forehead_distance, left_forehead_distance, eyebrows_distance,
          eyebrow_distance_forehead) = (self.calculate_distances(eyebrows_points))
         # Almacena la distancia entre la ceja derecha y el ojo derecho
-        self.eyebrows['eye_right_distance'] = right_eye_distance
+        eyebrows['eye_right_distance'] = right_eye_distance
         # Almacena la distancia entre la ceja izquierda y el ojo izquierdo
-        self.eyebrows['eye_left_distance'] = left_eye_distance
+        eyebrows['eye_left_distance'] = left_eye_distance
         # Almacena la distancia entre la ceja derecha y la frente
-        self.eyebrows['forehead_right_distance'] = right_forehead_distance
+        eyebrows['forehead_right_distance'] = right_forehead_distance
         # Almacena la distancia entre la ceja izquierda y la frente
-        self.eyebrows['forehead_left_distance'] = left_forehead_distance
+        eyebrows['forehead_left_distance'] = left_forehead_distance
         # Almacena la distancia entre ambas cejas
-        self.eyebrows['eyebrows_distance'] = eyebrows_distance
+        eyebrows['eyebrows_distance'] = eyebrows_distance
         # Almacena la distancia entre el punto medio de las cejas y la frente
-        self.eyebrows['eyebrow_distance_forehead'] = eyebrow_distance_forehead
+        eyebrows['eyebrow_distance_forehead'] = eyebrow_distance_forehead
         # Línea comentada que imprimiría todas las métricas redondeadas a 4 decimales
-        #print(f'Eyebrows: { {k: (round(float(v),4)) for k,v in self.eyebrows.items()}}')
-        # Retorna el diccionario con todas las métricas calculadas de las cejas
-        return self.eyebrows
+        #print(f'Eyebrows: { {k: (round(float(v),4)) for k,v in eyebrows.items()}}')
+        # Retorna las métricas calculadas de las cejas como vista de solo lectura
+        return MappingProxyType(eyebrows)
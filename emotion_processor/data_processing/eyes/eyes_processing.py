@@ -2,6 +2,8 @@
 import numpy as np
 # Importa ABC (Abstract Base Class) y abstractmethod para crear clases abstractas
 from abc import ABC, abstractmethod
+# Importa MappingProxyType para retornar métricas de solo lectura
+from types import MappingProxyType
 
 
 # Clase abstracta base para calcular distancias entre puntos
@@ -50,8 +52,6 @@ class EyesPointsProcessing:
         self.arch_calculator = arch_calculator
         # Almacena el calculador de distancias
         self.distance_calculator = distance_calculator
-        # Diccionario para almacenar todas las métricas calculadas de los ojos
-        self.eyes: dict = {}
 
     # Calcula todas las distancias relevantes de los párpados
     def calculate_distances(self, eyebrows_points: dict):
@@ -72,28 +72,31 @@ class EyesPointsProcessing:
         return right_upper_eyelid, left_upper_eyelid, right_lower_eyelid, left_lower_eyelid
 
     # Método principal que procesa todos los puntos de los ojos y calcula todas las métricas
+    # No guarda estado: cada llamada crea su propio diccionario (reentrante entre hilos)
     def main(self, eyes_points: dict):
+        # Diccionario nuevo con todas las métricas calculadas de los ojos
+        eyes: dict = {}
         # Calcula el arco (curvatura) del ojo derecho usando los puntos del arco derecho
         right_eyes_arch = self.arch_calculator.calculate_eyes_arch(eyes_points['right arch'])
         # Calcula el arco (curvatura) del ojo izquierdo usando los puntos del arco izquierdo
         left_eyes_arch = self.arch_calculator.calculate_eyes_arch(eyes_points['left arch'])
         # Almacena el valor del arco del ojo derecho en el diccionario
-        self.eyes['arch_right'] = right_eyes_arch
+        eyes['arch_right'] = right_eyes_arch
         # Almacena el valor del arco del ojo izquierdo en el diccionario
-        self.eyes['arch_left'] = left_eyes_arch
+        eyes['arch_left'] = left_eyes_arch
 
         # Calcula todas las distancias de los párpados y las desempaqueta en variables individuales
         (right_upper_eyelid_distance, left_upper_eyelid_distance, right_lower_eyelid_distance,
          left_lower_eyelid_distance) = (self.calculate_distances(eyes_points))
         # Almacena la distancia del párpado superior derecho
-        self.eyes['right_upper_eyelid_distance'] = right_upper_eyelid_distance
+        eyes['right_upper_eyelid_distance'] = right_upper_eyelid_distance
         # Almacena la distancia del párpado superior izquierdo
-        self.eyes['left_upper_eyelid_distance'] = left_upper_eyelid_distance
+        eyes['left_upper_eyelid_distance'] = left_upper_eyelid_distance
         # Almacena la distancia del párpado inferior derecho
-        self.eyes['right_lower_eyelid_distance'] = right_lower_eyelid_distance
+        eyes['right_lower_eyelid_distance'] = right_lower_eyelid_distance
         # Almacena la distancia del párpado inferior izquierdo
-        self.eyes['left_lower_eyelid_distance'] = left_lower_eyelid_distance
+        eyes['left_lower_eyelid_distance'] = left_lower_eyelid_distance
         # Línea comentada que imprimiría todas las métricas redondeadas a 4 decimales
-        #print(f'Eyes: { {k: (round(float(v),4)) for k,v in self.eyes.items()}}')
-        # Retorna el diccionario con todas las métricas calculadas de los ojos
-        return self.eyes
+        #print(f'Eyes: { {k: (round(float(v),4)) for k,v in eyes.items()}}')
+        # Retorna las métricas calculadas de los ojos como vista de solo lectura
+        return MappingProxyType(eyes)
@@ -1,3 +1,5 @@
+# Importa MappingProxyType para retornar resultados de solo lectura
+from types import MappingProxyType
 # Importa la clase base abstracta para procesadores de características
 from emotion_processor.data_processing.feature_processor import FeatureProcessor
 # Importa el procesador específico para cejas
@@ -21,19 +23,18 @@ class PointsProcessing:
             'nose': NoseProcessor(),  # Procesador de nariz
             'mouth': MouthProcessor()  # Procesador de boca
         }
-        # Diccionario para almacenar los puntos procesados de todas las características
-        self.processed_points: dict = {}
 
     # Método principal que procesa todos los puntos faciales
+    # No guarda estado entre llamadas: un mismo objeto puede usarse desde varios hilos
     def main(self, points: dict):
-        # Reinicia el diccionario de puntos procesados
-        self.processed_points = {}
+        # Diccionario nuevo para los puntos procesados de este frame
+        processed_points: dict = {}
         # Itera sobre cada característica facial y su procesador
         for feature, processor in self.processors.items():
             # Obtiene los puntos de la característica actual (o diccionario vacío si no existe)
             feature_points = points.get(feature, {})
             # Procesa los puntos de la característica y almacena el resultado
-            self.processed_points[feature] = processor.process(feature_points)
-        # Retorna el diccionario con todas las características procesadas
-        return self.processed_points
+            processed_points[feature] = processor.process(feature_points)
+        # Retorna todas las características procesadas como vista de solo lectura
+        return MappingProxyType(processed_points)
 
@@ -2,6 +2,8 @@
 import numpy as np
 # Importa ABC (Abstract Base Class) y abstractmethod para crear clases abstractas
 from abc import ABC, abstractmethod
+# Importa MappingProxyType para retornar métricas de solo lectura
+from types import MappingProxyType
 
 
 # Clase abstracta base para calcular distancias entre puntos
@@ -50,8 +52,6 @@ class MouthPointsProcessing:
         self.arch_calculator = arch_calculator
         # Almacena el calculador de distancias
         self.distance_calculator = distance_calculator
-        # Diccionario para almacenar todas las métricas calculadas de la boca
-        self.mouth: dict = {}
 
     # Calcula todas las distancias relevantes de la boca y labios
     def calculate_distances(self, eyebrows_points: dict):
@@ -78,32 +78,35 @@ class MouthPointsProcessing:
         return upper_mouth, lower_mouth, right_smile, right_lip, left_smile, left_lip
 
     # Método principal que procesa todos los puntos de la boca y calcula todas las métricas
+    # No guarda estado: cada llamada crea su propio diccionario (reentrante entre hilos)
     def main(self, mouth_points: dict):
+        # Diccionario nuevo con todas las métricas calculadas de la boca
+        mouth: dict = {}
         # Calcula el arco (curvatura) del labio superior usando los puntos del arco superior
         upper_arch = self.arch_calculator.calculate_lips_arch(mouth_points['upper arch'])
         # Calcula el arco (curvatura) del labio inferior usando los puntos del arco inferior
         lower_arch = self.arch_calculator.calculate_lips_arch(mouth_points['lower arch'])
         # Almacena el valor del arco del labio superior en el diccionario
-        self.mouth['upper_arch'] = upper_arch
+        mouth['upper_arch'] = upper_arch
         # Almacena el valor del arco del labio inferior en el diccionario
-        self.mouth['lower_arch'] = lower_arch
+        mouth['lower_arch'] = lower_arch
 
         # Calcula todas las distancias de los labios y las desempaqueta en variables individuales
         (mouth_upper_distance, mouth_lower_distance, right_smile_distance, right_lip_distance, left_smile_distance,
          left_lip_distance) = self.calculate_distances(mouth_points)
         # Almacena la distancia de apertura del labio superior
-        self.mouth['mouth_upper_distance'] = mouth_upper_distance
+        mouth['mouth_upper_distance'] = mouth_upper_distance
         # Almacena la distancia de apertura del labio inferior
-        self.mouth['mouth_lower_distance'] = mouth_lower_distance
+        mouth['mouth_lower_distance'] = mouth_lower_distance
         # Almacena la distancia de la sonrisa derecha
-        self.mouth['right_smile_distance'] = right_smile_distance
+        mouth['right_smile_distance'] = right_smile_distance
         # Almacena la distancia del labio derecho
-        self.mouth['right_lip_distance'] = right_lip_distance
+        mouth['right_lip_distance'] = right_lip_distance
         # Almacena la distancia de la sonrisa izquierda
-        self.mouth['left_smile_distance'] = left_smile_distance
+        mouth['left_smile_distance'] = left_smile_distance
         # Almacena la distancia del labio izquierdo
-        self.mouth['left_lip_distance'] = left_lip_distance
+        mouth['left_lip_distance'] = left_lip_distance
         # Línea comentada que imprimiría todas las métricas redondeadas a 4 decimales
-        #print(f'Mouth: { {k: (round(float(v), 4)) for k, v in self.mouth.items()} }')
-        # Retorna el diccionario con todas las métricas calculadas de la boca
-        return self.mouth
+        #print(f'Mouth: { {k: (round(float(v), 4)) for k, v in mouth.items()} }')
+        # Retorna las métricas calculadas de la boca como vista de solo lectura
+        return MappingProxyType(mouth)
@@ -2,6 +2,8 @@
 import numpy as np
 # Importa ABC (Abstract Base Class) y abstractmethod para crear clases abstractas
 from abc import ABC, abstractmethod
+# Importa MappingProxyType para retornar métricas de solo lectura
+from types import MappingProxyType
 
 
 # Clase abstracta base para calcular distancias entre puntos
@@ -26,8 +28,6 @@ class NosePointsProcessing:
     def __init__(self, distance_calculator: DistanceCalculator):
         # Almacena el calculador de distancias
         self.distance_calculator = distance_calculator
-        # Diccionario para almacenar todas las métricas calculadas de la nariz
-        self.nose: dict = {}
 
     # Calcula las distancias relevantes de la nariz
     def calculate_distances(self, eyebrows_points: dict):
@@ -42,14 +42,17 @@ class NosePointsProcessing:
         return upper_mouth, lower_nose
 
     # Método principal que procesa todos los puntos de la nariz y calcula todas las métricas
+    # No guarda estado: cada llamada crea su propio diccionario (reentrante entre hilos)
     def main(self, mouth_points: dict):
+        # Diccionario nuevo con todas las métricas calculadas de la nariz
+        nose: dict = {}
         # Calcula las distancias entre la nariz y la boca
         mouth_upper_distance, nose_lower_distance = self.calculate_distances(mouth_points)
         # Almacena la distancia entre la nariz y la parte superior de la boca
-        self.nose['mouth_upper_distance'] = mouth_upper_distance
+        nose['mouth_upper_distance'] = mouth_upper_distance
         # Almacena la distancia de la parte inferior de la nariz
-        self.nose['nose_lower_distance'] = nose_lower_distance
+        nose['nose_lower_distance'] = nose_lower_distance
         # Línea comentada que imprimiría todas las métricas redondeadas a 4 decimales
-        #print(f'Nose: { {k: (round(float(v), 4)) for k, v in self.nose.items()} }')
-        # Retorna el diccionario con todas las métricas calculadas de la nariz
-        return self.nose
+        #print(f'Nose: { {k: (round(float(v), 4)) for k, v in nose.items()} }')
+        # Retorna las métricas calculadas de la nariz como vista de solo lectura
+        return MappingProxyType(nose)
@@ -1,3 +1,7 @@
+# Importa threading para mantener un grafo de MediaPipe por hilo
+import threading
+# Importa MappingProxyType para retornar puntos de solo lectura
+from types import MappingProxyType
 # Importa numpy para operaciones con arrays numéricos
 import numpy as np
 # Importa OpenCV para procesamiento de imágenes y video
@@ -5,21 +9,36 @@ import cv2
 # Importa MediaPipe para detección de malla facial
 import mediapipe as mp
 # Importa tipos para anotaciones de tipo en Python
-from typing import Any, Tuple, List, Dict
+from typing import Any, Tuple, List, Mapping
 
 
 # Clase para realizar la inferencia de malla facial usando MediaPipe
+# Un grafo de FaceMesh no admite llamadas concurrentes, así que cada hilo crea el suyo al primer uso
 class FaceMeshInference:
     # Constructor que inicializa los parámetros de confianza mínima
     def __init__(self, min_detection_confidence=0.6, min_tracking_confidence=0.6):
-        # Crea una instancia de FaceMesh de MediaPipe con configuraciones específicas
-        self.face_mesh = mp.solutions.face_mesh.FaceMesh(
-            static_image_mode=False,  # Modo video (False) en lugar de imagen estática
-            max_num_faces=1,  # Detecta máximo 1 rostro por frame
-            refine_landmarks=True,  # Refina los puntos de referencia para mayor precisión
-            min_detection_confidence=min_detection_confidence,  # Confianza mínima para detectar un rostro
-            min_tracking_confidence=min_tracking_confidence  # Confianza mínima para seguir un rostro detectado
-        )
+        # Confianza mínima para detectar un rostro
+        self.min_detection_confidence = min_detection_confidence
+        # Confianza mínima para seguir un rostro detectado
+        self.min_tracking_confidence = min_tracking_confidence
+        # Almacenamiento por hilo para el grafo de FaceMesh
+        self._local = threading.local()
+
+    # Grafo de FaceMesh del hilo actual (se crea la primera vez que el hilo lo usa)
+    @property
+    def face_mesh(self):
+        face_mesh = getattr(self._local, 'face_mesh', None)
+        if face_mesh is None:
+            # Crea una instancia de FaceMesh de MediaPipe con configuraciones específicas
+            face_mesh = mp.solutions.face_mesh.FaceMesh(
+                static_image_mode=False,  # Modo video (False) en lugar de imagen estática
+                max_num_faces=1,  # Detecta máximo 1 rostro por frame
+                refine_landmarks=True,  # Refina los puntos de referencia para mayor precisión
+                min_detection_confidence=self.min_detection_confidence,  # Confianza mínima para detectar un rostro
+                min_tracking_confidence=self.min_tracking_confidence  # Confianza mínima para seguir un rostro detectado
+            )
+            self._local.face_mesh = face_mesh
+        return face_mesh
 
     # Procesa una imagen para detectar la malla facial
     def process(self, image: np.ndarray) -> Tuple[bool, Any]:
@@ -30,21 +49,20 @@ class FaceMeshInference:
         # Retorna si se detectó un rostro y el objeto con información de la malla
         return bool(face_mesh.multi_face_landmarks), face_mesh
 
+    # Libera el grafo de FaceMesh del hilo actual
+    def close(self):
+        face_mesh = getattr(self._local, 'face_mesh', None)
+        if face_mesh is not None:
+            face_mesh.close()
+            self._local.face_mesh = None
+
 
         
 
 
 # Clase para extraer puntos específicos de características faciales
+# No guarda estado: cada llamada retorna puntos nuevos de solo lectura (reentrante entre hilos)
 class FaceMeshExtractor:
-    # Constructor que inicializa la estructura de datos para almacenar puntos
-    def __init__(self):
-        # Diccionario que almacena puntos de diferentes características faciales
-        self.points: dict = {
-            'eyebrows': {'right arch': [], 'left arch': [], 'distances': []},  # Puntos de cejas
-            'eyes': {'right arch': [], 'left arch': [], 'distances': []},  # Puntos de ojos
-            'nose': {'distances': []},  # Puntos de nariz
-            'mouth': {'upper arch': [], 'lower arch': [], 'distances': []}  # Puntos de boca
-        }
 
     # Extrae todos los puntos de la malla facial y los convierte a coordenadas de píxeles
     def extract_points(self, face_image: np.ndarray, face_mesh_info: Any) -> List[List[int]]:
@@ -60,16 +78,22 @@ class FaceMeshExtractor:
         return mesh_points
 
     # Extrae puntos específicos de características faciales según índices predefinidos
-    def extract_feature_points(self, face_points: List[List[int]], feature_indices: dict):
+    # Retorna un diccionario nuevo: característica -> sub-característica -> tupla de puntos (x, y)
+    def extract_feature_points(self, face_points: List[List[int]], feature_indices: dict) -> dict:
+        # Diccionario nuevo para los puntos de esta llamada
+        points = {}
         # Itera sobre cada característica facial (cejas, ojos, nariz, boca)
         for feature, indices in feature_indices.items():
-            # Itera sobre cada sub-característica (arco derecho, izquierdo, distancias)
-            for sub_feature, sub_indices in indices.items():
-                # Extrae solo las coordenadas [x, y] (omite el índice) de los puntos especificados
-                self.points[feature][sub_feature] = [face_points[i][1:] for i in sub_indices]
+            # Extrae solo las coordenadas (x, y) (omite el índice) de cada sub-característica
+            points[feature] = MappingProxyType({
+                sub_feature: tuple(tuple(face_points[i][1:]) for i in sub_indices)
+                for sub_feature, sub_indices in indices.items()
+            })
+        # Retorna los puntos extraídos
+        return points
 
     # Obtiene los puntos específicos de las cejas
-    def get_eyebrows_points(self, face_points: List[List[int]]) -> Dict[str, List[List[int]]]:
+    def get_eyebrows_points(self, face_points: List[List[int]]) -> Mapping[str, Tuple[Tuple[int, int], ...]]:
         # Define los índices de los puntos de la malla facial que corresponden a las cejas
         feature_indices = {
             'eyebrows': {
@@ -78,13 +102,11 @@ class FaceMeshExtractor:
                 'distances': [65, 468, 295, 473, 69, 66, 299, 296, 55, 8, 70, 21]  # Puntos para calcular distancias
             }
         }
-        # Extrae los puntos usando los índices definidos
-        self.extract_feature_points(face_points, feature_indices)
-        # Retorna el diccionario con los puntos de las cejas
-        return self.points['eyebrows']
+        # Extrae los puntos usando los índices definidos y retorna los de las cejas
+        return self.extract_feature_points(face_points, feature_indices)['eyebrows']
 
     # Obtiene los puntos específicos de los ojos
-    def get_eyes_points(self, face_points: List[List[int]]) -> Dict[str, List[List[int]]]:
+    def get_eyes_points(self, face_points: List[List[int]]) -> Mapping[str, Tuple[Tuple[int, int], ...]]:
         # Define los índices de los puntos de la malla facial que corresponden a los ojos
         feature_indices = {
             'eyes': {
@@ -93,26 +115,22 @@ class FaceMeshExtractor:
                 'distances': [159, 145, 385, 374, 145, 230, 374, 450],  # Puntos para calcular distancias (apertura)
             }
         }
-        # Extrae los puntos usando los índices definidos
-        self.extract_feature_points(face_points, feature_indices)
-        # Retorna el diccionario con los puntos de los ojos
-        return self.points['eyes']
+        # Extrae los puntos usando los índices definidos y retorna los de los ojos
+        return self.extract_feature_points(face_points, feature_indices)['eyes']
 
     # Obtiene los puntos específicos de la nariz
-    def get_nose_points(self, face_points: List[List[int]]) -> Dict[str, List[List[int]]]:
+    def get_nose_points(self, face_points: List[List[int]]) -> Mapping[str, Tuple[Tuple[int, int], ...]]:
         # Define los índices de los puntos de la malla facial que corresponden a la nariz
         feature_indices = {
             'nose': {
                 'distances': [0, 13, 2, 164],  # Puntos clave de la nariz para calcular distancias
             }
         }
-        # Extrae los puntos usando los índices definidos
-        self.extract_feature_points(face_points, feature_indices)
-        # Retorna el diccionario con los puntos de la nariz
-        return self.points['nose']
+        # Extrae los puntos usando los índices definidos y retorna los de la nariz
+        return self.extract_feature_points(face_points, feature_indices)['nose']
 
     # Obtiene los puntos específicos de la boca
-    def get_mouth_points(self, face_points: List[List[int]]) -> Dict[str, List[List[int]]]:
+    def get_mouth_points(self, face_points: List[List[int]]) -> Mapping[str, Tuple[Tuple[int, int], ...]]:
         # Define los índices de los puntos de la malla facial que corresponden a la boca
         feature_indices = {
             'mouth': {
@@ -121,10 +139,8 @@ class FaceMeshExtractor:
                 'distances': [13, 14, 17, 200, 78, 186, 61, 95, 308, 410, 291, 324]  # Puntos para calcular distancias (apertura)
             }
         }
-        # Extrae los puntos usando los índices definidos
-        self.extract_feature_points(face_points, feature_indices)
-        # Retorna el diccionario con los puntos de la boca
-        return self.points['mouth']
+        # Extrae los puntos usando los índices definidos y retorna los de la boca
+        return self.extract_feature_points(face_points, feature_indices)['mouth']
 
 
 # Clase para dibujar la malla facial sobre la imagen
@@ -156,25 +172,36 @@ class FaceMeshProcessor:
         # Crea una instancia para dibujar la malla facial
         self.drawer = FaceMeshDrawer()
 
-    # Método principal que procesa una imagen facial completa
-    def process(self, face_image: np.ndarray, draw: bool = True) -> Tuple[dict, bool, np.ndarray]:
-        # Guarda una copia de la imagen original para retornar si no se dibuja
-        original_image = face_image.copy()
+    # Detecta la malla facial y extrae los puntos sin copiar ni dibujar la imagen
+    # Retorna los puntos por característica, si hubo rostro y la información de MediaPipe (para dibujar después)
+    def detect(self, face_image: np.ndarray) -> Tuple[dict, bool, Any]:
         # Realiza la inferencia para detectar la malla facial
         success, face_mesh_info = self.inference.process(face_image)
-        # Si no se detectó ningún rostro, retorna diccionario vacío y la imagen original
+        # Si no se detectó ningún rostro, retorna diccionario vacío
         if not success:
-            return {}, False, original_image
+            return {}, False, None
 
         # Extrae todos los puntos de la malla facial
         face_points = self.extractor.extract_points(face_image, face_mesh_info)
-        # Organiza los puntos por características faciales (cejas, ojos, nariz, boca)
-        points = {
+        # Organiza los puntos por características faciales (cejas, ojos, nariz, boca), de solo lectura
+        points = MappingProxyType({
             'eyebrows': self.extractor.get_eyebrows_points(face_points),  # Extrae puntos de cejas
             'eyes': self.extractor.get_eyes_points(face_points),  # Extrae puntos de ojos
             'nose': self.extractor.get_nose_points(face_points),  # Extrae puntos de nariz
             'mouth': self.extractor.get_mouth_points(face_points)  # Extrae puntos de boca
-        }
+        })
+        # Retorna los puntos, éxito y la información de la malla
+        return points, True, face_mesh_info
+
+    # Método principal que procesa una imagen facial completa
+    def process(self, face_image: np.ndarray, draw: bool = True) -> Tuple[dict, bool, np.ndarray]:
+        # Guarda una copia de la imagen original para retornar si no se dibuja
+        original_image = face_image.copy()
+        # Detecta la malla facial y extrae los puntos
+        points, success, face_mesh_info = self.detect(face_image)
+        # Si no se detectó ningún rostro, retorna diccionario vacío y la imagen original
+        if not success:
+            return {}, False, original_image
 
         # Si se solicita dibujar la malla
         if draw:
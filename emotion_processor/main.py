@@ -1,3 +1,11 @@
+# Importa time para medir la duración de cada etapa
+import time
+# Importa dataclass para el resultado estructurado del análisis
+from dataclasses import dataclass, field
+# Importa MappingProxyType para que los diccionarios del análisis sean de solo lectura
+from types import MappingProxyType
+# Importa tipos para anotaciones de tipo
+from typing import Any, Dict, Iterable, Mapping, Optional
 # Importa numpy para operaciones con arrays numéricos
 import numpy as np
 # Importa el procesador de malla facial
@@ -8,12 +16,47 @@ from emotion_processor.data_processing.main import PointsProcessing
 from emotion_processor.emotions_recognition.main import EmotionRecognition
 # Importa el sistema de visualización de emociones
 from emotion_processor.emotions_visualizations.main import EmotionsVisualization
+# Importa la cadena de transformaciones de puntuaciones (calibración, suavizado, recorte)
+from emotion_processor.score_transforms.main import ScoreTransformChain
+
+
+# Resultado inmutable del análisis de un frame (sin dibujar nada)
+# Los diccionarios se guardan como MappingProxyType: tampoco se pueden modificar por dentro
+@dataclass(frozen=True)
+class EmotionAnalysis:
+    # Indica si se detectó un rostro en el frame
+    face_found: bool
+    # Puntos de la malla por característica facial (cejas, ojos, nariz, boca), de solo lectura
+    landmarks: Mapping[str, Any] = field(default_factory=dict)
+    # Características procesadas a partir de los puntos, de solo lectura
+    features: Mapping[str, Any] = field(default_factory=dict)
+    # Puntuaciones de cada emoción tras la cadena de transformaciones; vacío si no hay rostro
+    scores: Mapping[str, float] = field(default_factory=dict)
+    # Segundos de cada etapa: 'mesh', 'features', 'scores', 'transforms' y 'total'
+    timings: Mapping[str, float] = field(default_factory=dict)
+    # Información de MediaPipe, necesaria solo para dibujar la malla después
+    mesh: Optional[Any] = field(default=None, repr=False, compare=False)
+    # Puntuaciones antes de las transformaciones (p. ej. para calibrar)
+    raw_scores: Mapping[str, float] = field(default_factory=dict)
+
+    # Convierte los diccionarios recibidos en vistas de solo lectura
+    # Cada vista envuelve una copia propia: quien creó el diccionario (p. ej. una transformación que
+    # guarda su salida) no puede modificar el resultado después de entregarlo a otro hilo
+    def __post_init__(self):
+        for name in ('landmarks', 'features', 'scores', 'timings', 'raw_scores'):
+            value = getattr(self, name)
+            # La dataclass es frozen: se asigna con object.__setattr__
+            if not isinstance(value, MappingProxyType):
+                object.__setattr__(self, name, MappingProxyType(dict(value)))
 
 
 # Clase principal que coordina todo el sistema de reconocimiento de emociones
+# analyze es reentrante: las etapas no guardan estado entre frames y cada hilo usa su propio grafo de
+# MediaPipe, así que un mismo sistema puede atender a varios hilos (p. ej. un pool con varios flujos)
 class EmotionRecognitionSystem:
     # Constructor que inicializa todos los componentes del sistema
-    def __init__(self):
+    # transforms: transformaciones que se aplican en orden a las puntuaciones antes de dibujarlas
+    def __init__(self, transforms: Iterable = ()):
         # Inicializa el procesador de malla facial para detectar puntos del rostro
         self.face_mesh = FaceMeshProcessor()
         # Inicializa el procesador de datos para calcular métricas de características faciales
@@ -22,24 +65,76 @@ class EmotionRecognitionSystem:
         self.emotions_recognition = EmotionRecognition()
         # Inicializa el sistema de visualización de emociones
         self.emotions_visualization = EmotionsVisualization()
+        # Inicializa la cadena de transformaciones de puntuaciones (vacía por defecto)
+        self.score_transforms = ScoreTransformChain(transforms)
 
-    # Procesa un frame de imagen para detectar y visualizar emociones
-    def frame_processing(self, face_image: np.ndarray):
-        # Procesa la imagen para extraer puntos faciales y dibuja la malla
-        face_points, control_process, original_image = self.face_mesh.process(face_image, draw=True)
-        # Si se detectó un rostro exitosamente
-        if control_process:
-            # Procesa los puntos faciales para calcular características
-            processed_features = self.data_processing.main(face_points)
-            # Reconoce las emociones basándose en las características procesadas
-            emotions = self.emotions_recognition.recognize_emotion(processed_features)
-            # Dibuja las emociones detectadas sobre la imagen
-            draw_emotions = self.emotions_visualization.main(emotions, original_image)
-            # Retorna la imagen con las emociones visualizadas
-            return draw_emotions
-        else:
-            # Si no se detectó rostro, lanza una excepción (nota: no se captura)
-            Exception(f"No face mesh")
-            # Retorna la imagen original sin modificar
+    # Analiza un frame sin dibujar: malla facial, características, puntuaciones y tiempos
+    # Las rutas sin pantalla (calibración, ejercicios, agregación) solo necesitan este paso
+    # transforms permite usar otra cadena de transformaciones (None = la del sistema)
+    def analyze(self, face_image: np.ndarray, transforms: Optional[ScoreTransformChain] = None) -> EmotionAnalysis:
+        # Marca el inicio del análisis
+        start = time.perf_counter()
+        # Detecta la malla facial y extrae los puntos sin copiar ni dibujar la imagen
+        face_points, control_process, mesh_info = self.face_mesh.detect(face_image)
+        # Marca el fin de la detección de la malla
+        mesh_done = time.perf_counter()
+        # Si no se detectó rostro, retorna un resultado vacío
+        if not control_process:
+            return EmotionAnalysis(False, timings={'mesh': mesh_done - start, 'total': mesh_done - start})
+
+        # Procesa los puntos faciales para calcular características
+        processed_features = self.data_processing.main(face_points)
+        # Marca el fin del cálculo de características
+        features_done = time.perf_counter()
+        # Reconoce las emociones basándose en las características procesadas
+        emotions = self.emotions_recognition.recognize_emotion(processed_features)
+        # Marca el fin del reconocimiento
+        scores_done = time.perf_counter()
+        # Aplica la cadena de transformaciones (calibración, suavizado, recorte) una sola vez
+        # El resultado se publica de solo lectura: se puede pasar a otros hilos (EmotionBus, dashboard)
+        chain = self.score_transforms if transforms is None else transforms
+        transformed = chain.apply(emotions)
+        # Marca el fin de las transformaciones
+        transforms_done = time.perf_counter()
+        # Retorna el resultado estructurado con los tiempos de cada etapa
+        return EmotionAnalysis(
+            face_found=True,
+            landmarks=face_points,
+            features=processed_features,
+            scores=transformed,
+            timings={
+                'mesh': mesh_done - start,
+                'features': features_done - mesh_done,
+                'scores': scores_done - features_done,
+                'transforms': transforms_done - scores_done,
+                'total': transforms_done - start
+            },
+            mesh=mesh_info,
+            raw_scores=emotions
+        )
+
+    # Dibuja un análisis sobre la imagen (paso opcional, separado de analyze)
+    # Dibuja las puntuaciones ya transformadas; scores permite dibujar otras en su lugar
+    def render(self, face_image: np.ndarray, analysis: EmotionAnalysis, draw_mesh: bool = True,
+               scores: Optional[Dict[str, float]] = None) -> np.ndarray:
+        # Sin rostro no hay nada que dibujar
+        if not analysis.face_found:
             return face_image
+        # Dibuja la malla facial sobre la imagen si se solicita
+        if draw_mesh and analysis.mesh is not None:
+            self.face_mesh.drawer.draw(face_image, analysis.mesh)
+        # Dibuja las barras de emociones y retorna la imagen
+        return self.emotions_visualization.main(analysis.scores if scores is None else scores, face_image)
 
+    # Procesa un frame de imagen para detectar y visualizar emociones
+    # Si return_emotions es True, retorna (imagen, puntuaciones del frame); las puntuaciones son None sin rostro
+    def frame_processing(self, face_image: np.ndarray, return_emotions: bool = False):
+        # Analiza el frame sin dibujar
+        analysis = self.analyze(face_image)
+        # Dibuja la malla y las emociones (si no hay rostro, retorna la imagen sin modificar)
+        image = self.render(face_image, analysis)
+        # Retorna también las puntuaciones si se pidieron (p. ej. para agregarlas por ventana)
+        if return_emotions:
+            return image, (analysis.scores if analysis.face_found else None)
+        # Retorna la imagen con las emociones visualizadas
+        return image
@@ -0,0 +1,16 @@
+# Importa la clase base para transformaciones de puntuaciones
+from emotion_processor.score_transforms.score_transform import ScoreTransform
+
+
+# Transformación que limita cada puntuación a un rango (por defecto 0-100)
+class ClipTransform(ScoreTransform):
+    # Constructor que define los límites del rango
+    def __init__(self, lower: float = 0.0, upper: float = 100.0):
+        # Límite inferior de las puntuaciones
+        self.lower = lower
+        # Límite superior de las puntuaciones
+        self.upper = upper
+
+    # Recorta cada puntuación al rango [lower, upper]
+    def transform(self, scores: dict) -> dict:
+        return {emotion: min(max(score, self.lower), self.upper) for emotion, score in scores.items()}
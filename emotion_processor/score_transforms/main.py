@@ -0,0 +1,54 @@
+# Importa tipos para anotaciones de tipo
+from typing import Iterable, List
+# Importa la clase base para transformaciones de puntuaciones
+from emotion_processor.score_transforms.score_transform import ScoreTransform
+
+
+# Cadena ordenada de transformaciones que se aplican a las puntuaciones antes de dibujarlas
+# Ejemplo: calibración -> suavizado -> recorte, con un único dibujado al final
+# Una cadena también es una transformación: puede anidarse dentro de otra y se consulta en cada
+# llamada, así que los cambios en la cadena anidada se ven de inmediato
+class ScoreTransformChain(ScoreTransform):
+    # Constructor que recibe las transformaciones en el orden en que se aplican
+    def __init__(self, transforms: Iterable[ScoreTransform] = ()):
+        # Lista de transformaciones en orden de aplicación
+        self.transforms: List[ScoreTransform] = list(transforms)
+
+    # Aplica todas las transformaciones en orden y retorna las puntuaciones resultantes
+    def apply(self, scores: dict) -> dict:
+        # Sin transformaciones, retorna una copia de las puntuaciones
+        result = dict(scores)
+        # Cada transformación recibe la salida de la anterior
+        for transform in self.transforms:
+            result = transform.transform(result)
+        return result
+
+    # Como transformación, una cadena aplica todas las suyas
+    def transform(self, scores: dict) -> dict:
+        return self.apply(scores)
+
+    # Añade una transformación al final de la cadena
+    def append(self, transform: ScoreTransform):
+        self.transforms.append(transform)
+
+    # Inserta una transformación en una posición (0 = la primera en aplicarse)
+    def insert(self, index: int, transform: ScoreTransform):
+        self.transforms.insert(index, transform)
+
+    # Quita una transformación de la cadena
+    def remove(self, transform: ScoreTransform):
+        self.transforms.remove(transform)
+
+    # Reinicia el estado de todas las transformaciones
+    def reset(self):
+        for transform in self.transforms:
+            transform.reset()
+
+    # Permite recorrer las transformaciones
+    def __iter__(self):
+        return iter(self.transforms)
+
+    # Número de transformaciones de la cadena
+    def __len__(self):
+        return len(self.transforms)
+
@@ -0,0 +1,20 @@
+# Importa ABC (Abstract Base Class) y abstractmethod para crear clases abstractas
+from abc import ABC, abstractmethod
+
+
+# Clase abstracta base para las transformaciones que se aplican a las puntuaciones ya calculadas
+# (calibración, suavizado, recorte) antes de dibujarlas
+class ScoreTransform(ABC):
+    # Método abstracto que debe ser implementado por todas las subclases
+    @abstractmethod
+    def transform(self, scores: dict) -> dict:
+        # Retorna un diccionario nuevo con las puntuaciones transformadas (no modifica la entrada)
+        raise NotImplementedError
+
+    # Olvida el estado entre frames (solo lo usan las transformaciones con memoria, p. ej. el suavizado)
+    def reset(self):
+        pass
+
+    # Permite usar la transformación como una función
+    def __call__(self, scores: dict) -> dict:
+        return self.transform(scores)
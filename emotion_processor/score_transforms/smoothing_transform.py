@@ -0,0 +1,46 @@
+# Importa threading para guardar el historial de cada hilo por separado
+import threading
+# Importa la clase base para transformaciones de puntuaciones
+from emotion_processor.score_transforms.score_transform import ScoreTransform
+
+
+# Transformación que suaviza las puntuaciones entre frames con una media móvil exponencial
+# El historial es por hilo: si varios hilos comparten el sistema, cada uno suaviza su propio flujo
+class SmoothingTransform(ScoreTransform):
+    # Constructor que define el peso del frame actual
+    def __init__(self, alpha: float = 0.3):
+        # Peso del frame actual (1 = sin suavizado, valores bajos = más suavizado)
+        self.alpha = alpha
+        # Almacenamiento por hilo para las últimas puntuaciones suavizadas
+        self._local = threading.local()
+
+    # Últimas puntuaciones suavizadas del hilo actual (None hasta su primer frame)
+    @property
+    def previous(self):
+        return getattr(self._local, 'previous', None)
+
+    # Guarda las puntuaciones suavizadas del hilo actual
+    @previous.setter
+    def previous(self, value):
+        self._local.previous = value
+
+    # Mezcla las puntuaciones del frame con las suavizadas del frame anterior
+    def transform(self, scores: dict) -> dict:
+        # Lee el historial una sola vez
+        previous = self.previous
+        # El primer frame se toma tal cual
+        if previous is None:
+            smoothed = dict(scores)
+        else:
+            # Media móvil exponencial por emoción (las emociones nuevas empiezan en su valor actual)
+            smoothed = {
+                emotion: previous.get(emotion, score) + self.alpha * (score - previous.get(emotion, score))
+                for emotion, score in scores.items()
+            }
+        # Guarda el resultado para el siguiente frame de este hilo
+        self.previous = smoothed
+        return dict(smoothed)
+
+    # Olvida el historial del hilo actual (p. ej. al cambiar de paciente o de sesión)
+    def reset(self):
+        self.previous = None
@@ -16,8 +16,13 @@ from camera import Camera
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from therapy_tools.session_database import SessionDatabase
 from therapy_tools.privacy_manager import PrivacyManager
-from therapy_tools.personal_calibration import PersonalCalibration, CalibratedEmotionRecognitionSystem
+from therapy_tools.personal_calibration import (
+    PersonalCalibration, CalibratedEmotionRecognitionSystem, CalibrationTransform
+)
+from emotion_processor.score_transforms.main import ScoreTransformChain
 from therapy_tools.therapeutic_exercises import TherapeuticExercises
+from therapy_tools.live_feed import EmotionBus
+from therapy_tools.window_aggregator import EmotionWindowAggregator
 
 
 class TherapyVideoStream:
@@ -31,10 +36,12 @@ class TherapyVideoStream:
     - Calibración personal del sistema
     - Integración con ejercicios terapéuticos
     - Guardado de sesión en base de datos
+    - Publicación de cada medición en un EmotionBus (dashboard en vivo)
     """
     
     def __init__(self, cam: Camera, emotion_recognition_system: EmotionRecognitionSystem,
-                 patient_name: str, birth_date: str, session_type: str = 'regular'):
+                 patient_name: str, birth_date: str, session_type: str = 'regular',
+                 live_feed: EmotionBus = None):
         """
         Inicializa el stream de video terapéutico.
         
@@ -44,15 +51,24 @@ class TherapyVideoStream:
             patient_name: Nombre del paciente (se anonimizará)
             birth_date: Fecha de nacimiento del paciente (formato: YYYY-MM-DD)
             session_type: Tipo de sesión (inicial, seguimiento, etc.)
+            live_feed: Bus donde publicar cada medición (None = uno nuevo);
+                       el dashboard se suscribe con show_live_monitor(live_feed)
         """
         self.camera = cam
         self.emotion_recognition_system = emotion_recognition_system
         self.session_type = session_type
+        self.live_feed = live_feed if live_feed is not None else EmotionBus()
         
         # Inicializar herramientas terapéuticas
         self.db = SessionDatabase()
         self.privacy = PrivacyManager()
-        self.calibration = PersonalCalibration(emotion_recognition_system)
+        # Calibraciones en la base de datos, cargadas a través de la caché compartida
+        self.calibration = PersonalCalibration(emotion_recognition_system, self.db)
+        
+        # Calibración seguida de la cadena del sistema, anidada (un solo dibujado)
+        self.score_transforms = ScoreTransformChain(
+            [CalibrationTransform(self.calibration), emotion_recognition_system.score_transforms]
+        )
         
         # Solicitar consentimiento
         self.consent_given = self._request_consent(patient_name)
@@ -69,8 +85,8 @@ class TherapyVideoStream:
             # Variables de sesión
             self.session_id = None
             self.start_time = None
-            self.last_save_time = 0
-            self.save_interval = 1  # Guardar emociones cada segundo
+            self.save_interval = 1  # Guardar una fila por segundo (todos los frames agregados)
+            self.aggregator = EmotionWindowAggregator(self.save_interval)
         else:
             print("  Consentimiento rechazado. No se puede iniciar sesión.")
             self.patient_id = None
@@ -123,14 +139,15 @@ class TherapyVideoStream:
             while True:
                 ret, frame = self.camera.read()
                 if ret:
-                    # Procesar frame
-                    frame = self.emotion_recognition_system.frame_processing(frame)
+                    # Procesar frame y publicar la medición en vivo (no bloquea)
+                    frame, emotions = self._process_frame(frame)
+                    if emotions is not None:
+                        self.live_feed.publish(time.monotonic(), emotions)
                     
-                    # Guardar emociones periódicamente
+                    # Agregar cada frame; al cerrar cada ventana se guarda una fila
                     current_time = time.time()
-                    if current_time - self.last_save_time >= self.save_interval:
-                        self._save_current_emotions()
-                        self.last_save_time = current_time
+                    for window in self.aggregator.add(current_time - self.start_time, emotions):
+                        self._save_window(window)
                     
                     # Mostrar información de sesión
                     elapsed = int(current_time - self.start_time)
@@ -152,17 +169,33 @@ class TherapyVideoStream:
             # Finalizar sesión
             self._end_session()
     
-    def _save_current_emotions(self):
-        """Guarda las emociones actuales en la base de datos"""
+    def _process_frame(self, frame):
+        """
+        Mide las emociones de un frame y las dibuja.
+        
+        Returns:
+            tuple: (frame dibujado, emociones calibradas o None si no hay rostro)
+        """
+        system = self.emotion_recognition_system
+        analysis = system.analyze(frame, transforms=self.score_transforms)
+        if not analysis.face_found:
+            return frame, None
+        
+        return system.render(frame, analysis), dict(analysis.scores)
+    
+    def _save_window(self, window):
+        """
+        Guarda en la base de datos una ventana de EmotionWindowAggregator.
+        
+        Args:
+            window: Media, mínimo, máximo y frames válidos de la ventana
+        """
         try:
-            emotions = self.emotion_recognition_system.emotions_recognition.last_emotions
-            
-            # Aplicar calibración si existe
-            if self.calibration.is_calibrated():
-                emotions = self.calibration.adjust_all_emotions(emotions)
-            
-            timestamp_offset = int(time.time() - self.start_time)
-            self.db.save_emotion_snapshot(self.session_id, timestamp_offset, emotions)
+            self.db.save_emotion_snapshot(
+                self.session_id, int(window['offset']), window['mean'],
+                frame_count=window['frame_count'],
+                minimum=window['min'], maximum=window['max']
+            )
         except Exception as e:
             pass  # Silenciar errores de guardado para no interrumpir sesión
     
@@ -177,6 +210,10 @@ class TherapyVideoStream:
         cv2.destroyAllWindows()
         
         if self.session_id:
+            # Guardar la última ventana, aunque esté incompleta
+            for window in self.aggregator.flush():
+                self._save_window(window)
+            
             self.db.end_session(self.session_id, notes)
             self.privacy.log_access('END_SESSION', self.patient_id, 
                                    f'Session {self.session_id} ended')
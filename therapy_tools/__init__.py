@@ -2,16 +2,26 @@
 # Este módulo contiene herramientas para uso clínico y psiquiátrico
 
 from therapy_tools.session_database import SessionDatabase
+from therapy_tools.session_archive import SessionArchive
+from therapy_tools.cohort_analytics import CohortAnalytics
 from therapy_tools.therapist_dashboard import TherapistDashboard
 from therapy_tools.privacy_manager import PrivacyManager
-from therapy_tools.personal_calibration import PersonalCalibration, CalibratedEmotionRecognitionSystem
+from therapy_tools.retention_engine import RetentionEngine
+from therapy_tools.personal_calibration import (
+    PersonalCalibration, CompiledCalibration, CalibrationCache, CalibratedEmotionRecognitionSystem
+)
 from therapy_tools.therapeutic_exercises import TherapeuticExercises
 
 __all__ = [
     'SessionDatabase',
+    'SessionArchive',
+    'CohortAnalytics',
     'TherapistDashboard', 
     'PrivacyManager',
+    'RetentionEngine',
     'PersonalCalibration',
+    'CompiledCalibration',
+    'CalibrationCache',
     'CalibratedEmotionRecognitionSystem',
     'TherapeuticExercises'
 ]
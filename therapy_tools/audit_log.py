@@ -0,0 +1,406 @@
+# Registro de auditoría con escritura en segundo plano, rotación por tamaño e índice
+# Usado por PrivacyManager.log_access
+
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import weakref
+from collections import deque
+from datetime import datetime
+
+
+# Escritores compartidos por ruta real del segmento activo: dos AuditLog sobre
+# el mismo archivo usan la misma cola, el mismo índice y la misma rotación
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def _acquire_writer(log_file, max_bytes, tail_size, batch_size):
+    """Devuelve el escritor de un archivo, creándolo si no existe"""
+    key = os.path.realpath(log_file)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _AuditWriter(log_file, max_bytes, tail_size, batch_size)
+            _writers[key] = writer
+        writer.users += 1
+        return writer
+
+
+def _release_writer(writer):
+    """Suelta una referencia al escritor y lo cierra si era la última"""
+    with _writers_lock:
+        writer.users -= 1
+        if writer.users > 0:
+            return
+        key = os.path.realpath(writer.log_file)
+        if _writers.get(key) is writer:
+            del _writers[key]
+    writer.close()
+
+
+@atexit.register
+def _close_writers():
+    """Escribe las entradas pendientes de todos los escritores al salir"""
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.close()
+
+
+class AuditLog:
+    """
+    Registro de auditoría append-only (un JSON por línea).
+    
+    ¿Por qué?
+    - Abrir y escribir el archivo en cada acceso bloquea al llamante; aquí
+      log() solo encola la entrada y un hilo la escribe por lotes
+    - El archivo activo rota al superar max_bytes; los segmentos cerrados
+      no se borran nunca (son registros de auditoría)
+    - Un índice lateral guarda, por segmento, el rango de fechas y los
+      usuarios/pacientes y acciones que contiene: una consulta solo abre
+      los segmentos que pueden tener resultados
+    - En memoria solo se guardan las últimas tail_size entradas
+    
+    Archivos:
+    - access_log.json: segmento activo
+    - access_log.json.1, .2, ...: segmentos cerrados (del más antiguo al más nuevo)
+    - access_log.json.index: índice de los segmentos cerrados
+    
+    Todas las instancias de un mismo proceso sobre el mismo archivo comparten
+    un único hilo de escritura (y su índice y sus entradas recientes), así
+    que no rotan el archivo por separado. El escritor se cierra con la última
+    instancia que lo usa, o al salir del proceso.
+    """
+    
+    def __init__(self, log_file='access_log.json', max_bytes=5 * 1024 * 1024,
+                 tail_size=1000, batch_size=256):
+        """
+        Inicializa el registro y arranca (o reutiliza) el hilo de escritura.
+        
+        Si otra instancia ya usa el mismo archivo, se comparte su escritor y
+        se mantienen sus max_bytes, tail_size y batch_size.
+        
+        Args:
+            log_file: Ruta del segmento activo
+            max_bytes: Tamaño a partir del cual rota el segmento activo
+            tail_size: Entradas recientes que se conservan en memoria
+            batch_size: Entradas máximas escritas por lote
+        """
+        self.log_file = log_file
+        self._writer = _acquire_writer(log_file, max_bytes, tail_size, batch_size)
+        # Sin referencia a self: la instancia puede liberarse sin llamar a close()
+        self._release = weakref.finalize(self, _release_writer, self._writer)
+    
+    def log(self, action, user, details=''):
+        """
+        Registra una entrada sin esperar a que se escriba en disco.
+        
+        Args:
+            action: Tipo de acción (VIEW_SESSION, EXPORT_DATA, ...)
+            user: Usuario o paciente afectado
+            details: Detalles adicionales
+            
+        Returns:
+            dict: Entrada registrada
+        """
+        entry = {
+            'timestamp': datetime.now().isoformat(),
+            'action': action,
+            'user': user,
+            'details': details
+        }
+        self._writer.submit(entry)
+        return entry
+    
+    def tail(self, limit=100):
+        """
+        Devuelve las entradas más recientes guardadas en memoria.
+        
+        Args:
+            limit: Número máximo de entradas
+            
+        Returns:
+            list: Entradas en orden cronológico
+        """
+        entries = list(self._writer.tail)
+        return entries[-limit:] if limit else entries
+    
+    def query(self, user=None, action=None, start=None, end=None, limit=None):
+        """
+        Busca entradas en todos los segmentos usando el índice.
+        
+        Ejemplo: query(user='PAC_123', action='VIEW_SESSION',
+        start=datetime(2024, 1, 1), end=datetime(2024, 4, 1))
+        
+        Args:
+            user: Usuario o paciente (None = todos)
+            action: Acción (None = todas)
+            start: Fecha inicial (datetime o ISO), inclusive
+            end: Fecha final (datetime o ISO), exclusiva
+            limit: Número máximo de entradas (las más recientes)
+            
+        Returns:
+            list: Entradas en orden cronológico
+        """
+        self.flush()
+        start = start.isoformat() if isinstance(start, datetime) else start
+        end = end.isoformat() if isinstance(end, datetime) else end
+        results = self._writer.query(user, action, start, end)
+        return results[-limit:] if limit else results
+    
+    def flush(self):
+        """Espera a que todas las entradas encoladas estén en disco"""
+        self._writer.flush()
+    
+    def close(self):
+        """
+        Suelta el escritor compartido.
+        
+        El último AuditLog de un archivo escribe las entradas pendientes y
+        detiene el hilo. Las entradas registradas después de close() se
+        escriben directamente en disco.
+        """
+        self._release()
+
+
+class _AuditWriter:
+    """
+    Hilo de escritura, índice y rotación de un archivo de auditoría.
+    
+    Compartido por todas las instancias de AuditLog del mismo archivo (ver
+    _acquire_writer).
+    """
+    
+    def __init__(self, log_file, max_bytes, tail_size, batch_size):
+        """Carga el índice y arranca el hilo de escritura"""
+        self.log_file = log_file
+        self.index_file = log_file + '.index'
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.users = 0  # Instancias de AuditLog que lo usan (ver _acquire_writer)
+        
+        self.tail = deque(maxlen=tail_size)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()  # Protege el índice y el resumen activo
+        
+        self._segments = self._load_index()
+        self._active = self._summarize(self.log_file)
+        
+        # _closed solo cambia con _state_lock tomado: una entrada o se encola
+        # antes del centinela de close() o se escribe directamente
+        self._state_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='AuditLogWriter', daemon=True)
+        self._thread.start()
+    
+    def submit(self, entry):
+        """Encola una entrada o, si el escritor ya se cerró, la escribe directamente"""
+        self.tail.append(entry)
+        with self._state_lock:
+            if not self._closed:
+                self._queue.put(entry)
+                return
+        
+        # Tras close() el hilo ya no lee la cola: se espera a que termine
+        # de vaciarla para no desordenar las entradas
+        self._thread.join()
+        with self._state_lock:
+            self._write_batch([entry])
+    
+    def query(self, user, action, start, end):
+        """Busca entradas en los segmentos que pueden contenerlas"""
+        # Con el bloqueo tomado el hilo de escritura no puede rotar a mitad de lectura
+        with self._lock:
+            candidates = [s for s in self._segments + [self._active]
+                          if self._may_contain(s, user, action, start, end)]
+            return self._scan(candidates, user, action, start, end)
+    
+    def flush(self):
+        """Espera a que todas las entradas encoladas estén en disco"""
+        if not self._closed:
+            self._queue.join()
+    
+    def close(self):
+        """Escribe las entradas pendientes y detiene el hilo de escritura"""
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+    
+    def _run(self):
+        """Bucle del hilo de escritura: agrupa entradas y las escribe por lotes"""
+        while True:
+            entry = self._queue.get()
+            batch = [] if entry is None else [entry]
+            stop = entry is None
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stop = True
+                else:
+                    batch.append(entry)
+            
+            if batch:
+                self._write_batch(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+            if stop:
+                return
+    
+    def _scan(self, candidates, user, action, start, end):
+        """Lee los segmentos candidatos y filtra sus entradas"""
+        results = []
+        for segment in candidates:
+            for entry in self._read_segment(segment['file']):
+                if user is not None and entry.get('user') != user:
+                    continue
+                if action is not None and entry.get('action') != action:
+                    continue
+                timestamp = entry.get('timestamp', '')
+                if start is not None and timestamp < start:
+                    continue
+                if end is not None and timestamp >= end:
+                    continue
+                results.append(entry)
+        return results
+    
+    def _write_batch(self, batch):
+        """Escribe un lote en el segmento activo y rota si es necesario"""
+        try:
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                for entry in batch:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                size = f.tell()
+        except Exception as e:
+            print(f"Error guardando log: {e}")
+            return
+        
+        with self._lock:
+            for entry in batch:
+                self._add_to_summary(self._active, entry)
+        
+        if size >= self.max_bytes:
+            self._rotate()
+    
+    def _rotate(self):
+        """Cierra el segmento activo, lo añade al índice y empieza uno nuevo"""
+        with self._lock:
+            number = max([self._segment_number(s['file']) for s in self._segments] + [0]) + 1
+            closed_file = f'{self.log_file}.{number}'
+            try:
+                os.replace(self.log_file, closed_file)
+            except OSError as e:
+                print(f"Error rotando log: {e}")
+                return
+            
+            self._active['file'] = closed_file
+            self._segments.append(self._active)
+            self._active = self._empty_summary(self.log_file)
+            self._save_index(self._segments)
+    
+    def _load_index(self):
+        """
+        Carga el índice de segmentos cerrados.
+        
+        Los segmentos que falten en el índice (p. ej. si se borró) se
+        resumen leyéndolos una vez.
+        """
+        segments = []
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                segments = json.load(f)
+        except (OSError, ValueError):
+            segments = []
+        
+        for segment in segments:
+            segment['users'] = set(segment['users'])
+            segment['actions'] = set(segment['actions'])
+        
+        indexed = {s['file'] for s in segments}
+        on_disk = [path for path in glob.glob(glob.escape(self.log_file) + '.*')
+                   if self._segment_number(path) > 0]
+        missing = [path for path in on_disk if path not in indexed]
+        segments = [s for s in segments if os.path.exists(s['file'])]
+        segments.extend(self._summarize(path) for path in missing)
+        segments.sort(key=lambda s: self._segment_number(s['file']))
+        
+        if missing:
+            self._save_index(segments)
+        return segments
+    
+    def _save_index(self, segments):
+        """Guarda el índice de forma atómica (archivo temporal + rename)"""
+        serializable = [dict(s, users=sorted(s['users'], key=str),
+                             actions=sorted(s['actions'], key=str))
+                        for s in segments]
+        tmp_file = self.index_file + '.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(serializable, f, ensure_ascii=False)
+            os.replace(tmp_file, self.index_file)
+        except OSError as e:
+            print(f"Error guardando índice de log: {e}")
+    
+    def _summarize(self, path):
+        """Resume un segmento existente leyéndolo completo"""
+        summary = self._empty_summary(path)
+        for entry in self._read_segment(path):
+            self._add_to_summary(summary, entry)
+        return summary
+    
+    def _empty_summary(self, path):
+        """Resumen de un segmento vacío"""
+        return {'file': path, 'count': 0, 'start': None, 'end': None,
+                'users': set(), 'actions': set()}
+    
+    def _add_to_summary(self, summary, entry):
+        """Actualiza el resumen de un segmento con una entrada"""
+        timestamp = entry.get('timestamp')
+        summary['count'] += 1
+        if timestamp is not None:
+            if summary['start'] is None or timestamp < summary['start']:
+                summary['start'] = timestamp
+            if summary['end'] is None or timestamp > summary['end']:
+                summary['end'] = timestamp
+        summary['users'].add(entry.get('user'))
+        summary['actions'].add(entry.get('action'))
+    
+    def _may_contain(self, summary, user, action, start, end):
+        """Indica si un segmento puede contener entradas de la consulta"""
+        if summary['count'] == 0:
+            return False
+        if user is not None and user not in summary['users']:
+            return False
+        if action is not None and action not in summary['actions']:
+            return False
+        if start is not None and summary['end'] is not None and summary['end'] < start:
+            return False
+        if end is not None and summary['start'] is not None and summary['start'] >= end:
+            return False
+        return True
+    
+    def _read_segment(self, path):
+        """Recorre las entradas de un segmento, ignorando líneas corruptas"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except OSError:
+            return
+    
+    def _segment_number(self, path):
+        """Número de un segmento cerrado (0 si no es un segmento)"""
+        suffix = path[len(self.log_file) + 1:]
+        return int(suffix) if suffix.isdigit() else 0
@@ -0,0 +1,260 @@
+# Reportes por lotes de sesiones y pacientes, sin interfaz gráfica
+# Genera PNG/PDF de un rango de fechas en paralelo con un pool de procesos
+#
+# Uso:
+#     python -m therapy_tools.batch_reports --db therapy_sessions.db \
+#         --start 2026-09-01 --end 2026-10-01 --output reportes --formats pdf png
+
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+# Backend Agg: sin pantalla, válido en servidores y en procesos hijos
+try:
+    import matplotlib
+    matplotlib.use('Agg')
+    MATPLOTLIB_AVAILABLE = True
+except ImportError:
+    MATPLOTLIB_AVAILABLE = False
+
+from therapy_tools.session_database import SessionDatabase
+from therapy_tools.cohort_analytics import CohortAnalytics
+from therapy_tools.charts import patient_history_figure, save_figure, session_summary_figure
+
+
+# Base de datos de cada proceso del pool (ver _init_worker)
+_worker_db = None
+
+
+def _init_worker(db_path):
+    """Abre la base de datos en el proceso hijo (las conexiones no se heredan)"""
+    global _worker_db
+    _worker_db = SessionDatabase(db_path)
+
+
+def _safe_name(value):
+    """Convierte un ID en un nombre de archivo seguro"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(value))
+
+
+def _session_report(session, output_dir, formats):
+    """
+    Genera el reporte de una sesión (se ejecuta en un proceso del pool).
+    
+    Args:
+        session: Diccionario con id, patient_id y timestamp
+        output_dir: Directorio de salida
+        formats: Extensiones a generar ('png', 'pdf')
+        
+    Returns:
+        list: Rutas generadas (vacía si la sesión no tiene datos)
+    """
+    timestamps, scores = _worker_db.get_session_emotions_array(session['id'])
+    if len(timestamps) == 0:
+        return []
+    
+    title = f"Paciente {session['patient_id']} - Sesión {session['id']} ({session['timestamp']})"
+    fig = session_summary_figure(timestamps, scores, title=title)
+    
+    directory = os.path.join(output_dir, _safe_name(session['patient_id']))
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for extension in formats:
+        path = os.path.join(directory, f"session_{session['id']}.{extension}")
+        save_figure(fig, path)
+        paths.append(path)
+    return paths
+
+
+def _patient_report(patient_id, sessions, start, end, output_dir, formats):
+    """
+    Genera el reporte de evolución de un paciente (se ejecuta en un proceso del pool).
+    
+    Args:
+        patient_id: ID del paciente
+        sessions: Sesiones del paciente en el rango (id -> timestamp)
+        start: Fecha inicial o None
+        end: Fecha final o None
+        output_dir: Directorio de salida
+        formats: Extensiones a generar
+        
+    Returns:
+        list: Rutas generadas (vacía si ninguna sesión tiene datos)
+    """
+    # Medias por sesión en una sola consulta (incluye el archivo frío)
+    data = CohortAnalytics(_worker_db).session_means([patient_id], start, end)
+    if len(data['session_ids']) == 0:
+        return []
+    
+    order = np.argsort(data['days'], kind='stable')
+    labels = [str(sessions.get(int(data['session_ids'][i]), ''))[:16] for i in order]
+    fig = patient_history_figure(labels, data['means'][order],
+                                 title=f'Paciente {patient_id}: Evolución Entre Sesiones')
+    
+    directory = os.path.join(output_dir, _safe_name(patient_id))
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for extension in formats:
+        path = os.path.join(directory, f'patient_{_safe_name(patient_id)}.{extension}')
+        save_figure(fig, path)
+        paths.append(path)
+    return paths
+
+
+class BatchReportGenerator:
+    """
+    Generador de reportes por lotes para toda la clínica.
+    
+    ¿Por qué?
+    - La única forma de ver los gráficos de una sesión era el dashboard de
+      Tkinter, sesión por sesión y con pantalla
+    - Aquí los mismos gráficos (charts.py) se dibujan con el backend Agg y se
+      guardan como PNG/PDF: un reporte por sesión y uno de evolución por
+      paciente, para un rango de fechas
+    - Dibujar es CPU pura y matplotlib no libera el GIL, así que el trabajo
+      se reparte en un pool de procesos; cada proceso abre su propia
+      conexión a la base de datos
+    - La documentación de fin de mes se genera sin supervisión
+    """
+    
+    def __init__(self, db_path='therapy_sessions.db', output_dir='reportes',
+                 formats=('pdf',), workers=None):
+        """
+        Inicializa el generador.
+        
+        Args:
+            db_path: Ruta a la base de datos SQLite (no ':memory:')
+            output_dir: Directorio de salida (una carpeta por paciente)
+            formats: Formatos a generar: 'pdf' y/o 'png'
+            workers: Procesos del pool (None = número de CPUs)
+        """
+        if not MATPLOTLIB_AVAILABLE:
+            raise ImportError("matplotlib no está instalado. Instalar con: pip install matplotlib")
+        if db_path == ':memory:':
+            raise ValueError("Los procesos del pool no pueden compartir una base ':memory:'")
+        
+        formats = tuple(extension.lower().lstrip('.') for extension in formats)
+        unknown = set(formats) - {'pdf', 'png'}
+        if unknown:
+            raise ValueError(f"Formatos no soportados: {', '.join(sorted(unknown))}")
+        
+        self.db_path = db_path
+        self.output_dir = output_dir
+        self.formats = formats
+        self.workers = workers
+    
+    def list_sessions(self, start=None, end=None, patient_ids=None):
+        """
+        Sesiones del rango de fechas, ordenadas por paciente y fecha.
+        
+        Args:
+            start: Fecha inicial (datetime o 'YYYY-MM-DD'), inclusive
+            end: Fecha final (datetime o 'YYYY-MM-DD'), exclusiva
+            patient_ids: Lista de pacientes (None = todos)
+            
+        Returns:
+            list: Diccionarios con id, patient_id y timestamp
+        """
+        db = SessionDatabase(self.db_path)
+        try:
+            where, params = CohortAnalytics(db)._session_filter(patient_ids, start, end)
+            rows = db.conn.execute(f'''
+                SELECT s.id, s.patient_id, s.timestamp
+                FROM sessions s
+                {where}
+                ORDER BY s.patient_id, s.timestamp, s.id
+            ''', params).fetchall()
+        finally:
+            db.close()
+        
+        return [{'id': row[0], 'patient_id': row[1], 'timestamp': row[2]} for row in rows]
+    
+    def generate(self, start=None, end=None, patient_ids=None,
+                 session_reports=True, patient_reports=True):
+        """
+        Genera los reportes del rango de fechas.
+        
+        Args:
+            start: Fecha inicial, inclusive
+            end: Fecha final, exclusiva
+            patient_ids: Lista de pacientes (None = todos)
+            session_reports: Generar un reporte por sesión
+            patient_reports: Generar un reporte de evolución por paciente
+            
+        Returns:
+            dict: 'sessions' y 'patients' procesados, 'files' generados,
+                  'errors' (lista de mensajes) y 'seconds'
+        """
+        started = time.monotonic()
+        sessions = self.list_sessions(start, end, patient_ids)
+        
+        by_patient = {}
+        for session in sessions:
+            by_patient.setdefault(session['patient_id'], {})[session['id']] = session['timestamp']
+        
+        os.makedirs(self.output_dir, exist_ok=True)
+        files = []
+        errors = []
+        
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.db_path,)) as executor:
+            futures = {}
+            if session_reports:
+                for session in sessions:
+                    future = executor.submit(_session_report, session, self.output_dir, self.formats)
+                    futures[future] = f"sesión {session['id']}"
+            if patient_reports:
+                for patient_id, patient_sessions in by_patient.items():
+                    future = executor.submit(_patient_report, patient_id, patient_sessions,
+                                             start, end, self.output_dir, self.formats)
+                    futures[future] = f'paciente {patient_id}'
+            
+            for future in as_completed(futures):
+                try:
+                    files.extend(future.result())
+                except Exception as e:
+                    errors.append(f'{futures[future]}: {e}')
+        
+        return {
+            'sessions': len(sessions),
+            'patients': len(by_patient),
+            'files': sorted(files),
+            'errors': errors,
+            'seconds': time.monotonic() - started
+        }
+
+
+def main(argv=None):
+    """Punto de entrada de la línea de comandos"""
+    parser = argparse.ArgumentParser(
+        description='Genera reportes PNG/PDF de sesiones y pacientes sin interfaz gráfica')
+    parser.add_argument('--db', default='therapy_sessions.db', help='Base de datos SQLite')
+    parser.add_argument('--start', help='Fecha inicial YYYY-MM-DD (inclusive)')
+    parser.add_argument('--end', help='Fecha final YYYY-MM-DD (exclusiva)')
+    parser.add_argument('--patients', nargs='+', help='IDs de pacientes (por defecto, todos)')
+    parser.add_argument('--output', default='reportes', help='Directorio de salida')
+    parser.add_argument('--formats', nargs='+', default=['pdf'], choices=['pdf', 'png'],
+                        help='Formatos a generar')
+    parser.add_argument('--workers', type=int, help='Procesos en paralelo (por defecto, CPUs)')
+    parser.add_argument('--no-sessions', action='store_true', help='Omitir reportes por sesión')
+    parser.add_argument('--no-patients', action='store_true', help='Omitir reportes por paciente')
+    args = parser.parse_args(argv)
+    
+    generator = BatchReportGenerator(args.db, args.output, args.formats, args.workers)
+    summary = generator.generate(args.start, args.end, args.patients,
+                                 session_reports=not args.no_sessions,
+                                 patient_reports=not args.no_patients)
+    
+    print(f"✓ {len(summary['files'])} archivos de {summary['sessions']} sesiones y "
+          f"{summary['patients']} pacientes en {summary['seconds']:.1f}s -> {args.output}")
+    for error in summary['errors']:
+        print(f"✗ Error en {error}")
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,313 @@
+# Definiciones de gráficos de sesiones, independientes de Tk
+# Las usan el dashboard, la caché de gráficos y los reportes por lotes
+
+import glob
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+# Intentar importar matplotlib (sin pyplot: las figuras no dependen de una ventana)
+try:
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    MATPLOTLIB_AVAILABLE = True
+except ImportError:
+    MATPLOTLIB_AVAILABLE = False
+
+from therapy_tools.session_database import EMOTION_COLUMNS
+
+
+# Colores de emociones (mismo que el sistema de visualización)
+EMOTION_COLORS = {
+    'happy': '#1B97EF',     # Azul
+    'sad': '#BA7704',       # Marrón/Naranja
+    'angry': '#2332DC',     # Azul oscuro
+    'fear': '#80258E',      # Púrpura
+    'surprise': '#B8B753',  # Amarillo/Verde
+    'disgust': '#4FA424'    # Verde
+}
+
+# Nombres en español de las emociones
+EMOTION_NAMES_ES = {
+    'happy': 'Felicidad',
+    'sad': 'Tristeza',
+    'angry': 'Enojo',
+    'fear': 'Miedo',
+    'surprise': 'Sorpresa',
+    'disgust': 'Disgusto'
+}
+
+# Se incrementa al cambiar el aspecto de los gráficos: invalida la caché en disco
+CHART_STYLE_VERSION = 1
+
+
+def session_summary_figure(timestamps, scores, figsize=(12, 6.5), dpi=100, title=None):
+    """
+    Gráfico de resumen de una sesión: evolución temporal y promedios.
+    
+    Args:
+        timestamps: Array (T,) con segundos desde el inicio
+        scores: Array (T, 6) en el orden de EMOTION_COLUMNS
+        figsize: Tamaño en pulgadas
+        dpi: Resolución
+        title: Título general opcional (p. ej. paciente y fecha)
+        
+    Returns:
+        Figure: Figura de matplotlib (sin ventana asociada)
+    """
+    fig = Figure(figsize=figsize, dpi=dpi)
+    ax1, ax2 = fig.subplots(2, 1)
+    
+    # Gráfico 1: Líneas temporales de todas las emociones
+    for i, emotion in enumerate(EMOTION_COLUMNS):
+        ax1.plot(timestamps, scores[:, i],
+                label=EMOTION_NAMES_ES[emotion],
+                color=EMOTION_COLORS[emotion],
+                linewidth=2)
+    
+    ax1.set_xlabel('Tiempo (segundos)', fontsize=12)
+    ax1.set_ylabel('Intensidad (%)', fontsize=12)
+    ax1.set_title('Evolución Emocional Durante la Sesión', fontsize=14, fontweight='bold')
+    ax1.legend(loc='upper right')
+    ax1.grid(True, alpha=0.3)
+    ax1.set_ylim(0, 100)
+    
+    # Gráfico 2: Promedios por emoción (barras)
+    emotion_avgs = scores.mean(axis=0) if len(scores) else np.zeros(len(EMOTION_COLUMNS))
+    ax2.bar([EMOTION_NAMES_ES[e] for e in EMOTION_COLUMNS],
+           emotion_avgs, color=[EMOTION_COLORS[e] for e in EMOTION_COLUMNS], alpha=0.7)
+    ax2.set_ylabel('Intensidad Promedio (%)', fontsize=12)
+    ax2.set_title('Resumen: Emociones Promedio de la Sesión', fontsize=14, fontweight='bold')
+    ax2.set_ylim(0, 100)
+    
+    # Agregar valores sobre las barras
+    for i, v in enumerate(emotion_avgs):
+        ax2.text(i, v + 2, f'{v:.1f}%', ha='center', fontweight='bold')
+    
+    if title:
+        fig.suptitle(title, fontsize=15, fontweight='bold')
+    fig.tight_layout()
+    return fig
+
+
+def session_comparison_figure(averages1, averages2, figsize=(10, 6), dpi=100):
+    """
+    Gráfico de barras que compara los promedios de dos sesiones.
+    
+    Args:
+        averages1: Diccionario emoción -> promedio (sesión anterior)
+        averages2: Diccionario emoción -> promedio (sesión actual)
+        figsize: Tamaño en pulgadas
+        dpi: Resolución
+        
+    Returns:
+        Figure: Figura de matplotlib (sin ventana asociada)
+    """
+    fig = Figure(figsize=figsize, dpi=dpi)
+    ax = fig.subplots()
+    
+    x = np.arange(len(EMOTION_COLUMNS))
+    width = 0.35
+    
+    ax.bar(x - width/2,
+          [averages1[e] for e in EMOTION_COLUMNS],
+          width, label='Sesión Anterior', alpha=0.8)
+    ax.bar(x + width/2,
+          [averages2[e] for e in EMOTION_COLUMNS],
+          width, label='Sesión Actual', alpha=0.8)
+    
+    ax.set_ylabel('Intensidad Promedio (%)')
+    ax.set_title('Comparación Entre Sesiones', fontweight='bold')
+    ax.set_xticks(x)
+    ax.set_xticklabels([EMOTION_NAMES_ES[e] for e in EMOTION_COLUMNS])
+    ax.legend()
+    ax.grid(True, alpha=0.3, axis='y')
+    ax.set_ylim(0, 100)
+    
+    fig.tight_layout()
+    return fig
+
+
+def patient_history_figure(labels, means, figsize=(12, 6), dpi=100, title=None):
+    """
+    Evolución de las emociones promedio de un paciente, sesión a sesión.
+    
+    Args:
+        labels: Etiqueta de cada sesión en el eje X (p. ej. la fecha)
+        means: Array (N, 6) con la media de cada sesión en el orden de EMOTION_COLUMNS
+        figsize: Tamaño en pulgadas
+        dpi: Resolución
+        title: Título opcional
+        
+    Returns:
+        Figure: Figura de matplotlib (sin ventana asociada)
+    """
+    fig = Figure(figsize=figsize, dpi=dpi)
+    ax = fig.subplots()
+    
+    x = np.arange(len(labels))
+    for i, emotion in enumerate(EMOTION_COLUMNS):
+        ax.plot(x, means[:, i],
+               label=EMOTION_NAMES_ES[emotion],
+               color=EMOTION_COLORS[emotion],
+               linewidth=2, marker='o')
+    
+    ax.set_ylabel('Intensidad Promedio (%)', fontsize=12)
+    ax.set_title(title or 'Evolución Entre Sesiones', fontsize=14, fontweight='bold')
+    ax.set_xticks(x)
+    ax.set_xticklabels(labels, rotation=45, ha='right', fontsize=9)
+    ax.legend(loc='upper right')
+    ax.grid(True, alpha=0.3)
+    ax.set_ylim(0, 100)
+    
+    fig.tight_layout()
+    return fig
+
+
+def save_figure(fig, path, **kwargs):
+    """
+    Guarda una figura de forma atómica (archivo temporal + rename).
+    
+    Args:
+        fig: Figura de matplotlib
+        path: Ruta de destino (el formato sale de la extensión: .png, .pdf)
+        **kwargs: Argumentos adicionales de savefig
+    """
+    FigureCanvasAgg(fig)
+    root, extension = os.path.splitext(path)
+    tmp_path = f'{root}.{os.getpid()}.tmp{extension}'
+    fig.savefig(tmp_path, **kwargs)
+    os.replace(tmp_path, path)
+
+
+def default_chart_cache_dir(database):
+    """
+    Directorio por defecto de la caché de gráficos de una base de datos.
+    
+    Se guarda junto al archivo de la base (no en el directorio de trabajo),
+    así que todos los procesos que abren la misma base comparten la caché.
+    
+    Args:
+        database: Instancia de SessionDatabase
+        
+    Returns:
+        str: Ruta absoluta del directorio
+    """
+    if database.db_path == ':memory:':
+        return os.path.join(tempfile.gettempdir(), 'therapy_chart_cache')
+    db_path = os.path.abspath(database.db_path)
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(os.path.dirname(db_path), f'{name}_chart_cache')
+
+
+def remove_cached_charts(cache_dir, session_id, keep=None):
+    """
+    Borra los PNG en caché de una sesión.
+    
+    No necesita matplotlib: RetentionEngine y SessionArchive lo usan al
+    borrar o restaurar sesiones.
+    
+    Args:
+        cache_dir: Directorio de la caché (ver default_chart_cache_dir)
+        session_id: ID de la sesión
+        keep: Ruta que no se borra (None = borrar todas las versiones)
+    """
+    pattern = os.path.join(glob.escape(cache_dir), f'session_{session_id}_*.png')
+    for path in glob.glob(pattern):
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class ChartCache:
+    """
+    Caché en disco de los gráficos de resumen de sesión ya rasterizados.
+    
+    ¿Por qué?
+    - Una sesión cerrada no cambia, pero el dashboard la volvía a dibujar
+      con matplotlib cada vez que se abría
+    - Aquí el gráfico se guarda como PNG con nombre
+      session_<id>_<hash>.png, donde el hash resume los datos dibujados
+      (número de filas, último instante y un resumen de las puntuaciones),
+      la versión de la sesión y el estilo del gráfico
+    - Si algo cambia el hash es otro: se dibuja de nuevo y se borran las
+      versiones anteriores de esa sesión
+    - Abrir una sesión ya vista cuesta leer sus datos y cargar una imagen,
+      no dibujarla
+    """
+    
+    def __init__(self, cache_dir):
+        """
+        Inicializa la caché.
+        
+        Args:
+            cache_dir: Directorio donde guardar los PNG
+                       (ver default_chart_cache_dir)
+        """
+        if not MATPLOTLIB_AVAILABLE:
+            raise ImportError("matplotlib no está instalado. Instalar con: pip install matplotlib")
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def session_summary_png(self, database, session_id, data=None):
+        """
+        Devuelve la ruta del PNG de resumen de una sesión, dibujándolo si hace falta.
+        
+        Args:
+            database: Instancia de SessionDatabase
+            session_id: ID de la sesión
+            data: (timestamps, scores) ya leídos (None = leerlos de la base)
+            
+        Returns:
+            str: Ruta del PNG, o None si la sesión no tiene datos
+        """
+        timestamps, scores = data if data is not None else database.get_session_emotions_array(session_id)
+        if len(timestamps) == 0:
+            return None
+        
+        content_hash = self.content_hash(database, session_id, timestamps, scores)
+        path = os.path.join(self.cache_dir, f'session_{session_id}_{content_hash}.png')
+        if os.path.exists(path):
+            return path
+        
+        save_figure(session_summary_figure(timestamps, scores), path)
+        self._remove_stale(session_id, path)
+        return path
+    
+    def content_hash(self, database, session_id, timestamps, scores):
+        """
+        Resume los datos dibujados, la versión de la sesión y el estilo del gráfico.
+        
+        Los datos entran en el hash (filas, último instante y los bytes de
+        las puntuaciones): una escritura que no cambie la versión de la
+        sesión (p. ej. una actualización en el sitio) también redibuja.
+        
+        Args:
+            database: Instancia de SessionDatabase
+            session_id: ID de la sesión
+            timestamps: Array (T,) con segundos desde el inicio
+            scores: Array (T, 6) en el orden de EMOTION_COLUMNS
+            
+        Returns:
+            str: 16 caracteres hexadecimales
+        """
+        version = database.get_session_version(session_id)
+        key = hashlib.sha256(repr((
+            CHART_STYLE_VERSION, version, len(timestamps),
+            float(timestamps[-1]) if len(timestamps) else None
+        )).encode('utf-8'))
+        key.update(np.ascontiguousarray(timestamps, dtype=np.float64).tobytes())
+        key.update(np.ascontiguousarray(scores, dtype=np.float64).tobytes())
+        return key.hexdigest()[:16]
+    
+    def invalidate(self, session_id):
+        """Borra los PNG en caché de una sesión"""
+        remove_cached_charts(self.cache_dir, session_id)
+    
+    def _remove_stale(self, session_id, keep):
+        """Borra las versiones de una sesión distintas de keep"""
+        remove_cached_charts(self.cache_dir, session_id, keep)
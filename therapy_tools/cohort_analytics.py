@@ -0,0 +1,369 @@
+# Analítica de cohortes sobre SessionDatabase
+# Carga en bloque las medias por sesión de muchos pacientes y calcula métricas vectorizadas
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from therapy_tools.session_database import EMOTION_COLUMNS
+from therapy_tools.session_archive import decode_session_block
+
+
+class CohortAnalytics:
+    """
+    Métricas de cohorte (toda la clínica o un grupo de pacientes).
+    
+    ¿Por qué?
+    - El resto de therapy_tools analiza una sesión o un paciente por consulta;
+      un informe de la clínica con miles de sesiones haría miles de consultas
+    - Aquí SQLite agrega los snapshots por sesión (GROUP BY) en una sola
+      pasada y el resultado se carga en arrays de NumPy
+    - Las sesiones del archivo frío se decodifican y promedian por bloque
+    - Los resultados se cachean por firma de consulta y se invalidan cuando
+      cambian los datos de la base
+    """
+    
+    def __init__(self, database, cache_size=32):
+        """
+        Inicializa la analítica de cohortes.
+        
+        Args:
+            database: Instancia de SessionDatabase
+            cache_size: Número máximo de resultados cacheados
+        """
+        self.db = database
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+    
+    def session_means(self, patient_ids=None, start=None, end=None):
+        """
+        Carga la media de cada emoción por sesión para toda la cohorte.
+        
+        Args:
+            patient_ids: Lista de pacientes (None = todos)
+            start: Fecha inicial (datetime o 'YYYY-MM-DD'), inclusive
+            end: Fecha final (datetime o 'YYYY-MM-DD'), exclusiva
+            
+        Returns:
+            dict: Arrays alineados por sesión:
+                  'session_ids' (N,), 'patient_ids' (N,), 'days' (N,) con la
+                  fecha en días julianos, 'num_snapshots' (N,) y 'means' (N, 6)
+                  en el orden de EMOTION_COLUMNS. Solo se incluyen sesiones
+                  con snapshots.
+        """
+        return self._cached('session_means', (patient_ids, start, end),
+                            lambda ids: self._load_session_means(ids, start, end))
+    
+    def dominant_emotion_distribution(self, patient_ids=None, start=None, end=None):
+        """
+        Distribución de la emoción dominante (mayor media) de cada sesión.
+        
+        Args:
+            patient_ids: Lista de pacientes (None = todos)
+            start: Fecha inicial, inclusive
+            end: Fecha final, exclusiva
+            
+        Returns:
+            dict: 'sessions' (total) y, por emoción, 'counts' y 'fractions'
+        """
+        def compute(ids):
+            means = self.session_means(ids, start, end)['means']
+            counts = np.bincount(np.argmax(means, axis=1), minlength=len(EMOTION_COLUMNS))
+            total = int(counts.sum())
+            fractions = counts / total if total else np.zeros(len(EMOTION_COLUMNS))
+            return {
+                'sessions': total,
+                'counts': dict(zip(EMOTION_COLUMNS, counts.tolist())),
+                'fractions': dict(zip(EMOTION_COLUMNS, fractions.tolist()))
+            }
+        
+        return self._cached('dominant_emotion_distribution', (patient_ids, start, end), compute)
+    
+    def exercise_deltas(self, patient_ids=None, start=None, end=None):
+        """
+        Cambio de ansiedad antes/después de cada tipo de ejercicio.
+        
+        El delta es final_anxiety - initial_anxiety: negativo indica mejora.
+        
+        Args:
+            patient_ids: Lista de pacientes (None = todos)
+            start: Fecha inicial, inclusive
+            end: Fecha final, exclusiva
+            
+        Returns:
+            dict: Por tipo de ejercicio: 'count', 'mean_initial', 'mean_final',
+                  'mean_delta', 'std_delta', 'mean_reduction_percent' y 'success_rate'
+        """
+        return self._cached('exercise_deltas', (patient_ids, start, end),
+                            lambda ids: self._compute_exercise_deltas(ids, start, end))
+    
+    def treatment_trends(self, patient_ids=None, start=None, end=None, min_sessions=2):
+        """
+        Pendiente de la evolución de cada emoción a lo largo del tratamiento.
+        
+        Ajusta por mínimos cuadrados, para cada paciente y emoción, la media
+        de la sesión frente a la fecha de la sesión. Todos los pacientes se
+        resuelven a la vez con sumas agrupadas.
+        
+        Args:
+            patient_ids: Lista de pacientes (None = todos)
+            start: Fecha inicial, inclusive
+            end: Fecha final, exclusiva
+            min_sessions: Sesiones mínimas para calcular la pendiente
+            
+        Returns:
+            dict: 'patient_ids' (P,), 'num_sessions' (P,), 'slopes' (P, 6) en
+                  puntos por semana (NaN si no hay sesiones suficientes) y
+                  'cohort_median' con la mediana de la pendiente por emoción
+        """
+        return self._cached('treatment_trends', (patient_ids, start, end, min_sessions),
+                            lambda ids: self._compute_treatment_trends(
+                                ids, start, end, min_sessions))
+    
+    def clear_cache(self):
+        """Vacía la caché de resultados"""
+        with self._cache_lock:
+            self._cache.clear()
+    
+    def _load_session_means(self, patient_ids, start, end):
+        """
+        Agrega snapshots por sesión en SQLite y añade las sesiones archivadas.
+        
+        Igual que SessionDatabase.get_session_emotions_array, una sesión con
+        bloque archivado y snapshots activos cuenta como una sola sesión con
+        todos sus snapshots (media ponderada por número de snapshots).
+        """
+        where, params = self._session_filter(patient_ids, start, end)
+        
+        # Una sola pasada: media por sesión calculada por SQLite
+        avg_columns = ', '.join(f'AVG(e.{emotion})' for emotion in EMOTION_COLUMNS)
+        rows = self.db.conn.execute(f'''
+            SELECT s.id, s.patient_id, julianday(s.timestamp), COUNT(*), {avg_columns}
+            FROM sessions s
+            JOIN emotion_snapshots e ON e.session_id = s.id
+            {where}
+            GROUP BY s.id
+        ''', params).fetchall()
+        sessions = {row[0]: row for row in rows}
+        
+        # Sesiones del archivo frío: un bloque por sesión
+        for session_id, patient_id, day, block in self.db.conn.execute(f'''
+            SELECT s.id, s.patient_id, julianday(s.timestamp), a.data
+            FROM sessions s
+            JOIN archived_sessions a ON a.session_id = s.id
+            {where}
+        ''', params):
+            _, scores = decode_session_block(block)
+            count = len(scores)
+            if not count:
+                continue
+            totals = scores.sum(axis=0)
+            hot = sessions.get(session_id)
+            if hot is not None:
+                # Snapshots posteriores al archivado: se suman a los del bloque
+                totals += np.array(hot[4:], dtype=np.float64) * hot[3]
+                count += hot[3]
+            sessions[session_id] = (session_id, patient_id, day, count,
+                                    *(totals / count).tolist())
+        
+        rows = sorted(sessions.values(), key=lambda row: row[0])
+        
+        result = {
+            'session_ids': np.array([row[0] for row in rows], dtype=np.int64),
+            'patient_ids': np.array([row[1] for row in rows], dtype=object),
+            'days': np.array([row[2] for row in rows], dtype=np.float64),
+            'num_snapshots': np.array([row[3] for row in rows], dtype=np.int64),
+            'means': np.array([row[4:] for row in rows], dtype=np.float64).reshape(
+                len(rows), len(EMOTION_COLUMNS))
+        }
+        # Los arrays se comparten desde la caché: solo lectura
+        for array in result.values():
+            array.setflags(write=False)
+        return result
+    
+    def _compute_exercise_deltas(self, patient_ids, start, end):
+        """Agrupa los resultados de ejercicios por tipo con bincount"""
+        where, params = self._filter('r', patient_ids, start, end)
+        rows = self.db.conn.execute(f'''
+            SELECT r.exercise_type, r.initial_anxiety, r.final_anxiety,
+                   r.reduction_percent, r.success
+            FROM exercise_results r
+            {where}
+        ''', params).fetchall()
+        
+        if not rows:
+            return {}
+        
+        types, group = np.unique(
+            np.array([row[0] or 'unknown' for row in rows], dtype=object).astype(str),
+            return_inverse=True)
+        values = np.array([row[1:] for row in rows], dtype=np.float64)
+        values = np.nan_to_num(values)  # NULL -> 0, como en la tabla original
+        initial, final, reduction_percent, success = values.T
+        delta = final - initial
+        
+        counts = np.bincount(group)
+        
+        def group_mean(weights):
+            return np.bincount(group, weights=weights) / counts
+        
+        mean_delta = group_mean(delta)
+        std_delta = np.sqrt(np.maximum(group_mean(delta ** 2) - mean_delta ** 2, 0))
+        columns = {
+            'mean_initial': group_mean(initial),
+            'mean_final': group_mean(final),
+            'mean_delta': mean_delta,
+            'std_delta': std_delta,
+            'mean_reduction_percent': group_mean(reduction_percent),
+            'success_rate': group_mean(success)
+        }
+        
+        return {
+            str(exercise_type): dict(
+                {'count': int(counts[i])},
+                **{name: float(column[i]) for name, column in columns.items()}
+            )
+            for i, exercise_type in enumerate(types)
+        }
+    
+    def _compute_treatment_trends(self, patient_ids, start, end, min_sessions):
+        """Regresión lineal por paciente resuelta con sumas agrupadas"""
+        data = self.session_means(patient_ids, start, end)
+        num_emotions = len(EMOTION_COLUMNS)
+        
+        patients, group = np.unique(data['patient_ids'].astype(str), return_inverse=True)
+        num_patients = len(patients)
+        counts = np.bincount(group, minlength=num_patients)
+        
+        # Centrar x e y por paciente evita la cancelación numérica
+        weeks = data['days'] / 7.0
+        weeks_centered = weeks - (np.bincount(group, weights=weeks, minlength=num_patients)
+                                  / np.maximum(counts, 1))[group]
+        
+        means = data['means']
+        group_means = np.zeros((num_patients, num_emotions))
+        np.add.at(group_means, group, means)
+        group_means /= np.maximum(counts, 1)[:, None]
+        
+        sxx = np.bincount(group, weights=weeks_centered ** 2, minlength=num_patients)
+        sxy = np.zeros((num_patients, num_emotions))
+        np.add.at(sxy, group, weeks_centered[:, None] * (means - group_means[group]))
+        
+        slopes = np.full((num_patients, num_emotions), np.nan)
+        valid = (counts >= max(min_sessions, 2)) & (sxx > 0)
+        slopes[valid] = sxy[valid] / sxx[valid, None]
+        
+        cohort_median = {}
+        for i, emotion in enumerate(EMOTION_COLUMNS):
+            column = slopes[valid, i]
+            cohort_median[emotion] = float(np.median(column)) if len(column) else None
+        
+        for array in (patients, counts, slopes):
+            array.setflags(write=False)
+        return {
+            'patient_ids': patients,
+            'num_sessions': counts,
+            'slopes': slopes,
+            'cohort_median': cohort_median
+        }
+    
+    def _session_filter(self, patient_ids, start, end):
+        """Filtro WHERE sobre la tabla de sesiones (alias s)"""
+        return self._filter('s', patient_ids, start, end)
+    
+    def _filter(self, alias, patient_ids, start, end):
+        """
+        Construye la cláusula WHERE por pacientes y rango de fechas.
+        
+        Args:
+            alias: Alias de la tabla con columnas patient_id y timestamp
+            patient_ids: Lista de pacientes o None
+            start: Fecha inicial o None
+            end: Fecha final o None
+            
+        Returns:
+            tuple: (cláusula WHERE, parámetros)
+        """
+        conditions = []
+        params = []
+        if patient_ids is not None:
+            patient_ids = list(patient_ids)
+            if not patient_ids:
+                conditions.append('0')
+            else:
+                conditions.append(
+                    f"{alias}.patient_id IN ({', '.join('?' * len(patient_ids))})")
+                params.extend(patient_ids)
+        if start is not None:
+            conditions.append(f'{alias}.timestamp >= ?')
+            params.append(self._format_date(start))
+        if end is not None:
+            conditions.append(f'{alias}.timestamp < ?')
+            params.append(self._format_date(end))
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return where, params
+    
+    def _format_date(self, value):
+        """Fecha en el mismo formato que CURRENT_TIMESTAMP de SQLite"""
+        if isinstance(value, datetime):
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        return str(value)
+    
+    def _data_stamp(self):
+        """
+        Huella barata del estado de la base para invalidar la caché.
+        
+        Los MAX(id) detectan inserciones; los recuentos de sesiones cubren
+        borrados (los snapshots y ejercicios caen en cascada), sesiones
+        cerradas y sesiones archivadas.
+        """
+        return self.db.conn.execute('''
+            SELECT (SELECT MAX(id) FROM sessions),
+                   (SELECT COUNT(*) FROM sessions),
+                   (SELECT COUNT(duration) FROM sessions),
+                   (SELECT MAX(id) FROM emotion_snapshots),
+                   (SELECT COUNT(*) FROM archived_sessions),
+                   (SELECT MAX(id) FROM exercise_results),
+                   (SELECT COUNT(*) FROM exercise_results)
+        ''').fetchone()
+    
+    def _cached(self, name, args, compute):
+        """
+        Devuelve un resultado cacheado por firma de consulta o lo calcula.
+        
+        patient_ids se convierte en tupla una sola vez: un generador se
+        consumiría al construir la clave y compute vería una lista vacía.
+        
+        Args:
+            name: Nombre de la métrica
+            args: Argumentos de la consulta (el primero, patient_ids)
+            compute: Función compute(patient_ids) que calcula el resultado
+            
+        Returns:
+            Resultado de la métrica
+        """
+        patient_ids, *rest = args
+        if patient_ids is not None:
+            patient_ids = tuple(patient_ids)
+        key = (name, None if patient_ids is None else tuple(sorted(patient_ids)),
+               *(self._format_date(v) if v is not None else None for v in rest))
+        stamp = self._data_stamp()
+        
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._cache.move_to_end(key)
+                return entry[1]
+        
+        result = compute(patient_ids)
+        
+        with self._cache_lock:
+            self._cache[key] = (stamp, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
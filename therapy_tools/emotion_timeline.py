@@ -0,0 +1,167 @@
+# Timeline de emociones respaldado por arrays para los ejercicios terapéuticos
+# Sustituye las listas de diccionarios por un array estructurado que crece por bloques
+
+import struct
+
+import numpy as np
+
+from therapy_tools.session_database import EMOTION_COLUMNS
+
+
+# Una fila por medición: instante (segundos) y las seis puntuaciones
+TIMELINE_DTYPE = np.dtype([('timestamp', '<f8')] + [(emotion, '<f4') for emotion in EMOTION_COLUMNS])
+
+# Cabecera del formato binario: magic, versión, número de filas, instante inicial
+_TIMELINE_HEADER = struct.Struct('<4sBId')
+_TIMELINE_MAGIC = b'EMOT'
+_TIMELINE_VERSION = 1
+
+# Fila persistida: offset desde el inicio (float32) y puntuaciones (float32)
+_STORED_DTYPE = np.dtype([('offset', '<f4')] + [(emotion, '<f4') for emotion in EMOTION_COLUMNS])
+
+
+def encode_timeline(timestamps, scores):
+    """
+    Codifica un timeline en el formato binario de exercise_results.timeline.
+    
+    Formato:
+    - Cabecera fija (magic, versión, número de filas, instante inicial)
+    - Una fila de 28 bytes por medición: offset en segundos desde el
+      instante inicial y las seis puntuaciones, todo en float32
+      
+    Args:
+        timestamps: Array (T,) con instantes en segundos
+        scores: Array (T, 6) con puntuaciones en el orden de EMOTION_COLUMNS
+        
+    Returns:
+        bytes: Timeline listo para guardar como BLOB
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64).reshape(len(timestamps), len(EMOTION_COLUMNS))
+    start = float(timestamps[0]) if len(timestamps) else 0.0
+    
+    rows = np.empty(len(timestamps), dtype=_STORED_DTYPE)
+    rows['offset'] = timestamps - start
+    for i, emotion in enumerate(EMOTION_COLUMNS):
+        rows[emotion] = scores[:, i]
+    
+    header = _TIMELINE_HEADER.pack(_TIMELINE_MAGIC, _TIMELINE_VERSION, len(rows), start)
+    return header + rows.tobytes()
+
+
+def decode_timeline(data):
+    """
+    Decodifica un timeline generado por encode_timeline.
+    
+    Args:
+        data: Bytes del timeline
+        
+    Returns:
+        tuple: (offsets, scores) con offsets float64 (T,) en segundos desde
+               el inicio del ejercicio y scores float64 (T, 6)
+    """
+    magic, version, num_rows, _ = _TIMELINE_HEADER.unpack_from(data)
+    if magic != _TIMELINE_MAGIC or version != _TIMELINE_VERSION:
+        raise ValueError("Timeline de ejercicio no reconocido")
+    
+    rows = np.frombuffer(data, dtype=_STORED_DTYPE, count=num_rows,
+                         offset=_TIMELINE_HEADER.size)
+    offsets = rows['offset'].astype(np.float64)
+    scores = np.column_stack([rows[emotion] for emotion in EMOTION_COLUMNS]).astype(np.float64)
+    return offsets, scores.reshape(num_rows, len(EMOTION_COLUMNS))
+
+
+class EmotionTimeline:
+    """
+    Timeline de emociones de un ejercicio.
+    
+    ¿Por qué?
+    - Guardar un diccionario y un float por frame ocupa ~700 bytes por
+      medición: 10 minutos de mindfulness son ~18.000 diccionarios
+    - Aquí cada medición es una fila de 32 bytes en un array estructurado
+      preasignado, que duplica su capacidad cuando se llena
+    - Las columnas se leen como arrays sin copiar (timeline['fear'])
+    - to_bytes() produce el BLOB que guarda SessionDatabase
+    """
+    
+    def __init__(self, capacity=1024):
+        """
+        Inicializa un timeline vacío.
+        
+        Args:
+            capacity: Filas preasignadas inicialmente
+        """
+        self._data = np.zeros(max(1, capacity), dtype=TIMELINE_DTYPE)
+        self._size = 0
+    
+    @classmethod
+    def from_records(cls, emotions_list, timestamps=None):
+        """
+        Construye un timeline a partir de listas (formato anterior).
+        
+        Args:
+            emotions_list: Lista de diccionarios de emociones
+            timestamps: Lista de instantes (None = índice de la medición)
+            
+        Returns:
+            EmotionTimeline: Timeline con las mediciones
+        """
+        if timestamps is None:
+            timestamps = range(len(emotions_list))
+        timeline = cls(capacity=len(emotions_list))
+        for timestamp, emotions in zip(timestamps, emotions_list):
+            timeline.append(timestamp, emotions)
+        return timeline
+    
+    def append(self, timestamp, emotions):
+        """
+        Añade una medición.
+        
+        Args:
+            timestamp: Instante en segundos
+            emotions: Diccionario de puntuaciones (las que falten valen 0)
+        """
+        if self._size == len(self._data):
+            grown = np.zeros(len(self._data) * 2, dtype=TIMELINE_DTYPE)
+            grown[:self._size] = self._data
+            self._data = grown
+        
+        self._data[self._size] = (timestamp,) + tuple(
+            emotions.get(emotion, 0) for emotion in EMOTION_COLUMNS)
+        self._size += 1
+    
+    def clear(self):
+        """Vacía el timeline conservando la memoria reservada"""
+        self._size = 0
+    
+    def __len__(self):
+        return self._size
+    
+    def __getitem__(self, emotion):
+        """Columna de una emoción (o 'timestamp') como array, sin copiar"""
+        return self._data[emotion][:self._size]
+    
+    @property
+    def timestamps(self):
+        """Instantes de las mediciones (T,)"""
+        return self['timestamp']
+    
+    @property
+    def scores(self):
+        """Puntuaciones (T, 6) en el orden de EMOTION_COLUMNS"""
+        return np.column_stack([self[emotion] for emotion in EMOTION_COLUMNS]).reshape(
+            self._size, len(EMOTION_COLUMNS)).astype(np.float64)
+    
+    @property
+    def nbytes(self):
+        """Memoria ocupada por las filas usadas"""
+        return self._size * TIMELINE_DTYPE.itemsize
+    
+    def to_bytes(self):
+        """
+        Codifica el timeline para guardarlo en la base de datos.
+        
+        Returns:
+            bytes: Ver encode_timeline
+        """
+        return encode_timeline(self.timestamps, self.scores)
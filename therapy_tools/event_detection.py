@@ -0,0 +1,147 @@
+# Detección de eventos emocionales en el momento de guardar cada snapshot
+# Cruces de umbral con histéresis, episodios sostenidos y cambios bruscos
+
+from collections import deque
+
+import numpy as np
+
+from therapy_tools.session_database import EMOTION_COLUMNS
+
+
+# Tipos de evento (columna event_type de session_events)
+CROSSING = 'crossing'          # La emoción supera el umbral de entrada
+EPISODE = 'episode'            # Tramo sostenido por encima del umbral
+RAPID_CHANGE = 'rapid_change'  # Subida o bajada brusca en pocos segundos
+
+# Umbrales (entrada, salida) por defecto: el de salida más bajo evita que el
+# ruido alrededor del umbral genere un evento por frame
+DEFAULT_THRESHOLDS = {emotion: (70.0, 60.0) for emotion in EMOTION_COLUMNS}
+
+
+class EventDetector:
+    """
+    Detector de eventos de una sesión, alimentado snapshot a snapshot.
+    
+    ¿Por qué?
+    - El dashboard buscaba "momentos críticos" recorriendo todo el timeline
+      (fear > 70) cada vez que se abría una sesión
+    - Aquí cada snapshot actualiza un pequeño estado por emoción y los
+      eventos se guardan en session_events al ingerir los datos
+    - Cruces con histéresis: se entra en estado alto al superar el umbral de
+      entrada y solo se sale al bajar del de salida
+    - Episodios: cada estado alto que dura al menos min_duration segundos
+      se guarda como un tramo (inicio, fin, pico)
+    - Cambios bruscos: variación de al menos change_points en
+      change_window segundos
+      
+    Los eventos son tuplas (event_type, emotion, start_offset, end_offset, value):
+    value es el valor al cruzar, el pico del episodio o el cambio con signo.
+    """
+    
+    def __init__(self, thresholds=None, min_duration=5.0, change_points=30.0, change_window=3.0):
+        """
+        Inicializa el detector.
+        
+        Args:
+            thresholds: Diccionario emoción -> (entrada, salida) (None = DEFAULT_THRESHOLDS)
+            min_duration: Segundos mínimos para registrar un episodio
+            change_points: Variación mínima (puntos) para un cambio brusco
+            change_window: Segundos en los que se mide la variación
+        """
+        self.thresholds = dict(DEFAULT_THRESHOLDS if thresholds is None else thresholds)
+        self.min_duration = min_duration
+        self.change_points = change_points
+        self.change_window = change_window
+        
+        # Estado por emoción
+        self._high_since = {}     # Inicio del estado alto en curso
+        self._peak = {}           # Pico del estado alto en curso
+        self._recent = {emotion: deque() for emotion in self.thresholds}
+        self._change_until = {}   # Fin del período refractario de cambios bruscos
+        self._last_offset = None
+    
+    def update(self, offset, emotions):
+        """
+        Procesa un snapshot.
+        
+        Args:
+            offset: Segundos desde el inicio de la sesión
+            emotions: Diccionario de puntuaciones
+            
+        Returns:
+            list: Eventos detectados en este snapshot
+        """
+        events = []
+        for emotion, (enter, exit_) in self.thresholds.items():
+            value = float(emotions.get(emotion, 0))
+            
+            # Cruces con histéresis y episodios
+            if emotion not in self._high_since:
+                if value >= enter:
+                    self._high_since[emotion] = offset
+                    self._peak[emotion] = value
+                    events.append((CROSSING, emotion, offset, offset, value))
+            else:
+                self._peak[emotion] = max(self._peak[emotion], value)
+                if value < exit_:
+                    events.extend(self._close_episode(emotion, offset))
+            
+            # Cambio brusco frente al valor más antiguo de la ventana
+            recent = self._recent[emotion]
+            recent.append((offset, value))
+            while recent and recent[0][0] < offset - self.change_window:
+                recent.popleft()
+            start, first = recent[0]
+            delta = value - first
+            if abs(delta) >= self.change_points and offset >= self._change_until.get(emotion, -np.inf):
+                events.append((RAPID_CHANGE, emotion, start, offset, delta))
+                self._change_until[emotion] = offset + self.change_window
+        
+        self._last_offset = offset
+        return events
+    
+    def finish(self, offset=None):
+        """
+        Cierra los episodios abiertos al terminar la sesión.
+        
+        Args:
+            offset: Fin de la sesión (None = último snapshot)
+            
+        Returns:
+            list: Episodios que seguían abiertos
+        """
+        end = self._last_offset if offset is None else offset
+        events = []
+        for emotion in list(self._high_since):
+            events.extend(self._close_episode(emotion, end))
+        return events
+    
+    def _close_episode(self, emotion, end):
+        """Termina el estado alto de una emoción y devuelve su episodio si duró lo suficiente"""
+        start = self._high_since.pop(emotion)
+        peak = self._peak.pop(emotion)
+        if end is not None and end - start >= self.min_duration:
+            return [(EPISODE, emotion, start, end, peak)]
+        return []
+
+
+def detect_events(offsets, scores, **kwargs):
+    """
+    Detecta los eventos de un timeline completo.
+    
+    Para sesiones guardadas antes de existir session_events (o archivadas).
+    
+    Args:
+        offsets: Array (T,) con segundos desde el inicio
+        scores: Array (T, 6) en el orden de EMOTION_COLUMNS
+        **kwargs: Parámetros de EventDetector
+        
+    Returns:
+        list: Eventos en orden de detección
+    """
+    detector = EventDetector(**kwargs)
+    events = []
+    for offset, values in zip(np.asarray(offsets).tolist(), np.asarray(scores).tolist()):
+        events.extend(detector.update(offset, dict(zip(EMOTION_COLUMNS, values))))
+    events.extend(detector.finish())
+    return events
@@ -0,0 +1,97 @@
+# Planificador de fases de los ejercicios terapéuticos
+# Reloj monótono, fases con fecha límite y dibujo limitado a un número de fps
+
+import time
+
+
+class ExerciseScheduler:
+    """
+    Marca el ritmo de las fases de un ejercicio.
+    
+    ¿Por qué?
+    - Los bucles while time.time() - inicio < duración giraban sin pausa
+      (un núcleo completo) y mezclaban el reloj de pared con time.sleep(),
+      así que las fases se alargaban en máquinas lentas
+    - Aquí cada fase tiene una fecha límite absoluta en el reloj monótono
+    - Las fases consecutivas se encadenan: una fase empieza exactamente
+      donde terminó la anterior, sin acumular retrasos
+    - El dibujo se limita a fps fotogramas por segundo durmiendo hasta el
+      siguiente tick; si un fotograma se retrasa se saltan ticks en vez de
+      dibujar en ráfaga
+      
+    Uso:
+        for elapsed, remaining in scheduler.phase(4):
+            ...dibujar...
+    """
+    
+    def __init__(self, fps=30, max_lateness=0.25, clock=time.monotonic, sleep=time.sleep):
+        """
+        Inicializa el planificador.
+        
+        Args:
+            fps: Fotogramas por segundo del dibujo
+            max_lateness: Segundos de retraso tolerados para encadenar una
+                          fase con la anterior; con más retraso (p. ej. tras
+                          esperar al usuario) la fase empieza en el momento actual
+            clock: Función de reloj monótono (segundos)
+            sleep: Función de espera (segundos)
+        """
+        self.fps = fps
+        self.max_lateness = max_lateness
+        self.clock = clock
+        self.sleep = sleep
+        self._cursor = None
+    
+    def reset(self):
+        """Olvida la fecha límite de la fase anterior"""
+        self._cursor = None
+    
+    def phase(self, duration):
+        """
+        Recorre una fase a ritmo de fps hasta su fecha límite.
+        
+        Args:
+            duration: Duración de la fase en segundos
+            
+        Yields:
+            tuple: (elapsed, remaining) en segundos, una vez por fotograma
+        """
+        start = self._phase_start()
+        end = start + duration
+        self._cursor = end
+        period = 1.0 / self.fps
+        
+        tick = 0
+        while True:
+            now = self.clock()
+            if now >= end:
+                return
+            yield now - start, end - now
+            
+            # Siguiente tick absoluto; si vamos atrasados se saltan ticks
+            tick = max(tick + 1, int((self.clock() - start) / period) + 1)
+            self._sleep_until(min(start + tick * period, end))
+    
+    def wait(self, duration):
+        """
+        Espera hasta la fecha límite de una fase sin dibujar.
+        
+        Args:
+            duration: Duración de la espera en segundos
+        """
+        start = self._phase_start()
+        self._cursor = start + duration
+        self._sleep_until(self._cursor)
+    
+    def _phase_start(self):
+        """Inicio de la siguiente fase: el final de la anterior si es reciente"""
+        now = self.clock()
+        if self._cursor is not None and 0 <= now - self._cursor <= self.max_lateness:
+            return self._cursor
+        return now
+    
+    def _sleep_until(self, deadline):
+        """Duerme hasta un instante del reloj monótono"""
+        delay = deadline - self.clock()
+        if delay > 0:
+            self.sleep(delay)
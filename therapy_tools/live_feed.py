@@ -0,0 +1,204 @@
+# Bus de publicación/suscripción de emociones en vivo, dentro del proceso
+# Conecta el bucle de captura con el dashboard sin pasar por SQLite
+
+import threading
+from collections import deque
+
+
+class Subscription:
+    """
+    Cola acotada de un suscriptor del EmotionBus.
+    
+    Cuando la cola está llena se descarta la medición más antigua: el
+    publicador nunca espera y el suscriptor siempre ve lo más reciente.
+    """
+    
+    def __init__(self, bus, maxsize):
+        """
+        Inicializa la cola (se crea con EmotionBus.open()).
+        
+        Args:
+            bus: EmotionBus al que pertenece
+            maxsize: Mediciones guardadas como máximo
+        """
+        self._bus = bus
+        self._queue = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+    
+    def put(self, item):
+        """Encola una medición (llamado por el bus desde el hilo publicador)"""
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(item)
+            self._cond.notify()
+    
+    def get(self, timeout=None):
+        """
+        Espera y devuelve la siguiente medición.
+        
+        Args:
+            timeout: Segundos de espera como máximo (None = sin límite)
+            
+        Returns:
+            tuple: (timestamp, emotions), o None si se agotó el tiempo o la
+                   suscripción se cerró
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._queue or self.closed, timeout):
+                return None
+            return self._queue.popleft() if self._queue else None
+    
+    def drain(self):
+        """
+        Devuelve todas las mediciones pendientes sin esperar.
+        
+        Returns:
+            list: Lista de (timestamp, emotions) en orden de llegada
+        """
+        with self._cond:
+            items = list(self._queue)
+            self._queue.clear()
+        return items
+    
+    def close(self):
+        """Se da de baja del bus y despierta a quien espere en get()"""
+        self._bus._remove(self)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+    
+    def __len__(self):
+        with self._cond:
+            return len(self._queue)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class EmotionBus:
+    """
+    Publicación/suscripción de emociones en vivo dentro del proceso.
+    
+    ¿Por qué?
+    - El dashboard solo veía los datos cuando llegaban a SQLite, y
+      TherapyVideoStream guardaba una muestra por segundo
+    - Aquí el bucle de reconocimiento publica cada medición y cada
+      suscriptor tiene su propia cola acotada
+    - Si un suscriptor es lento se descartan sus mediciones más antiguas
+      (y se cuentan en dropped): el bucle de captura nunca espera
+    - Publicar solo copia la lista de suscriptores y encola; no llama a
+      código del suscriptor en el hilo de captura
+      
+    Formas de suscribirse:
+    - open(): devuelve una Subscription para leer con get() o drain()
+      (p. ej. el dashboard la vacía en cada refresco de Tk)
+    - subscribe(callback): un hilo propio vacía la cola y llama a
+      callback(timestamp, emotions), la misma interfaz que MeasurementEngine
+      
+    El bus es invocable, así que también puede suscribirse a un
+    MeasurementEngine: engine.subscribe(bus).
+    """
+    
+    def __init__(self, maxsize=256):
+        """
+        Inicializa el bus.
+        
+        Args:
+            maxsize: Tamaño por defecto de la cola de cada suscriptor
+        """
+        self.maxsize = maxsize
+        self.published = 0
+        self._subscriptions = ()  # Se reemplaza entera: publish() no necesita el lock
+        self._callbacks = {}
+        self._lock = threading.Lock()
+    
+    def open(self, maxsize=None):
+        """
+        Abre una suscripción con cola propia.
+        
+        Args:
+            maxsize: Tamaño de la cola (None = el del bus)
+            
+        Returns:
+            Subscription: Cola de mediciones; cerrarla con close()
+        """
+        subscription = Subscription(self, maxsize or self.maxsize)
+        with self._lock:
+            self._subscriptions = self._subscriptions + (subscription,)
+        return subscription
+    
+    def subscribe(self, callback, maxsize=None):
+        """
+        Registra un callback atendido por un hilo propio.
+        
+        Args:
+            callback: Función callback(timestamp, emotions)
+            maxsize: Tamaño de la cola (None = el del bus)
+        """
+        subscription = self.open(maxsize)
+        thread = threading.Thread(target=self._dispatch, args=(subscription, callback),
+                                  name='EmotionBus', daemon=True)
+        with self._lock:
+            self._callbacks[callback] = (subscription, thread)
+        thread.start()
+    
+    def unsubscribe(self, callback):
+        """Elimina un callback registrado con subscribe() y espera a su hilo"""
+        with self._lock:
+            entry = self._callbacks.pop(callback, None)
+        if entry is None:
+            return
+        subscription, thread = entry
+        subscription.close()
+        if thread is not threading.current_thread():
+            thread.join()
+    
+    def publish(self, timestamp, emotions):
+        """
+        Publica una medición a todos los suscriptores sin bloquearse.
+        
+        Args:
+            timestamp: Instante en segundos (reloj monótono)
+            emotions: Diccionario de puntuaciones
+        """
+        item = (timestamp, dict(emotions))  # Copia única compartida por los suscriptores
+        for subscription in self._subscriptions:
+            subscription.put(item)
+        self.published += 1
+    
+    __call__ = publish
+    
+    def subscriber_count(self):
+        """Número de suscripciones abiertas"""
+        return len(self._subscriptions)
+    
+    def close(self):
+        """Cierra todas las suscripciones"""
+        for callback in list(self._callbacks):
+            self.unsubscribe(callback)
+        for subscription in self._subscriptions:
+            subscription.close()
+    
+    def _remove(self, subscription):
+        """Quita una suscripción de la lista de destinatarios"""
+        with self._lock:
+            self._subscriptions = tuple(s for s in self._subscriptions if s is not subscription)
+    
+    def _dispatch(self, subscription, callback):
+        """Bucle del hilo de un callback: espera mediciones y las entrega"""
+        while True:
+            item = subscription.get()
+            if item is None:
+                if subscription.closed:
+                    return
+                continue
+            try:
+                callback(*item)
+            except Exception as e:
+                print(f"Error en suscriptor del bus de emociones: {e}")
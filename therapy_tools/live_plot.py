@@ -0,0 +1,182 @@
+# Gráfico en vivo de emociones con blitting
+# Lo usan los ejercicios (sobre el frame de OpenCV) y el dashboard (en Tkinter)
+
+import threading
+import time
+
+import numpy as np
+
+# Intentar importar matplotlib (sin pyplot: no usa estado global ni ventanas)
+try:
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    MATPLOTLIB_AVAILABLE = True
+except ImportError:
+    MATPLOTLIB_AVAILABLE = False
+
+from therapy_tools.charts import EMOTION_COLORS, EMOTION_NAMES_ES
+
+# Colores y nombres por defecto (los mismos que el dashboard)
+DEFAULT_COLORS = EMOTION_COLORS
+DEFAULT_LABELS = EMOTION_NAMES_ES
+
+
+class LivePlot:
+    """
+    Traza en vivo de emociones sobre una ventana de tiempo fija.
+    
+    ¿Por qué?
+    - Redibujar una figura completa (ejes, textos, leyenda) cuesta decenas
+      de milisegundos y congela la interfaz de Tk
+    - Aquí los ejes, la rejilla y la leyenda se dibujan una sola vez y se
+      guardan como fondo; cada actualización restaura el fondo, cambia los
+      datos de las líneas y dibuja solo las líneas (blitting)
+    - El eje X es fijo (últimos window_seconds), así que el fondo no cambia
+      mientras los datos avanzan
+    - Las mediciones se guardan en un buffer circular preasignado
+    
+    append() se puede llamar desde el hilo de medición (el objeto es
+    invocable y se suscribe al MeasurementEngine); refresh() y to_image()
+    se llaman desde el hilo de la interfaz.
+    """
+    
+    def __init__(self, emotions=('fear', 'happy'), window_seconds=60, capacity=1200,
+                 figsize=(3.2, 1.6), dpi=100, colors=None, labels=None, max_fps=10,
+                 title=None):
+        """
+        Inicializa el gráfico.
+        
+        Args:
+            emotions: Emociones a trazar
+            window_seconds: Segundos visibles en el eje X
+            capacity: Mediciones guardadas en el buffer circular
+            figsize: Tamaño de la figura en pulgadas
+            dpi: Resolución de la figura
+            colors: Diccionario emoción -> color (None = DEFAULT_COLORS)
+            labels: Diccionario emoción -> nombre (None = DEFAULT_LABELS)
+            max_fps: Actualizaciones por segundo como máximo
+            title: Título opcional del gráfico
+        """
+        if not MATPLOTLIB_AVAILABLE:
+            raise ImportError("matplotlib no está instalado. Instalar con: pip install matplotlib")
+        
+        self.emotions = tuple(emotions)
+        self.window_seconds = window_seconds
+        self.max_fps = max_fps
+        colors = colors or DEFAULT_COLORS
+        labels = labels or DEFAULT_LABELS
+        
+        # Figura con canvas Agg por defecto; FigureCanvasTkAgg lo sustituye
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot(111)
+        self.ax.set_xlim(-window_seconds, 0)
+        self.ax.set_ylim(0, 100)
+        self.ax.grid(True, alpha=0.3)
+        self.ax.tick_params(labelsize=7)
+        if title:
+            self.ax.set_title(title, fontsize=9, fontweight='bold')
+        
+        # Líneas animadas: canvas.draw() no las incluye en el fondo
+        self.lines = [
+            self.ax.plot([], [], color=colors.get(emotion), label=labels.get(emotion, emotion),
+                         linewidth=1.5, animated=True)[0]
+            for emotion in self.emotions
+        ]
+        self.ax.legend(loc='upper left', fontsize=7)
+        self.figure.tight_layout()
+        
+        # Buffer circular de mediciones
+        self._times = np.zeros(capacity)
+        self._values = np.zeros((capacity, len(self.emotions)))
+        self._head = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        
+        self._canvas = None
+        self._background = None
+        self._last_refresh = 0.0
+        self._image = None
+    
+    def append(self, timestamp, emotions):
+        """
+        Añade una medición al buffer circular.
+        
+        Args:
+            timestamp: Instante en segundos (reloj monótono)
+            emotions: Diccionario de puntuaciones
+        """
+        with self._lock:
+            self._times[self._head] = timestamp
+            self._values[self._head] = [emotions.get(emotion, 0) for emotion in self.emotions]
+            self._head = (self._head + 1) % len(self._times)
+            self._size = min(self._size + 1, len(self._times))
+    
+    __call__ = append
+    
+    def clear(self):
+        """Vacía el buffer"""
+        with self._lock:
+            self._head = 0
+            self._size = 0
+    
+    def refresh(self, force=False):
+        """
+        Redibuja las líneas con blitting.
+        
+        Args:
+            force: Si es True, ignora el límite de max_fps
+            
+        Returns:
+            bool: True si se redibujó
+        """
+        now = time.monotonic()
+        if not force and now - self._last_refresh < 1.0 / self.max_fps:
+            return False
+        self._last_refresh = now
+        
+        canvas = self.figure.canvas
+        if canvas is not self._canvas:
+            # Canvas nuevo (p. ej. al integrarlo en Tk): capturar su fondo
+            canvas.mpl_connect('draw_event', self._on_draw)
+            self._canvas = canvas
+            self._background = None
+        if self._background is None:
+            canvas.draw()
+        
+        times, values = self._ordered()
+        x = times - times[-1] if len(times) else times
+        
+        canvas.restore_region(self._background)
+        for i, line in enumerate(self.lines):
+            line.set_data(x, values[:, i])
+            self.ax.draw_artist(line)
+        canvas.blit(self.ax.bbox)
+        return True
+    
+    def to_image(self):
+        """
+        Devuelve el gráfico como imagen BGR para dibujarlo sobre un frame.
+        
+        Solo se redibuja a max_fps; entre actualizaciones se reutiliza la
+        última imagen.
+        
+        Returns:
+            np.ndarray: Imagen (alto, ancho, 3) en BGR
+        """
+        if self.refresh() or self._image is None:
+            rgba = np.asarray(self.figure.canvas.buffer_rgba())
+            self._image = np.ascontiguousarray(rgba[..., 2::-1])
+        return self._image
+    
+    def _ordered(self):
+        """Copia del buffer en orden cronológico"""
+        with self._lock:
+            if self._size < len(self._times):
+                return self._times[:self._size].copy(), self._values[:self._size].copy()
+            order = np.r_[self._head:len(self._times), 0:self._head]
+            return self._times[order], self._values[order]
+    
+    def _on_draw(self, event):
+        """Guarda el fondo tras cada dibujado completo (inicio o redimensionado)"""
+        self._background = self._canvas.copy_from_bbox(self.ax.bbox)
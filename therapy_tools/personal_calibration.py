@@ -2,8 +2,12 @@
 # a las características expresivas únicas de cada paciente
 
 import numpy as np
+import copy
 import json
 import time
+import threading
+import weakref
+from collections import OrderedDict
 import cv2
 import os
 import sys
@@ -11,6 +15,229 @@ import sys
 # Agregar el directorio padre al path para poder importar emotion_processor
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+from emotion_processor.score_transforms.main import ScoreTransformChain
+from emotion_processor.score_transforms.score_transform import ScoreTransform
+from therapy_tools.session_database import EMOTION_COLUMNS
+
+
+class CompiledCalibration:
+    """
+    Calibración compilada a vectores de NumPy en el orden de EMOTION_COLUMNS.
+    
+    ¿Por qué?
+    - adjust_emotion_score consulta adjustment_factors emoción a emoción
+      en cada frame
+    - Compilada, la calibración es una sola operación afín con recorte:
+      clip((x - baseline) * scale, lower, upper)
+    - Funciona igual con un frame (6,) que con un timeline completo (T, 6),
+      así que se pueden recalibrar sesiones históricas en bloque
+      
+    Las emociones sin calibrar usan baseline 0, scale 1 y sin límites, de
+    modo que conservan su valor original (igual que adjust_emotion_score).
+    """
+    
+    def __init__(self, baseline, scale, lower, upper):
+        """
+        Inicializa la calibración compilada.
+        
+        Args:
+            baseline: Array (6,) con la línea base neutral de cada emoción
+            scale: Array (6,) con el factor de escala de cada emoción
+            lower: Array (6,) con el límite inferior tras el ajuste
+            upper: Array (6,) con el límite superior tras el ajuste
+        """
+        self.baseline = np.asarray(baseline, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        for array in (self.baseline, self.scale, self.lower, self.upper):
+            array.setflags(write=False)
+    
+    @classmethod
+    def from_factors(cls, adjustment_factors):
+        """
+        Compila los factores de ajuste de PersonalCalibration.
+        
+        Args:
+            adjustment_factors: Diccionario emoción -> factores
+            
+        Returns:
+            CompiledCalibration: Calibración compilada
+        """
+        num_emotions = len(EMOTION_COLUMNS)
+        baseline = np.zeros(num_emotions)
+        scale = np.ones(num_emotions)
+        lower = np.full(num_emotions, -np.inf)
+        upper = np.full(num_emotions, np.inf)
+        
+        for i, emotion in enumerate(EMOTION_COLUMNS):
+            factors = adjustment_factors.get(emotion)
+            if factors:
+                baseline[i] = factors['neutral_baseline']
+                scale[i] = factors['scale_factor']
+                lower[i], upper[i] = 0, 100
+        
+        return cls(baseline, scale, lower, upper)
+    
+    def apply(self, scores):
+        """
+        Aplica la calibración a un frame (6,) o a un timeline (T, 6).
+        
+        Args:
+            scores: Puntuaciones en el orden de EMOTION_COLUMNS
+            
+        Returns:
+            numpy.ndarray: Puntuaciones ajustadas con la misma forma
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        return np.clip((scores - self.baseline) * self.scale, self.lower, self.upper)
+    
+    def apply_dict(self, emotions_dict):
+        """
+        Aplica la calibración a un diccionario de emociones.
+        
+        Las claves que no están en EMOTION_COLUMNS se devuelven sin cambios.
+        
+        Args:
+            emotions_dict: Diccionario con puntuaciones de emociones
+            
+        Returns:
+            dict: Diccionario con puntuaciones ajustadas
+        """
+        present = [i for i, emotion in enumerate(EMOTION_COLUMNS) if emotion in emotions_dict]
+        values = np.array([emotions_dict[EMOTION_COLUMNS[i]] for i in present], dtype=np.float64)
+        adjusted = np.clip((values - self.baseline[present]) * self.scale[present],
+                           self.lower[present], self.upper[present])
+        
+        result = dict(emotions_dict)
+        for i, value in zip(present, adjusted.tolist()):
+            result[EMOTION_COLUMNS[i]] = value
+        return result
+
+
+class CalibrationCache:
+    """
+    Caché LRU en proceso de calibraciones compiladas, leídas de SessionDatabase.
+    
+    ¿Por qué?
+    - Cargar la calibración desde JSON en cada inicio de sesión obliga a
+      releer y compilar los factores
+    - Con varios flujos de vídeo en el mismo proceso, todos comparten la
+      misma calibración compilada
+    - Cada entrada guarda el ID de la versión: si se guarda una calibración
+      nueva, la siguiente validación la detecta y se recompila
+      
+    La validación contra la base (solo índice) se hace como mucho una vez
+    cada revalidate_after segundos por paciente; entre medias get() es una
+    búsqueda en un diccionario.
+    
+    CalibrationCache.shared(database) devuelve la caché común de una base de
+    datos: la usan PersonalCalibration.load_calibration y
+    CalibratedEmotionRecognitionSystem, así que cada instancia nueva no
+    vuelve a leer ni a compilar la calibración.
+    """
+    
+    # Cachés compartidas por base de datos (desaparecen con la base)
+    _shared = weakref.WeakKeyDictionary()
+    _shared_lock = threading.Lock()
+    
+    @classmethod
+    def shared(cls, database):
+        """
+        Devuelve la caché compartida de una base de datos (la crea si no existe).
+        
+        Args:
+            database: Instancia de SessionDatabase
+            
+        Returns:
+            CalibrationCache: Caché común a todas las instancias del proceso
+        """
+        with cls._shared_lock:
+            cache = cls._shared.get(database)
+            if cache is None:
+                cache = cls(database)
+                cls._shared[database] = cache
+            return cache
+    
+    def __init__(self, database, max_size=128, revalidate_after=1.0):
+        """
+        Inicializa la caché.
+        
+        Args:
+            database: Instancia de SessionDatabase
+            max_size: Número máximo de pacientes en caché
+            revalidate_after: Segundos entre validaciones de versión (0 = siempre)
+        """
+        self.db = database
+        self.max_size = max_size
+        self.revalidate_after = revalidate_after
+        self._entries = OrderedDict()  # patient_id -> (versión, compilada, fila, última validación)
+        self._lock = threading.Lock()
+    
+    def get(self, patient_id):
+        """
+        Obtiene la calibración compilada vigente de un paciente.
+        
+        Args:
+            patient_id: ID anónimo del paciente
+            
+        Returns:
+            CompiledCalibration: Calibración compilada, o None si no tiene
+        """
+        return self.lookup(patient_id)[1]
+    
+    def lookup(self, patient_id):
+        """
+        Obtiene la calibración vigente de un paciente: fila guardada y compilada.
+        
+        Args:
+            patient_id: ID anónimo del paciente
+            
+        Returns:
+            tuple: ((id, calibration_date, datos), CompiledCalibration), o
+                   (None, None) si no tiene. Los datos son compartidos: no
+                   modificarlos
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is not None and now - entry[3] < self.revalidate_after:
+                self._entries.move_to_end(patient_id)
+                return entry[2], entry[1]
+        
+        version = self.db.get_calibration_version(patient_id)
+        if entry is not None and entry[0] == version:
+            compiled, row = entry[1], entry[2]
+        elif version is None:
+            compiled, row = None, None
+        else:
+            row = self.db.get_calibration(patient_id)
+            if row is None:
+                version, compiled = None, None
+            else:
+                version = row[0]
+                compiled = CompiledCalibration.from_factors(row[2].get('adjustment_factors', {}))
+        
+        with self._lock:
+            self._entries[patient_id] = (version, compiled, row, now)
+            self._entries.move_to_end(patient_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return row, compiled
+    
+    def invalidate(self, patient_id=None):
+        """
+        Descarta la calibración de un paciente (o todas) de la caché.
+        
+        Args:
+            patient_id: ID del paciente, o None para vaciar la caché
+        """
+        with self._lock:
+            if patient_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(patient_id, None)
+
 
 class PersonalCalibration:
     """
@@ -30,14 +257,20 @@ class PersonalCalibration:
     - Rango expresivo: Unos tienen sonrisas enormes, otros apenas mueven los labios
     """
     
-    def __init__(self, emotion_recognition_system=None):
+    def __init__(self, emotion_recognition_system=None, database=None, cache=None):
         """
         Inicializa el sistema de calibración.
         
         Args:
             emotion_recognition_system: Instancia del sistema de reconocimiento de emociones
+            database: SessionDatabase opcional donde guardar/cargar calibraciones.
+                      Sin base de datos se usan archivos calibration_{patient_id}.json
+            cache: CalibrationCache para cargar calibraciones
+                   (None = la compartida de la base de datos)
         """
         self.emotion_system = emotion_recognition_system
+        self.database = database
+        self.cache = cache
         
         # Almacena líneas base personalizadas
         self.baseline_emotions = {
@@ -53,9 +286,22 @@ class PersonalCalibration:
         # Rangos personalizados (min-max para cada emoción)
         self.personal_ranges = {}
         
+        # Dispersión robusta (MAD) de cada paso y estadísticas de las
+        # características faciales crudas (mediana/MAD)
+        self.baseline_spread = {}
+        self.feature_baselines = {}
+        
         # Factores de ajuste
         self.adjustment_factors = {}
         
+        # Versión compilada de adjustment_factors (se genera al usarla)
+        self._compiled = None
+        
+        # (base de datos, paciente, compilada de la caché) de la última
+        # calibración cargada de la base; refresh() la usa para detectar
+        # versiones nuevas
+        self._source = None
+        
         # Emociones a calibrar
         self.emotions_to_calibrate = [
             ('happy', 'Felicidad', 'Sonría ampliamente, como si algo muy bueno hubiera pasado'),
@@ -66,7 +312,7 @@ class PersonalCalibration:
             ('disgust', 'Disgusto', 'Arrugue la nariz, como si oliera algo desagradable')
         ]
     
-    def start_calibration_wizard(self, camera, patient_id):
+    def start_calibration_wizard(self, camera, patient_id, show_video=False, sample_rate=10):
         """
         Asistente interactivo de calibración.
         
@@ -79,6 +325,9 @@ class PersonalCalibration:
         Args:
             camera: Instancia de la cámara
             patient_id: ID del paciente para guardar calibración
+            show_video: Si es True, muestra la cámara durante la captura.
+                        Por defecto la captura es sin ventana (headless)
+            sample_rate: Muestras por segundo en cada paso
         """
         print("=" * 60)
         print("CALIBRACIÓN PERSONAL DEL SISTEMA")
@@ -91,14 +340,15 @@ class PersonalCalibration:
         print("\n PASO 1/7: Estado Neutral")
         print("Por favor, mantenga una expresión facial relajada y neutral.")
         print("No sonría, no frunza el ceño, solo relájese.")
-        self.calibrate_neutral(camera, duration=30)
+        self.calibrate_neutral(camera, duration=30, sample_rate=sample_rate, show_video=show_video)
         
         # PASO 2-7: Calibrar cada emoción
         for i, (emotion_key, emotion_name, instruction) in enumerate(self.emotions_to_calibrate, 2):
             print(f"\n PASO {i}/7: {emotion_name}")
             print(f"Instrucción: {instruction}")
             input("Presione ENTER cuando esté listo...")
-            self.calibrate_emotion(camera, emotion_key, duration=10)
+            self.calibrate_emotion(camera, emotion_key, duration=10,
+                                   sample_rate=sample_rate, show_video=show_video)
         
         # PASO FINAL: Calcular ajustes
         print("\nCalculando ajustes personalizados...")
@@ -112,7 +362,7 @@ class PersonalCalibration:
         print("\nResumen de calibración:")
         self.print_calibration_summary()
     
-    def calibrate_neutral(self, camera, duration=30):
+    def calibrate_neutral(self, camera, duration=30, sample_rate=10, show_video=False):
         """
         Captura el estado neutral del paciente.
         
@@ -124,53 +374,15 @@ class PersonalCalibration:
         Args:
             camera: Instancia de la cámara
             duration: Duración de la captura en segundos
+            sample_rate: Muestras por segundo
+            show_video: Si es True, muestra la cámara con instrucciones
         """
         print(f"Capturando durante {duration} segundos...")
-        
-        samples = []
-        start_time = time.time()
-        countdown_shown = set()
-        
-        while time.time() - start_time < duration:
-            ret, frame = camera.read()
-            if not ret:
-                continue
-            
-            # Procesar frame
-            try:
-                emotions = self._get_emotions_from_frame(frame)
-                if emotions:
-                    samples.append(emotions)
-            except Exception as e:
-                pass
-            
-            # Mostrar countdown
-            remaining = int(duration - (time.time() - start_time))
-            if remaining not in countdown_shown and remaining <= 10:
-                print(f"  {remaining} segundos restantes...")
-                countdown_shown.add(remaining)
-            
-            # Mostrar video con overlay
-            cv2.putText(frame, "ESTADO NEUTRAL - Mantenga expresion relajada", 
-                       (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            cv2.putText(frame, f"Tiempo restante: {remaining}s", 
-                       (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            cv2.imshow('Calibracion', frame)
-            cv2.waitKey(1)
-        
-        cv2.destroyAllWindows()
-        
-        # Calcular promedios
-        if samples:
-            self.baseline_emotions['neutral'] = {
-                emotion: np.mean([s[emotion] for s in samples])
-                for emotion in samples[0].keys()
-            }
-            print(f"  Capturados {len(samples)} muestras de estado neutral")
-        else:
-            print("  No se pudieron capturar muestras. Intente de nuevo.")
+        self._calibrate_step(camera, 'neutral', duration, sample_rate, show_video,
+                             "ESTADO NEUTRAL - Mantenga expresion relajada", (0, 255, 0),
+                             countdown_from=10, indent="  ", description="estado neutral")
     
-    def calibrate_emotion(self, camera, emotion_key, duration=10):
+    def calibrate_emotion(self, camera, emotion_key, duration=10, sample_rate=10, show_video=False):
         """
         Captura una emoción específica expresada por el paciente.
         
@@ -183,48 +395,169 @@ class PersonalCalibration:
             camera: Instancia de la cámara
             emotion_key: Clave de la emoción a calibrar
             duration: Duración de la captura
+            sample_rate: Muestras por segundo
+            show_video: Si es True, muestra la cámara con instrucciones
         """
         print(f"  Exprese {emotion_key} durante {duration} segundos...")
-        
-        samples = []
-        start_time = time.time()
+        self._calibrate_step(camera, emotion_key, duration, sample_rate, show_video,
+                             f"EXPRESE: {emotion_key.upper()}", (0, 255, 255),
+                             countdown_from=5, indent="    ", description=emotion_key)
+    
+    def capture_samples(self, camera, duration, sample_rate=10, show_video=False,
+                        overlay_text=None, overlay_color=(0, 255, 0), countdown_from=None,
+                        indent="  "):
+        """
+        Captura muestras a frecuencia fija, sin dibujar la malla facial.
+        
+        ¿Por qué?
+        - frame_processing dibuja la malla y las barras en cada frame; para
+          calibrar solo hacen falta las medidas
+        - Muestrear a frecuencia fija evita procesar más frames de los
+          necesarios y da el mismo peso a cada instante de la captura
+        - Las medidas se guardan en arrays reservados de antemano
+          (características crudas y puntuaciones), sin diccionarios por muestra
+          
+        Args:
+            camera: Instancia de la cámara
+            duration: Duración de la captura en segundos
+            sample_rate: Muestras por segundo
+            show_video: Si es True, muestra la cámara con overlay_text (sin malla)
+            overlay_text: Texto a mostrar sobre el vídeo
+            overlay_color: Color BGR del texto
+            countdown_from: Segundos desde los que se imprime la cuenta atrás (None = sin cuenta)
+            indent: Sangría de los mensajes de cuenta atrás
+            
+        Returns:
+            tuple: (features, scores, feature_names) con features (N, F),
+                   scores (N, 6) en el orden de EMOTION_COLUMNS y N muestras válidas
+        """
+        capacity = max(1, int(np.ceil(duration * sample_rate)))
+        scores = np.empty((capacity, len(EMOTION_COLUMNS)))
+        features = None
+        feature_keys = []
+        count = 0
+        
+        interval = 1.0 / sample_rate
+        start_time = time.monotonic()
         countdown_shown = set()
         
-        while time.time() - start_time < duration:
+        for tick in range(capacity):
+            # Esperar al siguiente instante de muestreo (sin espera activa)
+            delay = start_time + tick * interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            
             ret, frame = camera.read()
             if not ret:
                 continue
             
-            try:
-                emotions = self._get_emotions_from_frame(frame)
-                if emotions:
-                    samples.append(emotions)
-            except:
-                pass
+            measurement = self._measure_frame(frame)
+            if measurement is not None:
+                processed_features, emotions = measurement
+                if features is None:
+                    feature_keys = self._feature_keys(processed_features)
+                    features = np.empty((capacity, len(feature_keys)))
+                features[count] = [processed_features[group][name] for group, name in feature_keys]
+                scores[count] = [emotions.get(emotion, 0) for emotion in EMOTION_COLUMNS]
+                count += 1
             
-            remaining = int(duration - (time.time() - start_time))
-            if remaining not in countdown_shown and remaining <= 5:
-                print(f"    {remaining} segundos...")
+            remaining = int(duration - (time.monotonic() - start_time))
+            if (countdown_from is not None and remaining not in countdown_shown
+                    and remaining <= countdown_from):
+                print(f"{indent}{remaining} segundos restantes...")
                 countdown_shown.add(remaining)
             
-            # Mostrar video con overlay
-            cv2.putText(frame, f"EXPRESE: {emotion_key.upper()}", 
-                       (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
-            cv2.putText(frame, f"Tiempo restante: {remaining}s", 
-                       (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
-            cv2.imshow('Calibracion', frame)
-            cv2.waitKey(1)
-        
-        cv2.destroyAllWindows()
-        
-        if samples:
-            self.baseline_emotions[emotion_key] = {
-                emotion: np.mean([s[emotion] for s in samples])
-                for emotion in samples[0].keys()
-            }
-            print(f"    Capturados {len(samples)} muestras de {emotion_key}")
-        else:
-            print(f"    No se pudieron capturar muestras de {emotion_key}")
+            if show_video:
+                if overlay_text:
+                    cv2.putText(frame, overlay_text,
+                               (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, overlay_color, 2)
+                cv2.putText(frame, f"Tiempo restante: {remaining}s",
+                           (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, overlay_color, 2)
+                cv2.imshow('Calibracion', frame)
+                cv2.waitKey(1)
+        
+        if show_video:
+            cv2.destroyAllWindows()
+        
+        if features is None:
+            features = np.empty((0, 0))
+        feature_names = [f"{group}.{name}" for group, name in feature_keys]
+        return features[:count], scores[:count], feature_names
+    
+    def robust_statistics(self, samples):
+        """
+        Calcula mediana y MAD por columna en una sola pasada vectorizada.
+        
+        ¿Por qué mediana/MAD y no media?
+        - Un parpadeo, un giro de cabeza o un frame mal detectado desplazan
+          la media; la mediana los ignora
+        - La MAD (escalada por 1.4826) estima la desviación típica sin que
+          los valores atípicos la inflen
+          
+        Args:
+            samples: Array (N, C)
+            
+        Returns:
+            tuple: (median, mad) arrays (C,)
+        """
+        median = np.median(samples, axis=0)
+        mad = 1.4826 * np.median(np.abs(samples - median), axis=0)
+        return median, mad
+    
+    def _calibrate_step(self, camera, key, duration, sample_rate, show_video,
+                        overlay_text, overlay_color, countdown_from, indent, description):
+        """Captura un paso del asistente y guarda sus estadísticas robustas"""
+        features, scores, feature_names = self.capture_samples(
+            camera, duration, sample_rate, show_video, overlay_text, overlay_color,
+            countdown_from, indent
+        )
+        
+        if len(scores) == 0:
+            print(f"{indent}No se pudieron capturar muestras de {description}. Intente de nuevo.")
+            return
+        
+        score_median, score_mad = self.robust_statistics(scores)
+        self.baseline_emotions[key] = dict(zip(EMOTION_COLUMNS, score_median.tolist()))
+        self.baseline_spread[key] = dict(zip(EMOTION_COLUMNS, score_mad.tolist()))
+        
+        feature_median, feature_mad = self.robust_statistics(features)
+        self.feature_baselines[key] = {
+            'names': feature_names,
+            'median': feature_median.tolist(),
+            'mad': feature_mad.tolist()
+        }
+        print(f"{indent}Capturados {len(scores)} muestras de {description}")
+    
+    def _measure_frame(self, frame):
+        """
+        Mide un frame sin dibujar: malla facial, características y emociones.
+        
+        Args:
+            frame: Frame de imagen
+            
+        Returns:
+            tuple: (características procesadas, emociones), o None si no hay rostro
+        """
+        if not self.emotion_system:
+            return None
+        try:
+            analysis = self.emotion_system.analyze(frame)
+        except Exception:
+            return None
+        if not analysis.face_found:
+            return None
+        # La calibración se calcula sobre las puntuaciones sin transformar
+        return analysis.features, analysis.raw_scores
+    
+    def _feature_keys(self, processed_features):
+        """Claves (grupo, medida) de las características numéricas, en orden estable"""
+        return [
+            (group, name)
+            for group in sorted(processed_features)
+            for name in sorted(processed_features[group])
+            if np.isscalar(processed_features[group][name])
+            and not isinstance(processed_features[group][name], str)
+        ]
     
     def calculate_adjustment_factors(self):
         """
@@ -242,8 +575,9 @@ class PersonalCalibration:
         - Ahora 45% de B se escala a 84%, comparable con A
         """
         neutral = self.baseline_emotions.get('neutral', {})
+        self._compiled = None
         
-        for emotion in ['happy', 'sad', 'angry', 'fear', 'surprise', 'disgust']:
+        for emotion in EMOTION_COLUMNS:
             if emotion in self.baseline_emotions and self.baseline_emotions[emotion]:
                 # Calcular rango personal
                 neutral_value = neutral.get(emotion, 0)
@@ -309,56 +643,137 @@ class PersonalCalibration:
         """
         Ajusta todas las emociones en un diccionario.
         
+        Usa la calibración compilada: una sola operación vectorizada por frame.
+        
         Args:
             emotions_dict: Diccionario con puntuaciones de emociones
             
         Returns:
             dict: Diccionario con puntuaciones ajustadas
         """
-        adjusted = {}
-        for emotion, score in emotions_dict.items():
-            adjusted[emotion] = self.adjust_emotion_score(emotion, score)
-        return adjusted
+        return self.compile().apply_dict(emotions_dict)
     
-    def save_calibration(self, patient_id):
+    def adjust_timeline(self, scores):
+        """
+        Ajusta un timeline completo de una sola vez.
+        
+        Args:
+            scores: Array (T, 6) en el orden de EMOTION_COLUMNS
+            
+        Returns:
+            numpy.ndarray: Array (T, 6) con puntuaciones ajustadas
+        """
+        return self.compile().apply(scores)
+    
+    def recalibrate_sessions(self, database, session_ids):
+        """
+        Recalibra sesiones históricas con la calibración actual.
+        
+        Útil cuando el paciente se calibra después de haber grabado
+        sesiones: los datos guardados no se modifican.
+        
+        Args:
+            database: Instancia de SessionDatabase
+            session_ids: IDs de las sesiones
+            
+        Returns:
+            dict: session_id -> (offsets, scores ajustados (T, 6))
+        """
+        compiled = self.compile()
+        recalibrated = {}
+        for session_id in session_ids:
+            offsets, scores = database.get_session_emotions_array(session_id)
+            recalibrated[session_id] = (offsets, compiled.apply(scores))
+        return recalibrated
+    
+    def compile(self):
+        """
+        Devuelve la calibración compilada (se recalcula al cambiar los factores).
+        
+        Returns:
+            CompiledCalibration: Calibración compilada
+        """
+        if self._compiled is None:
+            self._compiled = CompiledCalibration.from_factors(self.adjustment_factors)
+        return self._compiled
+    
+    def save_calibration(self, patient_id, database=None):
         """
         Guarda calibración para uso futuro.
         
+        Con base de datos se guarda como una nueva versión en la tabla
+        calibrations (no depende del directorio de trabajo y no hay
+        carreras entre procesos); si no, en calibration_{patient_id}.json.
+        
         Args:
             patient_id: ID del paciente
+            database: SessionDatabase (default: la indicada al crear la instancia)
         """
         calibration_data = {
             'patient_id': patient_id,
             'calibration_date': time.strftime('%Y-%m-%d %H:%M:%S'),
             'baseline_emotions': self.baseline_emotions,
             'adjustment_factors': self.adjustment_factors,
-            'personal_ranges': self.personal_ranges
+            'personal_ranges': self.personal_ranges,
+            'baseline_spread': self.baseline_spread,
+            'feature_baselines': self.feature_baselines
         }
         
+        database = database or self.database
+        if database is not None:
+            version = database.save_calibration(
+                patient_id, calibration_data, calibration_data['calibration_date'])
+            # Las demás instancias ven la versión nueva sin esperar a revalidar
+            self._cache_for(database).invalidate(patient_id)
+            self._source = (database, patient_id, None)
+            print(f"  Calibración guardada en la base de datos (versión {version})")
+            return
+        
         filename = f"calibration_{patient_id}.json"
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(calibration_data, f, indent=2, ensure_ascii=False)
         
         print(f"  Calibración guardada en: {filename}")
     
-    def load_calibration(self, patient_id):
+    def load_calibration(self, patient_id, database=None):
         """
         Carga calibración guardada previamente.
         
+        Busca primero la versión vigente en la base de datos y, si no hay,
+        el archivo calibration_{patient_id}.json. La base se consulta a
+        través de CalibrationCache: si otra instancia ya cargó la misma
+        versión, no se vuelve a leer ni a compilar.
+        
         Args:
             patient_id: ID del paciente
+            database: SessionDatabase (default: la indicada al crear la instancia)
             
         Returns:
             bool: True si se cargó exitosamente, False si no
         """
+        database = database or self.database
+        if database is not None:
+            try:
+                row, compiled = self._cache_for(database).lookup(patient_id)
+            except Exception as e:
+                print(f"Error cargando calibración: {e}")
+                row, compiled = None, None
+            # Aunque no haya calibración en la base, refresh() cargará la
+            # que se guarde más adelante
+            self._source = (database, patient_id, compiled)
+            if row is not None:
+                # Copia: los datos de la caché se comparten entre instancias
+                self._apply_calibration_data(copy.deepcopy(row[2]))
+                self._compiled = compiled
+                print(f"Calibración cargada para paciente {patient_id} ({row[1]})")
+                return True
+        
         filename = f"calibration_{patient_id}.json"
         try:
             with open(filename, 'r', encoding='utf-8') as f:
                 calibration_data = json.load(f)
             
-            self.baseline_emotions = calibration_data['baseline_emotions']
-            self.adjustment_factors = calibration_data['adjustment_factors']
-            self.personal_ranges = calibration_data['personal_ranges']
+            self._apply_calibration_data(calibration_data)
             
             print(f"Calibración cargada para paciente {patient_id}")
             return True
@@ -369,6 +784,51 @@ class PersonalCalibration:
             print(f"Error cargando calibración: {e}")
             return False
     
+    def refresh(self):
+        """
+        Recarga la calibración si hay una versión nueva en la base de datos.
+        
+        Pensado para llamarse en cada frame (ver CalibrationTransform): la
+        versión se valida a través de CalibrationCache, así que la base se
+        consulta como mucho una vez cada revalidate_after segundos. Solo
+        actúa si la calibración se cargó o guardó con base de datos.
+        
+        Returns:
+            bool: True si se cargó una versión nueva
+        """
+        source = self._source
+        if source is None:
+            return False
+        database, patient_id, loaded = source
+        try:
+            row, compiled = self._cache_for(database).lookup(patient_id)
+        except Exception as e:
+            print(f"Error validando calibración: {e}")
+            return False
+        if row is None or compiled is loaded:
+            return False
+        
+        self._apply_calibration_data(copy.deepcopy(row[2]))
+        self._compiled = compiled
+        self._source = (database, patient_id, compiled)
+        return True
+    
+    def _apply_calibration_data(self, calibration_data):
+        """Carga los datos de una calibración guardada"""
+        self.baseline_emotions = calibration_data['baseline_emotions']
+        self.adjustment_factors = calibration_data['adjustment_factors']
+        self.personal_ranges = calibration_data['personal_ranges']
+        # Calibraciones anteriores a la captura robusta no tienen estos campos
+        self.baseline_spread = calibration_data.get('baseline_spread', {})
+        self.feature_baselines = calibration_data.get('feature_baselines', {})
+        self._compiled = None
+    
+    def _cache_for(self, database):
+        """Caché de calibraciones de una base de datos (la propia o la compartida)"""
+        if self.cache is not None and self.cache.db is database:
+            return self.cache
+        return CalibrationCache.shared(database)
+    
     def print_calibration_summary(self):
         """Muestra resumen de la calibración"""
         print("\n" + "=" * 60)
@@ -392,16 +852,8 @@ class PersonalCalibration:
         Returns:
             dict: Diccionario con puntuaciones de emociones, o None si falla
         """
-        if self.emotion_system:
-            try:
-                # Procesar frame
-                self.emotion_system.frame_processing(frame)
-                # Obtener últimas emociones detectadas
-                emotions = self.emotion_system.emotions_recognition.last_emotions
-                return emotions
-            except:
-                return None
-        return None
+        measurement = self._measure_frame(frame)
+        return measurement[1] if measurement is not None else None
     
     def is_calibrated(self):
         """
@@ -413,79 +865,118 @@ class PersonalCalibration:
         return len(self.adjustment_factors) > 0
 
 
+class CalibrationTransform(ScoreTransform):
+    """
+    Calibración personal como transformación de puntuaciones.
+    
+    Se coloca al principio de la cadena de EmotionRecognitionSystem (antes
+    del suavizado y el recorte). Usa la calibración compilada: una sola
+    operación vectorizada por frame y ningún dibujado extra.
+    
+    Si la calibración se cargó de una base de datos, cada frame llama a
+    PersonalCalibration.refresh(): una recalibración guardada por otra
+    instancia o proceso se aplica al flujo en curso en menos de
+    revalidate_after segundos (ver CalibrationCache), sin reiniciarlo.
+    """
+    
+    def __init__(self, calibration):
+        """
+        Args:
+            calibration: Instancia de PersonalCalibration
+        """
+        self.calibration = calibration
+    
+    def transform(self, scores):
+        """Ajusta las puntuaciones si hay calibración activa"""
+        self.calibration.refresh()
+        if not self.calibration.is_calibrated():
+            return dict(scores)
+        return self.calibration.adjust_all_emotions(scores)
+
+
 class CalibratedEmotionRecognitionSystem:
     """
     Versión del sistema de reconocimiento de emociones que usa calibración personal.
     
     Este es un wrapper sobre el sistema original que aplica ajustes de calibración
     a las emociones detectadas.
+    
+    La calibración va primero en una cadena propia, seguida de la cadena
+    del sistema base (anidada, no copiada: las transformaciones que se
+    añadan o quiten después en el sistema base también se aplican); la
+    imagen se dibuja una sola vez con las puntuaciones finales. Con base de
+    datos, las recalibraciones guardadas después se aplican sin recrear el
+    sistema (ver CalibrationTransform).
     """
     
-    def __init__(self, base_system, patient_id=None):
+    def __init__(self, base_system, patient_id=None, database=None, calibration_cache=None):
         """
         Inicializa el sistema calibrado.
         
         Args:
             base_system: Instancia de EmotionRecognitionSystem
             patient_id: ID del paciente para cargar calibración
+            database: SessionDatabase opcional con las calibraciones
+            calibration_cache: CalibrationCache (None = la compartida de la base
+                               de datos: varios sistemas del mismo paciente
+                               comparten la calibración compilada)
         """
         self.base_system = base_system
-        self.calibration = PersonalCalibration(base_system)
+        self.calibration = PersonalCalibration(base_system, database, cache=calibration_cache)
         self.last_calibrated_emotions = {}
         
+        # Calibración + la cadena del sistema base, sin modificarla; se anida
+        # para que sus cambios posteriores se vean en cada frame
+        self.score_transforms = ScoreTransformChain(
+            [CalibrationTransform(self.calibration), base_system.score_transforms]
+        )
+        
         # Intentar cargar calibración existente
         if patient_id:
             self.calibration.load_calibration(patient_id)
     
-    def frame_processing(self, face_image):
+    def frame_processing(self, face_image, return_emotions=False):
         """
         Procesa frame aplicando calibración personal.
         
         Args:
             face_image: Imagen del frame a procesar
+            return_emotions: Si es True, retorna también las emociones del frame
             
         Returns:
-            numpy.ndarray: Imagen procesada con visualización de emociones
+            numpy.ndarray: Imagen procesada con visualización de emociones, o
+            tuple (imagen, emociones calibradas o None si no hay rostro) si
+            return_emotions es True
         """
-        # Procesamiento normal
-        result = self.base_system.frame_processing(face_image)
+        # Análisis con la cadena calibrada: la calibración es una transformación más
+        analysis = self.base_system.analyze(face_image, transforms=self.score_transforms)
+        emotions = analysis.scores if analysis.face_found else None
+        if emotions is not None and self.calibration.is_calibrated():
+            self.last_calibrated_emotions = emotions
         
-        # Aplicar ajustes de calibración si existen
-        if self.calibration.is_calibrated():
-            try:
-                # Obtener emociones originales
-                original_emotions = self.base_system.emotions_recognition.last_emotions
-                
-                # Ajustar cada emoción
-                self.last_calibrated_emotions = self.calibration.adjust_all_emotions(
-                    original_emotions
-                )
-                
-                # Actualizar visualización con emociones ajustadas
-                result = self.base_system.emotions_visualization.main(
-                    self.last_calibrated_emotions, 
-                    result
-                )
-            except Exception as e:
-                pass
+        # Un solo dibujado, con las emociones ya ajustadas
+        result = self.base_system.render(face_image, analysis)
         
+        if return_emotions:
+            return result, emotions
         return result
     
-    def run_calibration(self, camera, patient_id):
+    def run_calibration(self, camera, patient_id, show_video=False):
         """
         Ejecuta el proceso de calibración.
         
         Args:
             camera: Instancia de la cámara
             patient_id: ID del paciente
+            show_video: Si es True, muestra la cámara durante la captura
         """
-        self.calibration.start_calibration_wizard(camera, patient_id)
+        self.calibration.start_calibration_wizard(camera, patient_id, show_video=show_video)
     
     def get_calibrated_emotions(self):
         """
         Obtiene las últimas emociones calibradas.
         
         Returns:
-            dict: Diccionario con emociones ajustadas
+            Mapping: Emociones ajustadas, de solo lectura (seguro entre hilos)
         """
         return self.last_calibrated_emotions
@@ -1,19 +1,46 @@
 # Gestión de privacidad, consentimiento y protección de datos
 # Cumple con GDPR, HIPAA y mejores prácticas de seguridad
 
+import base64
+import gzip
 import hashlib
 import json
+import os
+import sqlite3
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import tkinter as tk
 from tkinter import messagebox, scrolledtext
 
+from therapy_tools.session_database import EMOTION_COLUMNS
+from therapy_tools.audit_log import AuditLog
+from therapy_tools.retention_engine import RetentionEngine
+
 # Intentar importar cryptography, si no está disponible usar encriptación básica
 try:
+    from cryptography.exceptions import InvalidTag
     from cryptography.fernet import Fernet
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
     CRYPTO_AVAILABLE = True
 except ImportError:
     CRYPTO_AVAILABLE = False
-    import base64
+
+
+# Formato de encriptación por bloques (encrypt_stream / decrypt_stream)
+# Cabecera: magic, versión, modo, tamaño de bloque, prefijo aleatorio del nonce
+_STREAM_HEADER = struct.Struct('<4sBBI8s')
+_STREAM_MAGIC = b'EMOS'
+_STREAM_VERSION = 1
+_STREAM_MODE_BASE64 = 0   # Sin cryptography: misma codificación básica que encrypt_sensitive_data
+_STREAM_MODE_AESGCM = 1   # AES-256-GCM con clave derivada de la clave Fernet
+_CHUNK_LENGTH = struct.Struct('<I')
+_CHUNK_AAD = struct.Struct('<IB')   # Índice del bloque y marca de último bloque
+_GCM_TAG_SIZE = 16
+STREAM_CHUNK_SIZE = 64 * 1024
 
 
 class PrivacyManager:
@@ -31,13 +58,14 @@ class PrivacyManager:
     - Política de retención de datos
     """
     
-    def __init__(self, encryption_key=None):
+    def __init__(self, encryption_key=None, log_file='access_log.json'):
         """
         Inicializa el gestor de privacidad.
         
         Args:
             encryption_key: Clave de encriptación opcional. Si no se proporciona,
                           se genera una nueva.
+            log_file: Archivo del registro de auditoría
         """
         self.consent_given = False
         self.anonymize = True
@@ -45,6 +73,7 @@ class PrivacyManager:
         # Generar o cargar clave de encriptación
         if CRYPTO_AVAILABLE:
             if encryption_key:
+                self.key = encryption_key
                 self.cipher = Fernet(encryption_key)
             else:
                 self.key = Fernet.generate_key()
@@ -52,10 +81,12 @@ class PrivacyManager:
         else:
             self.cipher = None
             self.key = encryption_key or 'default_key_32_bytes_for_enc!!'
+        self._stream_aead = None
         
-        # Registro de accesos (auditoría)
-        self.access_log = []
-        self.log_file = 'access_log.json'
+        # Registro de accesos (auditoría): escritura en segundo plano,
+        # rotación por tamaño e índice por paciente/acción/fecha
+        self.log_file = log_file
+        self.audit_log = AuditLog(log_file)
     
     def request_consent(self, patient_name=None):
         """
@@ -265,6 +296,277 @@ Al hacer clic en "ACEPTO", confirmo que:
             decoded = base64.b64decode(encrypted_data)
             return decoded.decode('utf-8')
     
+    def encrypt_stream(self, src, dst, chunk_size=STREAM_CHUNK_SIZE, workers=1):
+        """
+        Encripta un flujo binario por bloques de tamaño fijo.
+        
+        ¿Por qué por bloques?
+        - encrypt_sensitive_data necesita todo el contenido en memoria y lo
+          devuelve en base64 (un 33% más grande)
+        - Aquí cada bloque se encripta por separado y se escribe en binario:
+          la memoria usada es constante aunque el archivo ocupe varios GB
+        - Cada bloque lleva su propio nonce y su índice y la marca de último
+          bloque van autenticados: no se pueden reordenar, quitar ni truncar
+          bloques sin que la desencriptación falle
+          
+        Con cryptography se usa AES-256-GCM con una clave derivada (HKDF) de
+        la clave Fernet del gestor; sin cryptography se usa la misma
+        codificación básica (base64) que encrypt_sensitive_data.
+        
+        src y dst pueden ser archivos abiertos en modo binario o BLOBs de
+        SQLite abiertos con Connection.blobopen (ver encrypted_size).
+        
+        Args:
+            src: Objeto con read() del que se lee el contenido
+            dst: Objeto con write() donde se escribe el contenido encriptado
+            chunk_size: Tamaño de bloque en bytes
+            workers: Hilos de encriptación (>1 para archivos muy grandes)
+            
+        Returns:
+            int: Bytes de contenido original encriptados
+        """
+        aead = self._get_stream_aead()
+        mode = _STREAM_MODE_AESGCM if aead is not None else _STREAM_MODE_BASE64
+        header = _STREAM_HEADER.pack(_STREAM_MAGIC, _STREAM_VERSION, mode,
+                                     chunk_size, os.urandom(8))
+        dst.write(header)
+        
+        def chunks():
+            # Leer un bloque por adelantado para saber cuál es el último
+            index = 0
+            current = self._read_exact(src, chunk_size)
+            while True:
+                following = self._read_exact(src, chunk_size) if len(current) == chunk_size else b''
+                yield index, current, not following
+                if not following:
+                    return
+                current = following
+                index += 1
+        
+        def seal(item):
+            index, chunk, final = item
+            if aead is None:
+                return base64.b64encode(chunk)
+            return aead.encrypt(self._chunk_nonce(header, index), chunk,
+                                header + _CHUNK_AAD.pack(index, final))
+        
+        total = 0
+        for (_, chunk, _), sealed in self._map_ordered(seal, chunks(), workers):
+            dst.write(_CHUNK_LENGTH.pack(len(sealed)))
+            dst.write(sealed)
+            total += len(chunk)
+        return total
+    
+    def decrypt_stream(self, src, dst, workers=1):
+        """
+        Desencripta un flujo generado por encrypt_stream.
+        
+        Los bloques se escriben a medida que se verifican: si el flujo está
+        manipulado o truncado se lanza ValueError y dst puede contener una
+        parte del contenido (decrypt_file la elimina).
+        
+        Args:
+            src: Objeto con read() del que se lee el contenido encriptado
+            dst: Objeto con write() donde se escribe el contenido original
+            workers: Hilos de desencriptación
+            
+        Returns:
+            int: Bytes de contenido original escritos
+        """
+        header = self._read_exact(src, _STREAM_HEADER.size)
+        if len(header) != _STREAM_HEADER.size:
+            raise ValueError("Flujo encriptado truncado")
+        magic, version, mode, chunk_size, _ = _STREAM_HEADER.unpack(header)
+        if magic != _STREAM_MAGIC or version != _STREAM_VERSION:
+            raise ValueError("Flujo encriptado no reconocido")
+        
+        aead = None
+        if mode == _STREAM_MODE_AESGCM:
+            aead = self._get_stream_aead()
+            if aead is None:
+                raise ValueError("Se necesita cryptography para desencriptar este flujo")
+        # Límite de tamaño de bloque: evita reservar memoria con una cabecera corrupta
+        max_sealed = self._sealed_size(chunk_size, mode)
+        
+        def chunks():
+            index = 0
+            current = self._read_sealed_chunk(src, max_sealed)
+            if current is None:
+                raise ValueError("Flujo encriptado truncado")
+            while True:
+                following = self._read_sealed_chunk(src, max_sealed)
+                yield index, current, following is None
+                if following is None:
+                    return
+                current = following
+                index += 1
+        
+        def unseal(item):
+            index, sealed, final = item
+            if aead is None:
+                return base64.b64decode(sealed)
+            try:
+                return aead.decrypt(self._chunk_nonce(header, index), sealed,
+                                    header + _CHUNK_AAD.pack(index, final))
+            except InvalidTag:
+                raise ValueError(f"Bloque {index} manipulado o flujo truncado") from None
+        
+        total = 0
+        for _, chunk in self._map_ordered(unseal, chunks(), workers):
+            dst.write(chunk)
+            total += len(chunk)
+        return total
+    
+    def encrypt_file(self, input_path, output_path=None, chunk_size=STREAM_CHUNK_SIZE, workers=1):
+        """
+        Encripta un archivo (p. ej. una exportación GDPR) con encrypt_stream.
+        
+        Args:
+            input_path: Archivo original
+            output_path: Archivo encriptado (default: input_path + '.enc')
+            chunk_size: Tamaño de bloque en bytes
+            workers: Hilos de encriptación (>1 para archivos de varios GB)
+            
+        Returns:
+            str: Ruta del archivo encriptado
+        """
+        output_path = output_path or input_path + '.enc'
+        self._transform_file(self.encrypt_stream, input_path, output_path,
+                             chunk_size=chunk_size, workers=workers)
+        return output_path
+    
+    def decrypt_file(self, input_path, output_path=None, workers=1):
+        """
+        Desencripta un archivo generado por encrypt_file.
+        
+        Args:
+            input_path: Archivo encriptado
+            output_path: Archivo de salida (default: input_path sin '.enc')
+            workers: Hilos de desencriptación
+            
+        Returns:
+            str: Ruta del archivo desencriptado
+        """
+        if output_path is None:
+            if not input_path.endswith('.enc'):
+                raise ValueError("Indique output_path para archivos sin extensión .enc")
+            output_path = input_path[:-len('.enc')]
+        self._transform_file(self.decrypt_stream, input_path, output_path, workers=workers)
+        return output_path
+    
+    def encrypted_size(self, plain_size, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Tamaño exacto que ocupará un contenido tras encrypt_stream.
+        
+        Sirve para reservar un BLOB de SQLite antes de escribirlo por bloques:
+        
+            size = privacy.encrypted_size(len_original)
+            conn.execute('INSERT INTO t (data) VALUES (zeroblob(?))', (size,))
+            with conn.blobopen('t', 'data', rowid) as blob:
+                privacy.encrypt_stream(src, blob)
+                
+        Args:
+            plain_size: Tamaño del contenido original en bytes
+            chunk_size: Tamaño de bloque en bytes
+            
+        Returns:
+            int: Tamaño del contenido encriptado en bytes
+        """
+        mode = _STREAM_MODE_AESGCM if self._get_stream_aead() is not None else _STREAM_MODE_BASE64
+        full_chunks, remainder = divmod(plain_size, chunk_size)
+        size = _STREAM_HEADER.size + full_chunks * (_CHUNK_LENGTH.size + self._sealed_size(chunk_size, mode))
+        if remainder or plain_size == 0:
+            size += _CHUNK_LENGTH.size + self._sealed_size(remainder, mode)
+        return size
+    
+    def _get_stream_aead(self):
+        """Cifrador AES-GCM derivado de la clave Fernet (None sin cryptography)"""
+        if not (CRYPTO_AVAILABLE and self.cipher):
+            return None
+        if self._stream_aead is None:
+            # Clave independiente de las de Fernet (firma y encriptación)
+            stream_key = HKDF(
+                algorithm=hashes.SHA256(),
+                length=32,
+                salt=None,
+                info=b'therapy_tools stream encryption v1'
+            ).derive(base64.urlsafe_b64decode(self.key))
+            self._stream_aead = AESGCM(stream_key)
+        return self._stream_aead
+    
+    def _chunk_nonce(self, header, index):
+        """Nonce de 96 bits: prefijo aleatorio del flujo + índice del bloque"""
+        return header[-8:] + struct.pack('<I', index)
+    
+    def _sealed_size(self, plain_size, mode):
+        """Tamaño de un bloque encriptado"""
+        if mode == _STREAM_MODE_AESGCM:
+            return plain_size + _GCM_TAG_SIZE
+        return 4 * ((plain_size + 2) // 3)
+    
+    def _read_sealed_chunk(self, src, max_sealed):
+        """Lee un bloque encriptado (None al final del flujo)"""
+        length = self._read_exact(src, _CHUNK_LENGTH.size)
+        if not length:
+            return None
+        if len(length) != _CHUNK_LENGTH.size:
+            raise ValueError("Flujo encriptado truncado")
+        (size,) = _CHUNK_LENGTH.unpack(length)
+        if size > max_sealed:
+            raise ValueError("Bloque encriptado con tamaño inválido")
+        sealed = self._read_exact(src, size)
+        if len(sealed) != size:
+            raise ValueError("Flujo encriptado truncado")
+        return sealed
+    
+    def _read_exact(self, src, size):
+        """Lee size bytes salvo fin de flujo (read() puede devolver menos)"""
+        data = src.read(size)
+        if len(data) == size or not data:
+            return data
+        parts = [data]
+        remaining = size - len(data)
+        while remaining:
+            data = src.read(remaining)
+            if not data:
+                break
+            parts.append(data)
+            remaining -= len(data)
+        return b''.join(parts)
+    
+    def _map_ordered(self, func, items, workers):
+        """
+        Aplica func a cada elemento y devuelve (elemento, resultado) en orden.
+        
+        Con workers > 1 usa un pool de hilos (AES-GCM libera el GIL) con una
+        ventana acotada de bloques en vuelo: la memoria sigue siendo constante.
+        """
+        if workers <= 1:
+            for item in items:
+                yield item, func(item)
+            return
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for item in items:
+                pending.append((item, pool.submit(func, item)))
+                if len(pending) >= workers * 2:
+                    done_item, future = pending.popleft()
+                    yield done_item, future.result()
+            while pending:
+                done_item, future = pending.popleft()
+                yield done_item, future.result()
+    
+    def _transform_file(self, transform, input_path, output_path, **kwargs):
+        """Aplica encrypt_stream/decrypt_stream entre archivos, sin dejar salidas a medias"""
+        try:
+            with open(input_path, 'rb') as src, open(output_path, 'wb') as dst:
+                transform(src, dst, **kwargs)
+        except Exception:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+    
     def log_access(self, action, user, details=''):
         """
         Registra todos los accesos a datos de pacientes.
@@ -280,22 +582,10 @@ Al hacer clic en "ACEPTO", confirmo que:
             user: Usuario que realizó la acción
             details: Detalles adicionales
         """
-        log_entry = {
-            'timestamp': datetime.now().isoformat(),
-            'action': action,
-            'user': user,
-            'details': details
-        }
-        self.access_log.append(log_entry)
-        
-        # Guardar en archivo de log
-        try:
-            with open(self.log_file, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + '\n')
-        except Exception as e:
-            print(f"Error guardando log: {e}")
+        # Solo encola la entrada: la escritura en disco no bloquea la sesión
+        self.audit_log.log(action, user, details)
     
-    def export_patient_data(self, patient_id, database):
+    def export_patient_data(self, patient_id, database, format='json', compress=False):
         """
         Exporta todos los datos del paciente (Derecho de acceso GDPR).
         
@@ -304,72 +594,141 @@ Al hacer clic en "ACEPTO", confirmo que:
         - Paciente puede solicitar copia de todos sus datos
         - Debe ser en formato legible y portable
         
+        La exportación es en streaming: los snapshots se leen con una única
+        consulta ordenada y se escriben a medida que llegan, así que la
+        memoria usada no depende de cuántos años de datos tenga el paciente.
+        
         Args:
             patient_id: ID anónimo del paciente
             database: Instancia de SessionDatabase
+            format: 'json' (documento único) o 'ndjson' (un registro por línea)
+            compress: Si es True, el archivo se comprime con gzip
             
         Returns:
             str: Ruta del archivo exportado
         """
-        self.log_access('EXPORT_DATA', patient_id, 'Patient requested data export')
+        if format not in ('json', 'ndjson'):
+            raise ValueError(f"Formato de exportación no soportado: {format}")
         
-        # Obtener todas las sesiones
-        sessions = database.get_patient_sessions(patient_id, limit=1000)
+        self.log_access('EXPORT_DATA', patient_id, 'Patient requested data export')
         
-        export_data = {
+        header = {
             'patient_id': patient_id,
             'export_date': datetime.now().isoformat(),
-            'export_type': 'GDPR_DATA_ACCESS_REQUEST',
-            'sessions': []
+            'export_type': 'GDPR_DATA_ACCESS_REQUEST'
         }
         
-        for session in sessions:
-            session_id, timestamp, duration, session_type, notes = session
-            emotions = database.get_session_emotions(session_id)
-            
-            export_data['sessions'].append({
-                'session_id': session_id,
-                'date': timestamp,
-                'duration_seconds': duration,
-                'duration_minutes': duration // 60 if duration else 0,
-                'type': session_type,
-                'emotions_timeline': [
-                    {
-                        'timestamp_offset': e[0],
-                        'happy': e[1],
-                        'sad': e[2],
-                        'angry': e[3],
-                        'fear': e[4],
-                        'surprise': e[5],
-                        'disgust': e[6]
-                    } for e in emotions
-                ]
-            })
-        
-        # Agregar historial de ejercicios si existe
+        filename = f"patient_data_export_{patient_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+        if compress:
+            filename += '.gz'
+            f = gzip.open(filename, 'wt', encoding='utf-8')
+        else:
+            f = open(filename, 'w', encoding='utf-8')
+        
+        with f:
+            if format == 'json':
+                self._write_json_export(f, header, patient_id, database)
+            else:
+                self._write_ndjson_export(f, header, patient_id, database)
+        
+        return filename
+    
+    def _write_json_export(self, f, header, patient_id, database):
+        """
+        Escribe la exportación como un único documento JSON, incrementalmente.
+        
+        Args:
+            f: Archivo de texto abierto para escritura
+            header: Metadatos de la exportación
+            patient_id: ID anónimo del paciente
+            database: Instancia de SessionDatabase
+        """
+        def dump(value):
+            return json.dumps(value, ensure_ascii=False)
+        
+        f.write('{\n')
+        for key, value in header.items():
+            f.write(f'  {dump(key)}: {dump(value)},\n')
+        
+        f.write('  "sessions": [')
+        first_session = True
+        for session, snapshots in database.iter_patient_timeline(patient_id):
+            session_info = self._export_session_info(session)
+            # Abrir el objeto de la sesión sin cerrarlo para anexar el timeline
+            f.write(('\n' if first_session else ',\n') + '    ' + dump(session_info)[:-1])
+            f.write(', "emotions_timeline": [')
+            first_snapshot = True
+            for snapshot in snapshots:
+                f.write(('\n' if first_snapshot else ',\n') + '      ')
+                f.write(dump(self._export_snapshot(snapshot)))
+                first_snapshot = False
+            f.write(']}' if first_snapshot else '\n    ]}')
+            first_session = False
+        f.write('\n  ],\n' if not first_session else '],\n')
+        
+        f.write('  "exercises": [')
+        first_exercise = True
+        for exercise in self._iter_export_exercises(patient_id, database):
+            f.write(('\n' if first_exercise else ',\n') + '    ' + dump(exercise))
+            first_exercise = False
+        f.write('\n  ]\n' if not first_exercise else ']\n')
+        f.write('}\n')
+    
+    def _write_ndjson_export(self, f, header, patient_id, database):
+        """
+        Escribe la exportación como NDJSON (un registro JSON por línea).
+        
+        Registros: 'export' (cabecera), 'session', 'snapshot' y 'exercise'.
+        
+        Args:
+            f: Archivo de texto abierto para escritura
+            header: Metadatos de la exportación
+            patient_id: ID anónimo del paciente
+            database: Instancia de SessionDatabase
+        """
+        def write(record_type, data):
+            f.write(json.dumps({'record': record_type, **data}, ensure_ascii=False) + '\n')
+        
+        write('export', header)
+        for session, snapshots in database.iter_patient_timeline(patient_id):
+            write('session', self._export_session_info(session))
+            for snapshot in snapshots:
+                write('snapshot', {'session_id': session[0], **self._export_snapshot(snapshot)})
+        
+        for exercise in self._iter_export_exercises(patient_id, database):
+            write('exercise', exercise)
+    
+    def _export_session_info(self, session):
+        """Convierte una fila de sesión al formato de exportación"""
+        session_id, timestamp, duration, session_type = session
+        return {
+            'session_id': session_id,
+            'date': timestamp,
+            'duration_seconds': duration,
+            'duration_minutes': duration // 60 if duration else 0,
+            'type': session_type
+        }
+    
+    def _export_snapshot(self, snapshot):
+        """Convierte un snapshot al formato de exportación"""
+        return dict(zip(('timestamp_offset',) + EMOTION_COLUMNS, snapshot))
+    
+    def _iter_export_exercises(self, patient_id, database):
+        """Recorre el historial de ejercicios en formato de exportación"""
         try:
-            exercises = database.get_patient_exercise_history(patient_id, limit=1000)
-            export_data['exercises'] = [
-                {
+            for e in database.iter_patient_exercises(patient_id):
+                yield {
                     'type': e[0],
                     'date': e[1],
                     'initial_anxiety': e[2],
                     'final_anxiety': e[3],
                     'reduction_percent': e[4],
                     'success': bool(e[5])
-                } for e in exercises
-            ]
-        except:
-            export_data['exercises'] = []
-        
-        # Guardar en JSON
-        filename = f"patient_data_export_{patient_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(export_data, f, indent=2, ensure_ascii=False)
-        
-        return filename
+                }
+        except sqlite3.Error:
+            return
     
-    def delete_patient_data(self, patient_id, database):
+    def delete_patient_data(self, patient_id, database, confirm=True):
         """
         Elimina todos los datos del paciente (Derecho al olvido GDPR).
         
@@ -380,69 +739,62 @@ Al hacer clic en "ACEPTO", confirmo que:
         
         IRREVERSIBLE - Requiere confirmación múltiple
         
+        El borrado lo hace RetentionEngine en lotes cortos, así que puede
+        ejecutarse mientras se graban otras sesiones.
+        
         Args:
             patient_id: ID del paciente
             database: Instancia de SessionDatabase
+            confirm: Si es False no se muestran diálogos (uso desatendido)
             
         Returns:
             bool: True si se eliminaron los datos, False si se canceló
         """
-        # Confirmación de seguridad
-        confirm = messagebox.askyesno(
-            "ELIMINAR DATOS - ACCIÓN IRREVERSIBLE",
-            f"¿Está SEGURO de eliminar TODOS los datos del paciente {patient_id}?\n\n"
-            "Esta acción NO se puede deshacer.\n"
-            "Se eliminarán:\n"
-            "- Todas las sesiones\n"
-            "- Todos los datos emocionales\n"
-            "- Todas las notas\n"
-            "- Resultados de ejercicios\n\n"
-            "¿Continuar?"
-        )
-        
-        if not confirm:
-            return False
-        
-        # Segunda confirmación
-        confirm2 = messagebox.askyesno(
-            "CONFIRMACIÓN FINAL",
-            "Esta es su última oportunidad.\n\n"
-            "¿Eliminar PERMANENTEMENTE todos los datos?"
-        )
-        
-        if not confirm2:
-            return False
-        
-        # Registrar eliminación ANTES de borrar
-        self.log_access('DELETE_ALL_DATA', patient_id, 
-                       'All patient data permanently deleted')
-        
-        # Eliminar de base de datos
-        try:
-            database.conn.execute('''
-                DELETE FROM emotion_snapshots WHERE session_id IN
-                (SELECT id FROM sessions WHERE patient_id = ?)
-            ''', (patient_id,))
+        if confirm:
+            # Confirmación de seguridad
+            confirm1 = messagebox.askyesno(
+                "ELIMINAR DATOS - ACCIÓN IRREVERSIBLE",
+                f"¿Está SEGURO de eliminar TODOS los datos del paciente {patient_id}?\n\n"
+                "Esta acción NO se puede deshacer.\n"
+                "Se eliminarán:\n"
+                "- Todas las sesiones\n"
+                "- Todos los datos emocionales\n"
+                "- Todas las notas\n"
+                "- Resultados de ejercicios\n"
+                "- Calibraciones personales\n\n"
+                "¿Continuar?"
+            )
             
-            database.conn.execute('''
-                DELETE FROM exercise_results WHERE patient_id = ?
-            ''', (patient_id,))
+            if not confirm1:
+                return False
             
-            database.conn.execute('''
-                DELETE FROM sessions WHERE patient_id = ?
-            ''', (patient_id,))
+            # Segunda confirmación
+            confirm2 = messagebox.askyesno(
+                "CONFIRMACIÓN FINAL",
+                "Esta es su última oportunidad.\n\n"
+                "¿Eliminar PERMANENTEMENTE todos los datos?"
+            )
             
-            database.conn.commit()
+            if not confirm2:
+                return False
+        
+        # Eliminar de base de datos (registra la eliminación ANTES de borrar)
+        try:
+            RetentionEngine(database, privacy_manager=self).erase_patient(patient_id)
             
-            messagebox.showinfo("Datos Eliminados", 
-                              f"Todos los datos del paciente {patient_id} han sido eliminados.")
+            if confirm:
+                messagebox.showinfo("Datos Eliminados", 
+                                  f"Todos los datos del paciente {patient_id} han sido eliminados.")
             
             return True
         except Exception as e:
-            messagebox.showerror("Error", f"Error eliminando datos: {e}")
+            if confirm:
+                messagebox.showerror("Error", f"Error eliminando datos: {e}")
+            else:
+                print(f"Error eliminando datos: {e}")
             return False
     
-    def check_data_retention_policy(self, database, retention_years=7):
+    def check_data_retention_policy(self, database, retention_years=7, confirm=True):
         """
         Verifica y elimina datos antiguos según política de retención.
         
@@ -451,52 +803,46 @@ Al hacer clic en "ACEPTO", confirmo que:
         - Minimización de riesgo: Menos datos = menos riesgo
         - Regulaciones profesionales: Típicamente 5-10 años
         
-        Se ejecuta automáticamente cada mes.
+        Se ejecuta automáticamente cada mes. Con confirm=False se ejecuta sin
+        diálogos, p. ej. como tarea nocturna.
         
         Args:
             database: Instancia de SessionDatabase
             retention_years: Años máximos de retención (default: 7)
+            confirm: Si es False no se muestran diálogos (uso desatendido)
+            
+        Returns:
+            dict: Resultado de RetentionEngine.purge_expired, o None si no se borró nada
         """
-        cutoff_date = datetime.now() - timedelta(days=retention_years * 365)
+        engine = RetentionEngine(database, privacy_manager=self)
         
         # Buscar sesiones antiguas
-        cursor = database.conn.execute('''
-            SELECT DISTINCT patient_id, COUNT(*) as session_count
-            FROM sessions
-            WHERE timestamp < ?
-            GROUP BY patient_id
-        ''', (cutoff_date.isoformat(),))
+        old_data = engine.find_expired(retention_years)
         
-        old_data = cursor.fetchall()
+        if not old_data:
+            return None
         
-        if old_data:
+        if confirm:
+            cutoff_date = datetime.now() - timedelta(days=retention_years * 365)
             message = "Se encontraron datos antiguos que exceden la política de retención:\n\n"
             for patient_id, count in old_data:
                 message += f"- Paciente {patient_id}: {count} sesiones antiguas\n"
             
             message += f"\n¿Eliminar datos anteriores a {cutoff_date.strftime('%Y-%m-%d')}?"
             
-            if messagebox.askyesno("Política de Retención de Datos", message):
-                for patient_id, _ in old_data:
-                    database.conn.execute('''
-                        DELETE FROM emotion_snapshots WHERE session_id IN
-                        (SELECT id FROM sessions WHERE patient_id = ? AND timestamp < ?)
-                    ''', (patient_id, cutoff_date.isoformat()))
-                    
-                    database.conn.execute('''
-                        DELETE FROM sessions WHERE patient_id = ? AND timestamp < ?
-                    ''', (patient_id, cutoff_date.isoformat()))
-                
-                database.conn.commit()
-                self.log_access('RETENTION_POLICY', 'SYSTEM', 
-                              f'Deleted data older than {retention_years} years')
-                
-                messagebox.showinfo("Completado", 
-                                  "Datos antiguos eliminados según política de retención.")
+            if not messagebox.askyesno("Política de Retención de Datos", message):
+                return None
+        
+        result = engine.purge_expired(retention_years)
+        
+        if confirm:
+            messagebox.showinfo("Completado", 
+                              "Datos antiguos eliminados según política de retención.")
+        return result
     
     def get_access_log(self, limit=100):
         """
-        Obtiene el registro de accesos.
+        Obtiene el registro de accesos más recientes (en memoria).
         
         Args:
             limit: Número máximo de entradas a retornar
@@ -504,7 +850,31 @@ Al hacer clic en "ACEPTO", confirmo que:
         Returns:
             list: Lista de entradas de log
         """
-        return self.access_log[-limit:]
+        return self.audit_log.tail(limit)
+    
+    def query_access_log(self, user=None, action=None, start=None, end=None, limit=None):
+        """
+        Busca en todo el historial de auditoría, incluidos los archivos rotados.
+        
+        Ejemplo: quién vio al paciente X el último trimestre
+            query_access_log(user=patient_id, action='VIEW_SESSION',
+                             start=datetime(2024, 7, 1), end=datetime(2024, 10, 1))
+                             
+        Args:
+            user: Usuario o paciente (None = todos)
+            action: Tipo de acción (None = todas)
+            start: Fecha inicial (datetime o ISO), inclusive
+            end: Fecha final (datetime o ISO), exclusiva
+            limit: Número máximo de entradas (las más recientes)
+            
+        Returns:
+            list: Entradas en orden cronológico
+        """
+        return self.audit_log.query(user, action, start, end, limit)
+    
+    def close(self):
+        """Escribe en disco las entradas de auditoría pendientes"""
+        self.audit_log.close()
     
     def verify_consent(self):
         """
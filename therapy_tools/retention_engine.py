@@ -0,0 +1,265 @@
+# Motor de retención y eliminación de datos
+# Borra datos caducados o de un paciente por lotes cortos, sin interfaz gráfica
+
+import time
+from datetime import datetime, timedelta
+
+from therapy_tools.charts import default_chart_cache_dir, remove_cached_charts
+
+
+# Tablas hijas con muchas filas por sesión: se vacían por lotes antes de
+# borrar la sesión, para que el ON DELETE CASCADE no las borre de golpe
+SESSION_CHILD_TABLES = ('emotion_snapshots', 'session_events')
+
+class RetentionEngine:
+    """
+    Aplica la política de retención y el derecho al olvido sobre SessionDatabase.
+    
+    ¿Por qué por lotes?
+    - Un único DELETE sobre años de snapshots mantiene el bloqueo de
+      escritura durante mucho tiempo y congela las sesiones en curso
+    - Aquí se borran sesiones en lotes de claves acotados, cada uno en su
+      propia transacción corta; las sesiones activas siguen escribiendo
+      entre lote y lote
+    - Los snapshots y eventos de cada sesión se borran antes, también en
+      lotes de chunk_size filas: una sesión larga no alarga la transacción
+    - Los bloques archivados y ejercicios (pocas filas por sesión) se
+      eliminan con ON DELETE CASCADE
+    - Después se recupera el espacio con PRAGMA incremental_vacuum
+    - Los gráficos de las sesiones borradas se eliminan de la caché de
+      gráficos (ver charts.ChartCache): no quedan datos del paciente en PNG
+      
+    No muestra diálogos: se puede ejecutar de forma desatendida (p. ej. cada
+    noche). PrivacyManager lo usa para sus operaciones interactivas.
+    """
+    
+    def __init__(self, database, chunk_size=500, pause=0.0, vacuum_pages=1000,
+                 privacy_manager=None, chart_cache_dir=None):
+        """
+        Inicializa el motor de retención.
+        
+        Args:
+            database: Instancia de SessionDatabase
+            chunk_size: Número máximo de claves borradas por transacción
+            pause: Segundos de espera entre lotes (cede el bloqueo a otros escritores)
+            vacuum_pages: Páginas liberadas por cada paso de incremental_vacuum
+            privacy_manager: PrivacyManager opcional para registrar auditoría
+            chart_cache_dir: Caché de gráficos de la que borrar las sesiones
+                             eliminadas (None = default_chart_cache_dir)
+        """
+        self.db = database
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self.privacy_manager = privacy_manager
+        self.chart_cache_dir = chart_cache_dir or default_chart_cache_dir(database)
+    
+    def find_expired(self, retention_years=7):
+        """
+        Lista los pacientes con sesiones que exceden la retención.
+        
+        Args:
+            retention_years: Años máximos de retención
+            
+        Returns:
+            list: Tuplas (patient_id, número de sesiones antiguas)
+        """
+        cursor = self.db.conn.execute('''
+            SELECT patient_id, COUNT(*)
+            FROM sessions
+            WHERE timestamp < ?
+            GROUP BY patient_id
+        ''', (self._cutoff(retention_years),))
+        return cursor.fetchall()
+    
+    def purge_expired(self, retention_years=7, reclaim_space=True):
+        """
+        Elimina las sesiones y ejercicios anteriores al período de retención.
+        
+        Args:
+            retention_years: Años máximos de retención
+            reclaim_space: Si es True, ejecuta incremental_vacuum al terminar
+            
+        Returns:
+            dict: Sesiones y ejercicios eliminados y páginas recuperadas
+        """
+        cutoff = self._cutoff(retention_years)
+        
+        result = {
+            'sessions': self._delete_in_chunks('sessions', 'timestamp < ?', (cutoff,),
+                                               children=SESSION_CHILD_TABLES,
+                                               on_delete=self._forget_sessions),
+            # Ejercicios sin sesión asociada (los demás caen en cascada)
+            'exercises': self._delete_in_chunks(
+                'exercise_results', 'session_id IS NULL AND timestamp < ?', (cutoff,)),
+            'pages_freed': 0
+        }
+        if reclaim_space:
+            result['pages_freed'] = self.reclaim_space()
+        
+        self._log('RETENTION_POLICY', 'SYSTEM',
+                  f"Deleted data older than {retention_years} years "
+                  f"({result['sessions']} sessions, {result['exercises']} exercises)")
+        return result
+    
+    def erase_patient(self, patient_id, reclaim_space=True):
+        """
+        Elimina todos los datos de un paciente (derecho al olvido).
+        
+        Args:
+            patient_id: ID del paciente
+            reclaim_space: Si es True, ejecuta incremental_vacuum al terminar
+            
+        Returns:
+            dict: Sesiones, ejercicios y calibraciones eliminados y páginas recuperadas
+        """
+        # Registrar eliminación ANTES de borrar
+        self._log('DELETE_ALL_DATA', patient_id, 'All patient data permanently deleted')
+        
+        result = {
+            'sessions': self._delete_in_chunks('sessions', 'patient_id = ?', (patient_id,),
+                                               children=SESSION_CHILD_TABLES,
+                                               on_delete=self._forget_sessions),
+            'exercises': self._delete_in_chunks('exercise_results', 'patient_id = ?', (patient_id,)),
+            'calibrations': self._delete_in_chunks('calibrations', 'patient_id = ?', (patient_id,)),
+            'pages_freed': 0
+        }
+        if reclaim_space:
+            result['pages_freed'] = self.reclaim_space()
+        return result
+    
+    def reclaim_space(self):
+        """
+        Devuelve al sistema de archivos las páginas libres de la base de datos.
+        
+        Trabaja en pasos de vacuum_pages páginas para no bloquear la base.
+        Requiere auto_vacuum = INCREMENTAL (ver enable_incremental_vacuum).
+        
+        Returns:
+            int: Páginas recuperadas
+        """
+        conn = self.db.conn
+        (mode,) = conn.execute('PRAGMA auto_vacuum').fetchone()
+        if mode != 2:  # 2 = INCREMENTAL
+            return 0
+        
+        freed = 0
+        while True:
+            (free_pages,) = conn.execute('PRAGMA freelist_count').fetchone()
+            if free_pages == 0:
+                return freed
+            step = min(free_pages, self.vacuum_pages)
+            conn.execute(f'PRAGMA incremental_vacuum({int(step)})').fetchall()
+            freed += step
+            if self.pause:
+                time.sleep(self.pause)
+    
+    def enable_incremental_vacuum(self):
+        """
+        Activa auto_vacuum = INCREMENTAL en una base de datos existente.
+        
+        SessionDatabase lo activa al crear una base nueva; las bases creadas
+        antes (o por otras herramientas) necesitan esta conversión. Ejecuta un
+        VACUUM completo (una sola vez): hágalo fuera del horario de sesiones.
+        
+        Returns:
+            bool: True si la base quedó en modo incremental
+        """
+        conn = self.db.conn
+        (mode,) = conn.execute('PRAGMA auto_vacuum').fetchone()
+        if mode != 2:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            (mode,) = conn.execute('PRAGMA auto_vacuum').fetchone()
+        return mode == 2
+    
+    def _delete_in_chunks(self, table, condition, params, children=(), on_delete=None):
+        """
+        Borra las filas que cumplen una condición en lotes de claves acotados.
+        
+        Recorre las claves en orden ascendente (keyset), así que cada lote
+        solo lee las filas que va a borrar.
+        
+        Args:
+            table: Tabla con clave primaria 'id'
+            condition: Condición SQL con parámetros '?'
+            params: Parámetros de la condición
+            children: Tablas hijas (columna session_id) que se vacían por
+                      lotes antes de borrar cada lote de claves
+            on_delete: Función opcional llamada con cada lote de claves ya
+                       borrado
+                       
+        Returns:
+            int: Filas eliminadas
+        """
+        deleted = 0
+        last_id = 0
+        while True:
+            ids = [row[0] for row in self.db.conn.execute(
+                f'SELECT id FROM {table} WHERE {condition} AND id > ? ORDER BY id LIMIT ?',
+                (*params, last_id, self.chunk_size)
+            )]
+            if not ids:
+                return deleted
+            
+            for child in children:
+                for parent_id in ids:
+                    self._delete_children(child, parent_id)
+            
+            # Solo quedan las filas escritas entre medias, que caen en cascada
+            with self.db.transaction() as conn:
+                placeholders = ', '.join('?' * len(ids))
+                conn.execute(f'DELETE FROM {table} WHERE id IN ({placeholders})', ids)
+            if on_delete is not None:
+                on_delete(ids)
+            
+            deleted += len(ids)
+            last_id = ids[-1]
+            if self.pause:
+                time.sleep(self.pause)
+    
+    def _delete_children(self, table, session_id):
+        """
+        Borra las filas de una sesión en una tabla hija, en lotes de chunk_size.
+        
+        Recorre las claves de la sesión en orden ascendente (keyset); cada
+        lote va en su propia transacción corta.
+        
+        Args:
+            table: Tabla hija con clave primaria 'id' y columna session_id
+            session_id: ID de la sesión
+        """
+        last_id = 0
+        while True:
+            with self.db.transaction() as conn:
+                ids = [row[0] for row in conn.execute(
+                    f'SELECT id FROM {table} WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?',
+                    (session_id, last_id, self.chunk_size)
+                )]
+                if not ids:
+                    return
+                placeholders = ', '.join('?' * len(ids))
+                conn.execute(f'DELETE FROM {table} WHERE id IN ({placeholders})', ids)
+            
+            last_id = ids[-1]
+            if self.pause:
+                time.sleep(self.pause)
+    
+    def _forget_sessions(self, session_ids):
+        """
+        Borra lo derivado de sesiones ya eliminadas: los detectores de eventos
+        abiertos (sus episodios no se guardan) y los gráficos en caché.
+        """
+        self.db.discard_detectors(session_ids)
+        for session_id in session_ids:
+            remove_cached_charts(self.chart_cache_dir, session_id)
+    
+    def _cutoff(self, retention_years):
+        """Fecha límite en el mismo formato que CURRENT_TIMESTAMP de SQLite"""
+        cutoff_date = datetime.now() - timedelta(days=retention_years * 365)
+        return cutoff_date.strftime('%Y-%m-%d %H:%M:%S')
+    
+    def _log(self, action, user, details):
+        """Registra la operación si hay un gestor de privacidad"""
+        if self.privacy_manager is not None:
+            self.privacy_manager.log_access(action, user, details)
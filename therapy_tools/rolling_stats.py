@@ -0,0 +1,176 @@
+# Estadísticas incrementales de emociones sobre una ventana deslizante
+# Usadas por los ejercicios para dar feedback continuo sin pausar a medir
+
+import math
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class RollingEmotionStats:
+    """
+    Media, varianza, tendencia y EWMA de varias emociones en tiempo real.
+    
+    ¿Por qué?
+    - Los ejercicios medían en ventanas bloqueantes de 5-10 segundos y solo
+      calculaban la media al final
+    - Aquí cada medición actualiza sumas acumuladas en O(1): se suma la
+      nueva muestra y se restan las que salen de la ventana
+    - La tendencia es la pendiente de mínimos cuadrados (puntos/segundo)
+      sobre la ventana, calculada con las mismas sumas
+    - La EWMA usa una vida media en segundos, así que no depende de los
+      fps de la cámara
+      
+    Se puede suscribir directamente al MeasurementEngine (es invocable) y
+    leer desde otro hilo.
+    """
+    
+    def __init__(self, emotions=('fear', 'happy'), window_seconds=10.0,
+                 half_life=3.0, refresh_every=4096):
+        """
+        Inicializa las estadísticas.
+        
+        Args:
+            emotions: Emociones a seguir
+            window_seconds: Duración de la ventana deslizante
+            half_life: Vida media de la EWMA en segundos
+            refresh_every: Actualizaciones entre recálculos exactos de las
+                           sumas (evita acumular error de redondeo)
+        """
+        self.emotions = tuple(emotions)
+        self.window_seconds = window_seconds
+        self.half_life = half_life
+        self.refresh_every = refresh_every
+        
+        self._index = {emotion: i for i, emotion in enumerate(self.emotions)}
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Descarta todas las muestras"""
+        with self._lock:
+            size = len(self.emotions)
+            self._samples = deque()
+            self._origin = None
+            self._last_time = None
+            self._sum = np.zeros(size)
+            self._sum_sq = np.zeros(size)
+            self._sum_tx = np.zeros(size)
+            self._sum_t = 0.0
+            self._sum_tt = 0.0
+            self._ewma = np.zeros(size)
+            self._updates = 0
+    
+    def update(self, timestamp, emotions):
+        """
+        Añade una medición.
+        
+        Args:
+            timestamp: Instante en segundos (reloj monótono)
+            emotions: Diccionario de puntuaciones
+        """
+        values = np.array([emotions.get(emotion, 0) for emotion in self.emotions], dtype=np.float64)
+        
+        with self._lock:
+            if self._origin is None:
+                self._origin = timestamp
+                self._ewma = values.copy()
+            else:
+                dt = max(timestamp - self._last_time, 0.0)
+                alpha = 1.0 - math.exp(-dt * math.log(2) / self.half_life)
+                self._ewma += alpha * (values - self._ewma)
+            self._last_time = timestamp
+            
+            # Tiempo relativo al primer instante para conservar precisión
+            t = timestamp - self._origin
+            self._samples.append((t, values))
+            self._add(t, values, 1)
+            
+            while self._samples and self._samples[0][0] < t - self.window_seconds:
+                old_t, old_values = self._samples.popleft()
+                self._add(old_t, old_values, -1)
+            
+            self._updates += 1
+            if self._updates % self.refresh_every == 0:
+                self._refresh()
+    
+    __call__ = update
+    
+    def count(self):
+        """Muestras dentro de la ventana"""
+        with self._lock:
+            return len(self._samples)
+    
+    def mean(self, emotion):
+        """Media de la emoción en la ventana (0 si no hay muestras)"""
+        i = self._index[emotion]
+        with self._lock:
+            n = len(self._samples)
+            return float(self._sum[i] / n) if n else 0.0
+    
+    def variance(self, emotion):
+        """Varianza de la emoción en la ventana"""
+        i = self._index[emotion]
+        with self._lock:
+            n = len(self._samples)
+            if n < 2:
+                return 0.0
+            mean = self._sum[i] / n
+            return float(max(self._sum_sq[i] / n - mean * mean, 0.0))
+    
+    def ewma(self, emotion):
+        """Media móvil exponencial de la emoción"""
+        with self._lock:
+            return float(self._ewma[self._index[emotion]])
+    
+    def slope(self, emotion):
+        """
+        Tendencia de la emoción en la ventana.
+        
+        Returns:
+            float: Pendiente en puntos por segundo (negativa = bajando)
+        """
+        i = self._index[emotion]
+        with self._lock:
+            n = len(self._samples)
+            denominator = n * self._sum_tt - self._sum_t ** 2
+            if n < 2 or denominator <= 1e-12:
+                return 0.0
+            return float((n * self._sum_tx[i] - self._sum_t * self._sum[i]) / denominator)
+    
+    def snapshot(self):
+        """
+        Devuelve todas las estadísticas de una vez.
+        
+        Returns:
+            dict: emoción -> {'mean', 'variance', 'ewma', 'slope'}
+        """
+        return {
+            emotion: {
+                'mean': self.mean(emotion),
+                'variance': self.variance(emotion),
+                'ewma': self.ewma(emotion),
+                'slope': self.slope(emotion)
+            }
+            for emotion in self.emotions
+        }
+    
+    def _add(self, t, values, sign):
+        """Suma (sign=1) o resta (sign=-1) una muestra de los acumulados"""
+        self._sum += sign * values
+        self._sum_sq += sign * values * values
+        self._sum_tx += sign * t * values
+        self._sum_t += sign * t
+        self._sum_tt += sign * t * t
+    
+    def _refresh(self):
+        """Recalcula los acumulados a partir de las muestras de la ventana"""
+        size = len(self.emotions)
+        self._sum = np.zeros(size)
+        self._sum_sq = np.zeros(size)
+        self._sum_tx = np.zeros(size)
+        self._sum_t = 0.0
+        self._sum_tt = 0.0
+        for t, values in self._samples:
+            self._add(t, values, 1)
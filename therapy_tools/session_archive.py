@@ -0,0 +1,384 @@
+# Archivo frío para sesiones terapéuticas finalizadas
+# Mueve los snapshots de emociones a bloques columnares cuantizados y comprimidos
+
+import struct
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from therapy_tools.charts import default_chart_cache_dir, remove_cached_charts
+from therapy_tools.session_database import EMOTION_COLUMNS
+
+
+# Cabecera del bloque: magic, versión, códec, número de snapshots
+_BLOCK_HEADER = struct.Struct('<4sBBI')
+_BLOCK_MAGIC = b'EMOA'
+# Versión 1: offsets y medias. Versión 2: además frames, mínimos y máximos
+# de cada ventana. Se escriben bloques v2 y se leen ambas versiones
+_BLOCK_VERSION = 2
+
+# Códecs de cuantización de las columnas de puntuaciones (0-100)
+_CODECS = {
+    'uint8': (1, np.dtype('u1')),     # Resolución de 1 punto, 1 byte por valor
+    'float16': (2, np.dtype('<f2')),  # ~0.06 puntos de resolución, 2 bytes por valor
+}
+_CODEC_NAMES = {codec_id: name for name, (codec_id, _) in _CODECS.items()}
+
+
+def encode_session_block(offsets, scores, codec='uint8', frame_counts=None,
+                         minimums=None, maximums=None):
+    """
+    Codifica los snapshots de una sesión en un bloque columnar comprimido.
+    
+    Formato del bloque (versión 2):
+    - Cabecera fija (magic, versión, códec, número de filas)
+    - Payload comprimido con zlib que contiene:
+      * Offsets en delta (int32): casi siempre 1, se comprimen casi a cero
+      * Una columna por emoción, cuantizada a uint8 o float16
+      * Frames por ventana (uint32, 0 = snapshot sin agregar)
+      * Una marca por fila (uint8) que indica si tiene mínimos y máximos
+      * Mínimos y máximos por emoción, cuantizados como las medias
+      
+    Args:
+        offsets: Array (T,) con segundos desde el inicio de la sesión
+        scores: Array (T, 6) con puntuaciones en el orden de EMOTION_COLUMNS
+        codec: 'uint8' o 'float16'
+        frame_counts: Array (T,) con los frames de cada ventana (None o 0 =
+                      sin agregar)
+        minimums: Array (T, 6) con los mínimos de cada ventana (NaN = sin rango)
+        maximums: Array (T, 6) con los máximos de cada ventana (NaN = sin rango)
+        
+    Returns:
+        bytes: Bloque listo para guardar como BLOB
+    """
+    if codec not in _CODECS:
+        raise ValueError(f"Códec desconocido: {codec}")
+    codec_id, _ = _CODECS[codec]
+    
+    offsets = np.asarray(offsets, dtype=np.int64)
+    num_rows = len(offsets)
+    missing = np.full((num_rows, len(EMOTION_COLUMNS)), np.nan)
+    minimums = missing if minimums is None else np.asarray(minimums, dtype=np.float64)
+    maximums = missing if maximums is None else np.asarray(maximums, dtype=np.float64)
+    if frame_counts is None:
+        frame_counts = np.zeros(num_rows)
+    frame_counts = np.nan_to_num(np.asarray(frame_counts, dtype=np.float64)).astype('<u4')
+    has_range = ~(np.isnan(minimums).any(axis=1) | np.isnan(maximums).any(axis=1))
+    
+    deltas = np.diff(offsets, prepend=0).astype('<i4')
+    payload = (deltas.tobytes()
+               + _quantize(scores, codec)
+               + frame_counts.tobytes()
+               + has_range.astype('u1').tobytes()
+               + _quantize(minimums, codec)
+               + _quantize(maximums, codec))
+    header = _BLOCK_HEADER.pack(_BLOCK_MAGIC, _BLOCK_VERSION, codec_id, num_rows)
+    return header + zlib.compress(payload, 9)
+
+
+def _quantize(scores, codec):
+    """Cuantiza puntuaciones (T, 6) columna a columna (mejor compresión)"""
+    _, dtype = _CODECS[codec]
+    scores = np.clip(np.nan_to_num(np.asarray(scores, dtype=np.float64)), 0, 100)
+    if codec == 'uint8':
+        quantized = np.rint(scores).astype(dtype)
+    else:
+        quantized = scores.astype(dtype)
+    return np.ascontiguousarray(quantized.T).tobytes()
+
+
+def decode_session_block(block):
+    """
+    Decodifica un bloque generado por encode_session_block.
+    
+    Args:
+        block: Bytes del bloque
+        
+    Returns:
+        tuple: (offsets, scores) con offsets int64 (T,) y scores float64 (T, 6)
+    """
+    offsets, scores, _, _, _ = decode_session_windows(block)
+    return offsets, scores
+
+
+def decode_session_windows(block):
+    """
+    Decodifica todas las columnas de un bloque, con frames, mínimos y máximos.
+    
+    Los bloques de versión 1 (y las filas sin agregar) no tienen rango:
+    mínimos y máximos NaN, como en SessionDatabase.get_session_window_ranges.
+    
+    Args:
+        block: Bytes del bloque
+        
+    Returns:
+        tuple: (offsets (T,), scores (T, 6), frame_counts (T,) con 0 en las
+               filas sin agregar, minimums (T, 6), maximums (T, 6))
+    """
+    magic, version, codec_id, num_rows = _BLOCK_HEADER.unpack_from(block)
+    if magic != _BLOCK_MAGIC or version not in (1, _BLOCK_VERSION):
+        raise ValueError("Bloque de archivo no reconocido")
+    _, dtype = _CODECS[_CODEC_NAMES[codec_id]]
+    size = len(EMOTION_COLUMNS)
+    
+    payload = zlib.decompress(block[_BLOCK_HEADER.size:])
+    deltas = np.frombuffer(payload, dtype='<i4', count=num_rows)
+    offsets = np.cumsum(deltas, dtype=np.int64)
+    
+    # Posiciones de las secciones del payload
+    scores_start = num_rows * 4
+    matrix_size = num_rows * size * dtype.itemsize
+    counts_start = scores_start + matrix_size
+    flags_start = counts_start + num_rows * 4
+    minimums_start = flags_start + num_rows
+    maximums_start = minimums_start + matrix_size
+    
+    scores = _dequantize(payload, dtype, num_rows, scores_start)
+    if version == 1:
+        missing = np.full((num_rows, size), np.nan)
+        return offsets, scores, np.zeros(num_rows, dtype=np.int64), missing, missing.copy()
+    
+    frame_counts = np.frombuffer(payload, dtype='<u4', count=num_rows,
+                                 offset=counts_start).astype(np.int64)
+    has_range = np.frombuffer(payload, dtype='u1', count=num_rows, offset=flags_start) > 0
+    minimums = _dequantize(payload, dtype, num_rows, minimums_start)
+    maximums = _dequantize(payload, dtype, num_rows, maximums_start)
+    minimums[~has_range] = np.nan
+    maximums[~has_range] = np.nan
+    return offsets, scores, frame_counts, minimums, maximums
+
+
+def _dequantize(payload, dtype, num_rows, offset):
+    """Lee una matriz de puntuaciones guardada columna a columna"""
+    columns = np.frombuffer(payload, dtype=dtype, count=num_rows * len(EMOTION_COLUMNS),
+                            offset=offset).reshape(len(EMOTION_COLUMNS), num_rows)
+    return columns.T.astype(np.float64)
+
+
+def _decode_range_column(blobs):
+    """Mínimos o máximos de emotion_snapshots (6 x float32 o NULL) como array (T, 6)"""
+    size = len(EMOTION_COLUMNS)
+    values = np.full((len(blobs), size), np.nan)
+    for i, blob in enumerate(blobs):
+        if blob is not None:
+            values[i] = np.frombuffer(blob, dtype='<f4', count=size)
+    return values
+
+
+def _encode_range(values):
+    """Inversa de _decode_range_column para una fila (NULL si no tiene rango)"""
+    if np.isnan(values).any():
+        return None
+    return values.astype('<f4').tobytes()
+
+
+class SessionArchive:
+    """
+    Archivador de sesiones finalizadas (almacenamiento frío).
+    
+    ¿Por qué?
+    - Cada snapshot ocupa una fila con seis columnas REAL más la sobrecarga
+      de fila e índice (~70 bytes)
+    - Las puntuaciones están acotadas a 0-100, así que caben en 1-2 bytes
+    - Guardando columnas cuantizadas y offsets en delta, comprimidos, una
+      sesión ocupa unas 10 veces menos con uint8
+      
+    Las sesiones archivadas se siguen leyendo con
+    SessionDatabase.get_session_emotions, de forma transparente. Al restaurar
+    una sesión se borran sus gráficos en caché (ver charts.ChartCache).
+    """
+    
+    def __init__(self, database, codec='uint8', chart_cache_dir=None):
+        """
+        Inicializa el archivador.
+        
+        Args:
+            database: Instancia de SessionDatabase
+            codec: Cuantización de las puntuaciones ('uint8' o 'float16')
+            chart_cache_dir: Caché de gráficos de la base de datos
+                             (None = default_chart_cache_dir)
+        """
+        if codec not in _CODECS:
+            raise ValueError(f"Códec desconocido: {codec}")
+        self.db = database
+        self.codec = codec
+        self.chart_cache_dir = chart_cache_dir or default_chart_cache_dir(database)
+    
+    def archive_session(self, session_id, force=False):
+        """
+        Mueve los snapshots de una sesión al archivo frío.
+        
+        La comprobación, la lectura de los snapshots, la escritura del bloque
+        y el borrado se hacen en una sola transacción BEGIN IMMEDIATE: un
+        snapshot guardado por otra conexión queda antes (y se archiva) o
+        después (y se conserva en emotion_snapshots), nunca se pierde.
+        
+        Solo se archivan sesiones cerradas con end_session; una sesión
+        abierta puede seguir recibiendo snapshots.
+        
+        Args:
+            session_id: ID de la sesión
+            force: Archivar aunque la sesión siga abierta
+            
+        Returns:
+            bool: True si se archivó, False si no había nada que archivar, ya
+                  estaba archivada o sigue abierta (sin force)
+        """
+        with self.db.transaction() as conn:
+            session = conn.execute('''
+                SELECT s.duration,
+                       EXISTS (SELECT 1 FROM archived_sessions a WHERE a.session_id = s.id)
+                FROM sessions s
+                WHERE s.id = ?
+            ''', (session_id,)).fetchone()
+            if session is None or session[1]:
+                return False
+            if session[0] is None and not force:
+                return False
+            
+            rows = conn.execute('''
+                SELECT id, timestamp_offset, happy, sad, angry, fear, surprise, disgust,
+                       frame_count, min_scores, max_scores
+                FROM emotion_snapshots
+                WHERE session_id = ?
+                ORDER BY timestamp_offset
+            ''', (session_id,)).fetchall()
+            if not rows:
+                return False
+            
+            data = np.array([row[1:8] for row in rows], dtype=np.float64)
+            offsets = data[:, 0].astype(np.int64)
+            frame_counts = [row[8] or 0 for row in rows]
+            minimums = _decode_range_column([row[9] for row in rows])
+            maximums = _decode_range_column([row[10] for row in rows])
+            block = encode_session_block(offsets, np.nan_to_num(data[:, 1:]), self.codec,
+                                         frame_counts, minimums, maximums)
+            
+            conn.execute('''
+                INSERT INTO archived_sessions (session_id, num_snapshots, codec, data)
+                VALUES (?, ?, ?, ?)
+            ''', (session_id, len(offsets), self.codec, block))
+            # Solo las filas leídas arriba
+            conn.execute(
+                'DELETE FROM emotion_snapshots WHERE session_id = ? AND id <= ?',
+                (session_id, max(row[0] for row in rows))
+            )
+        
+        # La sesión queda cerrada: los episodios que su detector tuviera
+        # abiertos ya no se guardan
+        self.db.discard_detectors([session_id])
+        return True
+    
+    def archive_closed_sessions(self, older_than_days=30, limit=None):
+        """
+        Archiva las sesiones finalizadas más antiguas que un umbral.
+        
+        Una sesión se considera cerrada cuando end_session ya registró su
+        duración. Pensado para ejecutarse como tarea periódica.
+        
+        Args:
+            older_than_days: Antigüedad mínima de la sesión en días
+            limit: Número máximo de sesiones a archivar en esta ejecución
+            
+        Returns:
+            int: Número de sesiones archivadas
+        """
+        cutoff_date = datetime.now() - timedelta(days=older_than_days)
+        
+        query = '''
+            SELECT s.id FROM sessions s
+            WHERE s.duration IS NOT NULL
+              AND s.timestamp < ?
+              AND NOT EXISTS (SELECT 1 FROM archived_sessions a WHERE a.session_id = s.id)
+            ORDER BY s.timestamp
+        '''
+        params = [cutoff_date.strftime('%Y-%m-%d %H:%M:%S')]
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        
+        session_ids = [row[0] for row in self.db.conn.execute(query, params).fetchall()]
+        
+        archived = 0
+        for session_id in session_ids:
+            if self.archive_session(session_id):
+                archived += 1
+        return archived
+    
+    def restore_session(self, session_id):
+        """
+        Devuelve una sesión archivada a la tabla emotion_snapshots.
+        
+        Se restauran también los frames, mínimos y máximos de cada ventana
+        (bloques de versión 2). Con el códec uint8 las puntuaciones, mínimos
+        y máximos restaurados quedan redondeados al entero más cercano.
+        
+        Args:
+            session_id: ID de la sesión
+            
+        Returns:
+            bool: True si se restauró, False si no estaba archivada
+        """
+        with self.db.transaction() as conn:
+            archived = self.db._get_archived_block(session_id, windows=True)
+            if archived is None:
+                return False
+            
+            offsets, scores, frame_counts, minimums, maximums = archived
+            rows = [
+                (session_id, int(offset)) + tuple(float(v) for v in values)
+                + (int(count) or None, _encode_range(low), _encode_range(high))
+                for offset, values, count, low, high
+                in zip(offsets, scores, frame_counts, minimums, maximums)
+            ]
+            
+            conn.executemany('''
+                INSERT INTO emotion_snapshots
+                (session_id, timestamp_offset, happy, sad, angry, fear, surprise, disgust,
+                 frame_count, min_scores, max_scores)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.execute(
+                'DELETE FROM archived_sessions WHERE session_id = ?',
+                (session_id,)
+            )
+        
+        # Los datos restaurados están redondeados: el gráfico se vuelve a dibujar
+        remove_cached_charts(self.chart_cache_dir, session_id)
+        return True
+    
+    def is_archived(self, session_id):
+        """
+        Indica si una sesión está en el archivo frío.
+        
+        Args:
+            session_id: ID de la sesión
+            
+        Returns:
+            bool: True si está archivada
+        """
+        cursor = self.db.conn.execute(
+            'SELECT 1 FROM archived_sessions WHERE session_id = ?',
+            (session_id,)
+        )
+        return cursor.fetchone() is not None
+    
+    def get_storage_report(self):
+        """
+        Resume el tamaño del archivo frío.
+        
+        Returns:
+            dict: Sesiones y snapshots archivados, bytes usados y bytes por snapshot
+        """
+        cursor = self.db.conn.execute('''
+            SELECT COUNT(*), COALESCE(SUM(num_snapshots), 0), COALESCE(SUM(LENGTH(data)), 0)
+            FROM archived_sessions
+        ''')
+        sessions, snapshots, size = cursor.fetchone()
+        return {
+            'archived_sessions': sessions,
+            'archived_snapshots': snapshots,
+            'archive_bytes': size,
+            'bytes_per_snapshot': size / snapshots if snapshots else 0
+        }
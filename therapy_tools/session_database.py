@@ -3,7 +3,31 @@
 
 import sqlite3
 import json
+import heapq
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
+from itertools import chain, groupby
+from operator import itemgetter
+
+import numpy as np
+
+
+# Orden fijo de las columnas de emociones en emotion_snapshots
+EMOTION_COLUMNS = ('happy', 'sad', 'angry', 'fear', 'surprise', 'disgust')
+
+
+def _merge_by_offset(archived, hot):
+    """
+    Une los arrays del archivo frío y de emotion_snapshots de una sesión.
+    
+    Ambas tuplas llevan los offsets en primera posición. El resultado queda
+    ordenado por offset; con offsets repetidos, el archivo va primero.
+    """
+    merged = [np.concatenate(pair) for pair in zip(archived, hot)]
+    order = np.argsort(merged[0], kind='stable')
+    return tuple(array[order] for array in merged)
 
 
 class SessionDatabase:
@@ -16,23 +40,142 @@ class SessionDatabase:
     - Evidencia objetiva para evaluar efectividad del tratamiento
     - Identificación de patrones emocionales
     - Reportes para documentación clínica
+    
+    Concurrencia:
+    - Cada hilo usa su propia conexión (pool por hilo), creada al primer uso
+    - Modo WAL: los lectores no bloquean a los escritores ni viceversa
+    - busy_timeout: un escritor espera al otro en vez de fallar con
+      "database is locked"
+    - transaction() agrupa escrituras en una transacción corta
     """
     
-    def __init__(self, db_path='therapy_sessions.db'):
+    def __init__(self, db_path='therapy_sessions.db', busy_timeout=5000, detect_events=True,
+                 max_open_detectors=64):
         """
         Inicializa la conexión a la base de datos.
         
         Args:
             db_path: Ruta al archivo de base de datos SQLite
+            busy_timeout: Milisegundos que una conexión espera un bloqueo
+                          de escritura antes de fallar
+            detect_events: Si es True, detecta eventos (ver event_detection.py)
+                           al guardar cada snapshot
+            max_open_detectors: Sesiones abiertas con detector en memoria; al
+                                superarlo se cierra el de la sesión que lleva
+                                más tiempo sin snapshots (p. ej. un flujo que
+                                terminó sin llamar a end_session)
         """
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
+        self.busy_timeout = busy_timeout
+        self.detect_events = detect_events
+        
+        # Detector de eventos por sesión activa, del menos al más reciente
+        self._detectors = OrderedDict()
+        self._detectors_lock = threading.Lock()
+        self.max_open_detectors = max_open_detectors
+        
+        # Pool de conexiones: una por hilo
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        
+        # Una base ':memory:' sería distinta en cada hilo: se usa una única
+        # conexión compartida (solo para pruebas, sin concurrencia real)
+        self._shared_conn = self._connect() if db_path == ':memory:' else None
+        
         self.create_tables()
     
+    @property
+    def conn(self):
+        """Conexión SQLite del hilo actual (se crea al primer uso)"""
+        if self._shared_conn is not None:
+            return self._shared_conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+    
+    def _connect(self):
+        """
+        Abre una conexión nueva con los pragmas de concurrencia.
+        
+        Returns:
+            sqlite3.Connection: Conexión configurada
+        """
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout / 1000,
+            check_same_thread=False  # close() puede cerrarla desde otro hilo
+        )
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        # Solo en bases nuevas (sin páginas) y antes de pasar a WAL: después
+        # ya no tiene efecto. Permite recuperar espacio tras los borrados con
+        # PRAGMA incremental_vacuum (ver RetentionEngine)
+        (page_count,) = conn.execute('PRAGMA page_count').fetchone()
+        if page_count == 0:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('PRAGMA journal_mode = WAL')
+        # En modo WAL, NORMAL es seguro ante caídas de la aplicación y evita
+        # un fsync por cada commit
+        conn.execute('PRAGMA synchronous = NORMAL')
+        # Necesario para que los borrados en cascada se apliquen
+        conn.execute('PRAGMA foreign_keys = ON')
+        
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Ejecuta un bloque de escrituras en una transacción.
+        
+        Usa BEGIN IMMEDIATE para reservar el bloqueo de escritura al inicio
+        (esperando hasta busy_timeout) en lugar de fallar a mitad del bloque.
+        Si ya hay una transacción abierta en este hilo, el bloque se une a ella.
+        
+        Uso:
+            with db.transaction() as conn:
+                conn.execute(...)
+                
+        Yields:
+            sqlite3.Connection: Conexión del hilo actual
+        """
+        conn = self.conn
+        if conn.in_transaction:
+            yield conn
+            return
+        
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+    
     def create_tables(self):
-        """Crea las tablas necesarias si no existen"""
+        """
+        Crea las tablas necesarias si no existen.
+        
+        Las claves foráneas se desactivan mientras se migra el esquema (ver
+        _migrate_cascade). PRAGMA foreign_keys no tiene efecto dentro de una
+        transacción, así que se cambia antes de abrirla y se restaura después.
+        """
+        conn = self.conn
+        conn.execute('PRAGMA foreign_keys = OFF')
+        try:
+            with self.transaction() as conn:
+                self._create_tables(conn)
+        finally:
+            conn.execute('PRAGMA foreign_keys = ON')
+    
+    def _create_tables(self, conn):
+        """Crea el esquema usando la conexión de la transacción activa"""
         # Tabla de sesiones
-        self.conn.execute('''
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS sessions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 patient_id TEXT NOT NULL,           -- ID anónimo del paciente
@@ -45,7 +188,7 @@ class SessionDatabase:
         ''')
         
         # Tabla de snapshots de emociones
-        self.conn.execute('''
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS emotion_snapshots (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 session_id INTEGER,
@@ -56,12 +199,29 @@ class SessionDatabase:
                 fear REAL,
                 surprise REAL,
                 disgust REAL,
-                FOREIGN KEY (session_id) REFERENCES sessions(id)
+                frame_count INTEGER,                 -- Frames agregados en la fila (NULL = uno)
+                min_scores BLOB,                     -- Mínimos de la ventana (6 x float32)
+                max_scores BLOB,                     -- Máximos de la ventana (6 x float32)
+                FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Archivo frío: bloques columnares comprimidos de sesiones finalizadas
+        # (ver therapy_tools/session_archive.py). La clave primaria es el índice
+        # de acceso aleatorio por sesión.
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS archived_sessions (
+                session_id INTEGER PRIMARY KEY,
+                num_snapshots INTEGER,
+                codec TEXT,                          -- uint8 o float16
+                archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                data BLOB,                           -- Bloque comprimido
+                FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE
             )
         ''')
         
         # Tabla de resultados de ejercicios
-        self.conn.execute('''
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS exercise_results (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 session_id INTEGER,
@@ -74,11 +234,152 @@ class SessionDatabase:
                 reduction_percent REAL,
                 success INTEGER,                     -- 1 si fue exitoso, 0 si no
                 notes TEXT,
-                FOREIGN KEY (session_id) REFERENCES sessions(id)
+                timeline BLOB,                       -- Timeline binario (ver emotion_timeline.py)
+                FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE
             )
         ''')
         
-        self.conn.commit()
+        # Eventos detectados al guardar los snapshots (ver event_detection.py)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS session_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id INTEGER NOT NULL,
+                event_type TEXT NOT NULL,            -- crossing, episode, rapid_change
+                emotion TEXT NOT NULL,
+                start_offset REAL,                   -- Segundos desde inicio de sesión
+                end_offset REAL,
+                value REAL,                          -- Valor al cruzar, pico o cambio
+                FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # Calibraciones personales: una fila por calibración, versionadas por
+        # calibration_date (ver therapy_tools/personal_calibration.py)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS calibrations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                patient_id TEXT NOT NULL,
+                calibration_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+                data TEXT                            -- JSON con líneas base y factores
+            )
+        ''')
+        
+        # Bases creadas antes de usar ON DELETE CASCADE. Los ejercicios sin
+        # sesión válida se conservan (session_id es opcional); los snapshots
+        # y bloques archivados huérfanos no se pueden leer y se descartan
+        self._migrate_cascade(conn, 'emotion_snapshots')
+        self._migrate_cascade(conn, 'archived_sessions')
+        self._migrate_cascade(conn, 'exercise_results', keep_orphans=True)
+        
+        # Bases creadas antes de guardar el timeline de ejercicios en binario
+        self._add_column(conn, 'exercise_results', 'timeline', 'BLOB')
+        
+        # Bases creadas antes de agregar los frames por ventana
+        self._add_column(conn, 'emotion_snapshots', 'frame_count', 'INTEGER')
+        self._add_column(conn, 'emotion_snapshots', 'min_scores', 'BLOB')
+        self._add_column(conn, 'emotion_snapshots', 'max_scores', 'BLOB')
+        
+        # Índice para recorrer las sesiones de un paciente en orden cronológico
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_sessions_patient
+            ON sessions (patient_id, timestamp)
+        ''')
+        
+        # Índice para leer/archivar los snapshots de una sesión sin recorrer la tabla
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_snapshots_session
+            ON emotion_snapshots (session_id, timestamp_offset)
+        ''')
+        
+        # Índices de ejercicios: historial por paciente y borrado en cascada por sesión
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_exercises_patient
+            ON exercise_results (patient_id, timestamp)
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_exercises_session
+            ON exercise_results (session_id)
+        ''')
+        
+        # Índices de eventos: eventos de una sesión en orden y búsquedas
+        # entre sesiones por tipo y emoción
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_events_session
+            ON session_events (session_id, start_offset)
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_events_type
+            ON session_events (event_type, emotion, value)
+        ''')
+        
+        # Índice para obtener la calibración vigente sin leer el JSON
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_calibrations_patient
+            ON calibrations (patient_id, calibration_date, id)
+        ''')
+    
+    def _migrate_cascade(self, conn, table, keep_orphans=False):
+        """
+        Reconstruye una tabla hija para que su clave foránea use ON DELETE CASCADE.
+        
+        SQLite no permite modificar restricciones con ALTER TABLE, así que se
+        crea una copia con el esquema corregido, se copian las filas y se
+        reemplaza la tabla original. Las bases antiguas se escribían sin
+        claves foráneas activas y pueden tener filas que apuntan a sesiones
+        borradas: se tratan antes de copiar y al final se comprueba la tabla
+        con PRAGMA foreign_key_check.
+        
+        Args:
+            conn: Conexión con una transacción abierta y claves foráneas
+                  desactivadas (ver create_tables)
+            table: Nombre de la tabla a migrar
+            keep_orphans: Si es True, las filas huérfanas se conservan con
+                          session_id NULL; si no, se borran
+                          
+        Raises:
+            sqlite3.IntegrityError: Si la tabla migrada sigue teniendo
+                                    referencias inválidas (no se confirma nada)
+        """
+        cursor = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table,)
+        )
+        (schema,) = cursor.fetchone()
+        if 'ON DELETE CASCADE' in schema:
+            return
+        
+        orphans = 'session_id NOT IN (SELECT id FROM sessions)'
+        if keep_orphans:
+            conn.execute(f'UPDATE {table} SET session_id = NULL WHERE {orphans}')
+        else:
+            conn.execute(f'DELETE FROM {table} WHERE {orphans}')
+        
+        migrated = f'{table}_migrated'
+        new_schema = schema.replace(table, migrated, 1).replace(
+            'REFERENCES sessions(id)', 'REFERENCES sessions(id) ON DELETE CASCADE')
+        conn.execute(f'DROP TABLE IF EXISTS {migrated}')
+        conn.execute(new_schema)
+        conn.execute(f'INSERT INTO {migrated} SELECT * FROM {table}')
+        conn.execute(f'DROP TABLE {table}')
+        conn.execute(f'ALTER TABLE {migrated} RENAME TO {table}')
+        
+        if conn.execute(f'PRAGMA foreign_key_check({table})').fetchone() is not None:
+            raise sqlite3.IntegrityError(
+                f"Referencias inválidas en {table} tras migrar el esquema")
+    
+    def _add_column(self, conn, table, column, definition):
+        """
+        Añade una columna a una tabla existente si todavía no la tiene.
+        
+        Args:
+            conn: Conexión con una transacción abierta
+            table: Nombre de la tabla
+            column: Nombre de la columna
+            definition: Tipo SQL de la columna
+        """
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+        if column not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
     
     def start_session(self, patient_id, session_type='regular'):
         """
@@ -91,38 +392,66 @@ class SessionDatabase:
         Returns:
             int: ID de la sesión creada
         """
-        cursor = self.conn.execute(
-            'INSERT INTO sessions (patient_id, session_type) VALUES (?, ?)',
-            (patient_id, session_type)
-        )
-        self.conn.commit()
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                'INSERT INTO sessions (patient_id, session_type) VALUES (?, ?)',
+                (patient_id, session_type)
+            )
         return cursor.lastrowid
     
-    def save_emotion_snapshot(self, session_id, timestamp_offset, emotions):
+    def save_emotion_snapshot(self, session_id, timestamp_offset, emotions,
+                              frame_count=None, minimum=None, maximum=None):
         """
         Guarda un snapshot de emociones en un momento específico.
         Se llama cada segundo o cada frame procesado.
         
+        Con EmotionWindowAggregator, cada snapshot resume una ventana: las
+        emociones son la media de sus frames y se guardan también el número
+        de frames y el mínimo y máximo de cada emoción.
+        
         Args:
             session_id: ID de la sesión actual
             timestamp_offset: Segundos desde el inicio de la sesión
             emotions: Diccionario con puntuaciones de emociones
+            frame_count: Frames agregados en la ventana (None = un solo frame)
+            minimum: Diccionario con los mínimos de la ventana (opcional)
+            maximum: Diccionario con los máximos de la ventana (opcional)
         """
-        self.conn.execute('''
-            INSERT INTO emotion_snapshots 
-            (session_id, timestamp_offset, happy, sad, angry, fear, surprise, disgust)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            session_id, 
-            timestamp_offset,
-            emotions.get('happy', 0),
-            emotions.get('sad', 0),
-            emotions.get('angry', 0),
-            emotions.get('fear', 0),
-            emotions.get('surprise', 0),
-            emotions.get('disgust', 0)
-        ))
-        self.conn.commit()
+        events, evicted = (self._detect_events(session_id, timestamp_offset, emotions)
+                           if self.detect_events else ([], []))
+        
+        with self.transaction() as conn:
+            self._insert_events(conn, session_id, events)
+            conn.execute('''
+                INSERT INTO emotion_snapshots 
+                (session_id, timestamp_offset, happy, sad, angry, fear, surprise, disgust,
+                 frame_count, min_scores, max_scores)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                session_id, 
+                timestamp_offset,
+                emotions.get('happy', 0),
+                emotions.get('sad', 0),
+                emotions.get('angry', 0),
+                emotions.get('fear', 0),
+                emotions.get('surprise', 0),
+                emotions.get('disgust', 0),
+                frame_count,
+                self._encode_scores(minimum),
+                self._encode_scores(maximum)
+            ))
+        
+        # Episodios de otras sesiones cerradas por falta de espacio: en su
+        # propia transacción, para que un fallo no afecte a este snapshot
+        if evicted:
+            self._save_pending_events(evicted)
+    
+    def _encode_scores(self, emotions):
+        """Codifica un diccionario de emociones como 6 float32 (None si no hay)"""
+        if emotions is None:
+            return None
+        return np.array([emotions.get(emotion, 0) for emotion in EMOTION_COLUMNS],
+                        dtype='<f4').tobytes()
     
     def end_session(self, session_id, notes=''):
         """
@@ -132,6 +461,11 @@ class SessionDatabase:
             session_id: ID de la sesión a finalizar
             notes: Notas opcionales del terapeuta
         """
+        # Cerrar los episodios que seguían abiertos
+        with self._detectors_lock:
+            detector = self._detectors.pop(session_id, None)
+        events = detector.finish() if detector is not None else []
+        
         # Obtener timestamp de inicio
         cursor = self.conn.execute(
             'SELECT timestamp FROM sessions WHERE id = ?',
@@ -148,11 +482,175 @@ class SessionDatabase:
             except:
                 duration = 0
             
-            self.conn.execute(
-                'UPDATE sessions SET duration = ?, notes = ? WHERE id = ?',
-                (duration, notes, session_id)
-            )
-            self.conn.commit()
+            with self.transaction() as conn:
+                self._insert_events(conn, session_id, events)
+                conn.execute(
+                    'UPDATE sessions SET duration = ?, notes = ? WHERE id = ?',
+                    (duration, notes, session_id)
+                )
+    
+    def _detect_events(self, session_id, timestamp_offset, emotions):
+        """
+        Pasa un snapshot al detector de su sesión (se crea con el primer snapshot).
+        
+        Si hay más de max_open_detectors sesiones abiertas, se cierra el
+        detector de la menos reciente y se devuelven sus episodios abiertos.
+        
+        Returns:
+            tuple: (eventos de esta sesión, pares (session_id, eventos) de
+                   los detectores cerrados)
+        """
+        evicted = []
+        with self._detectors_lock:
+            detector = self._detectors.get(session_id)
+            if detector is None:
+                # Importación diferida: event_detection depende de este módulo
+                from therapy_tools.event_detection import EventDetector
+                detector = self._detectors[session_id] = EventDetector()
+            else:
+                self._detectors.move_to_end(session_id)
+            events = detector.update(timestamp_offset, emotions)
+            
+            while len(self._detectors) > self.max_open_detectors:
+                stale_id, stale = self._detectors.popitem(last=False)
+                evicted.append((stale_id, stale.finish()))
+        return events, evicted
+    
+    def discard_detectors(self, session_ids):
+        """
+        Descarta sin guardar los detectores abiertos de unas sesiones.
+        
+        Lo usan RetentionEngine al borrar sesiones y SessionArchive al
+        archivarlas: sus episodios abiertos no deben escribirse después.
+        
+        Args:
+            session_ids: IDs de las sesiones
+        """
+        with self._detectors_lock:
+            for session_id in session_ids:
+                self._detectors.pop(session_id, None)
+    
+    def _finish_detectors(self):
+        """Cierra todos los detectores abiertos y guarda sus episodios"""
+        with self._detectors_lock:
+            detectors = list(self._detectors.items())
+            self._detectors.clear()
+        if detectors:
+            self._save_pending_events(
+                [(session_id, detector.finish()) for session_id, detector in detectors])
+    
+    def _save_pending_events(self, pending):
+        """Guarda en una transacción propia los episodios de detectores cerrados"""
+        try:
+            with self.transaction() as conn:
+                for session_id, events in pending:
+                    self._insert_events(conn, session_id, events)
+        except sqlite3.Error as e:
+            print(f"Error guardando eventos pendientes: {e}")
+    
+    def _insert_events(self, conn, session_id, events):
+        """
+        Guarda eventos (event_type, emotion, start, end, value) de una sesión.
+        
+        Si la sesión ya no existe (p. ej. la borró RetentionEngine mientras
+        su detector seguía abierto), los eventos se descartan en lugar de
+        violar la clave foránea.
+        """
+        if events:
+            conn.executemany('''
+                INSERT INTO session_events
+                (session_id, event_type, emotion, start_offset, end_offset, value)
+                SELECT ?, ?, ?, ?, ?, ?
+                WHERE EXISTS (SELECT 1 FROM sessions WHERE id = ?)
+            ''', [(session_id,) + tuple(event) + (session_id,) for event in events])
+    
+    def get_session_events(self, session_id, event_type=None, emotion=None):
+        """
+        Obtiene los eventos de una sesión en orden cronológico.
+        
+        Args:
+            session_id: ID de la sesión
+            event_type: Filtrar por tipo ('crossing', 'episode', 'rapid_change')
+            emotion: Filtrar por emoción
+            
+        Returns:
+            list: Tuplas (event_type, emotion, start_offset, end_offset, value)
+        """
+        conditions = ['session_id = ?']
+        params = [session_id]
+        if event_type is not None:
+            conditions.append('event_type = ?')
+            params.append(event_type)
+        if emotion is not None:
+            conditions.append('emotion = ?')
+            params.append(emotion)
+        
+        cursor = self.conn.execute(f'''
+            SELECT event_type, emotion, start_offset, end_offset, value
+            FROM session_events
+            WHERE {' AND '.join(conditions)}
+            ORDER BY start_offset, id
+        ''', params)
+        return cursor.fetchall()
+    
+    def find_events(self, event_type, emotion, patient_id=None, min_value=None, limit=100):
+        """
+        Busca eventos entre sesiones (p. ej. episodios de miedo de un paciente).
+        
+        Usa el índice por tipo, emoción y valor: no recorre ningún timeline.
+        
+        Args:
+            event_type: Tipo de evento
+            emotion: Emoción
+            patient_id: Filtrar por paciente (None = todos)
+            min_value: Valor mínimo (pico, valor al cruzar o cambio)
+            limit: Número máximo de eventos
+            
+        Returns:
+            list: Tuplas (session_id, patient_id, session_timestamp,
+                  start_offset, end_offset, value), los más recientes primero
+        """
+        conditions = ['e.event_type = ?', 'e.emotion = ?']
+        params = [event_type, emotion]
+        if patient_id is not None:
+            conditions.append('s.patient_id = ?')
+            params.append(patient_id)
+        if min_value is not None:
+            conditions.append('e.value >= ?')
+            params.append(min_value)
+        
+        cursor = self.conn.execute(f'''
+            SELECT e.session_id, s.patient_id, s.timestamp, e.start_offset, e.end_offset, e.value
+            FROM session_events e
+            JOIN sessions s ON s.id = e.session_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY s.timestamp DESC, e.start_offset
+            LIMIT ?
+        ''', params + [limit])
+        return cursor.fetchall()
+    
+    def rebuild_session_events(self, session_id):
+        """
+        Vuelve a detectar los eventos de una sesión a partir de su timeline.
+        
+        Para sesiones guardadas antes de existir session_events (también
+        funciona con sesiones archivadas).
+        
+        Args:
+            session_id: ID de la sesión
+            
+        Returns:
+            int: Número de eventos guardados
+        """
+        # Importación diferida: event_detection depende de este módulo
+        from therapy_tools.event_detection import detect_events
+        
+        offsets, scores = self.get_session_emotions_array(session_id)
+        events = detect_events(offsets, scores)
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM session_events WHERE session_id = ?', (session_id,))
+            self._insert_events(conn, session_id, events)
+        return len(events)
     
     def get_patient_sessions(self, patient_id, limit=10):
         """
@@ -174,10 +672,59 @@ class SessionDatabase:
         ''', (patient_id, limit))
         return cursor.fetchall()
     
+    def get_patient_sessions_page(self, patient_id, page_size=50, after=None):
+        """
+        Obtiene una página de sesiones de un paciente (paginación por clave).
+        
+        ¿Por qué por clave y no OFFSET?
+        - Con OFFSET, SQLite recorre y descarta todas las filas anteriores:
+          la página N cuesta O(N)
+        - Aquí cada página continúa desde la última (timestamp, id) vista
+          usando el índice idx_sessions_patient: cada página cuesta lo mismo
+          
+        Args:
+            patient_id: ID anónimo del paciente
+            page_size: Número de sesiones por página
+            after: Cursor devuelto por la página anterior (None = primera)
+            
+        Returns:
+            tuple: (sesiones, cursor) con las sesiones en el mismo formato
+                   que get_patient_sessions (más recientes primero) y el
+                   cursor de la página siguiente, o None si no hay más
+        """
+        if after is None:
+            cursor = self.conn.execute('''
+                SELECT id, timestamp, duration, session_type, notes
+                FROM sessions
+                WHERE patient_id = ?
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            ''', (patient_id, page_size + 1))
+        else:
+            cursor = self.conn.execute('''
+                SELECT id, timestamp, duration, session_type, notes
+                FROM sessions
+                WHERE patient_id = ? AND (timestamp, id) < (?, ?)
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            ''', (patient_id, after[0], after[1], page_size + 1))
+        rows = cursor.fetchall()
+        
+        # Se pide una fila de más para saber si existe otra página
+        if len(rows) <= page_size:
+            return rows, None
+        rows = rows[:page_size]
+        return rows, (rows[-1][1], rows[-1][0])
+    
     def get_session_emotions(self, session_id):
         """
         Obtiene todos los snapshots de emociones de una sesión.
         
+        Funciona igual para sesiones activas y para sesiones movidas al
+        archivo frío (ver SessionArchive). Si una sesión tiene bloque
+        archivado y snapshots posteriores, se devuelven ambos unidos por
+        timestamp_offset.
+        
         Args:
             session_id: ID de la sesión
             
@@ -190,7 +737,123 @@ class SessionDatabase:
             WHERE session_id = ?
             ORDER BY timestamp_offset
         ''', (session_id,))
-        return cursor.fetchall()
+        rows = cursor.fetchall()
+        
+        archived = self._get_archived_block(session_id)
+        if archived is not None:
+            offsets, scores = archived
+            archived_rows = [
+                (int(offset),) + tuple(float(v) for v in values)
+                for offset, values in zip(offsets, scores)
+            ]
+            rows = list(heapq.merge(archived_rows, rows, key=itemgetter(0)))
+        return rows
+    
+    def get_session_emotions_array(self, session_id):
+        """
+        Obtiene los snapshots de una sesión como arrays de NumPy.
+        
+        Evita construir una tupla por fila cuando se va a operar de forma
+        vectorizada (estadísticas, recalibración, archivado). Igual que
+        get_session_emotions, une el bloque archivado y los snapshots
+        activos por offset.
+        
+        Args:
+            session_id: ID de la sesión
+            
+        Returns:
+            tuple: (offsets, scores) con offsets de forma (T,) y scores de
+                   forma (T, 6) en el orden de EMOTION_COLUMNS
+        """
+        cursor = self.conn.execute('''
+            SELECT timestamp_offset, happy, sad, angry, fear, surprise, disgust
+            FROM emotion_snapshots
+            WHERE session_id = ?
+            ORDER BY timestamp_offset
+        ''', (session_id,))
+        rows = cursor.fetchall()
+        
+        if rows:
+            data = np.array(rows, dtype=np.float64)
+            hot = data[:, 0].astype(np.int64), np.nan_to_num(data[:, 1:])
+        else:
+            hot = np.zeros(0, dtype=np.int64), np.zeros((0, len(EMOTION_COLUMNS)))
+        
+        archived = self._get_archived_block(session_id)
+        if archived is None:
+            return hot
+        return _merge_by_offset(archived, hot)
+    
+    def get_session_window_ranges(self, session_id):
+        """
+        Obtiene el rango y el número de frames de cada snapshot de una sesión.
+        
+        Los snapshots guardados sin agregación (o archivados en bloques de
+        versión 1, que conservan solo las medias) tienen frame_count 1 y
+        mínimos y máximos NaN. Los snapshots archivados y activos se unen por
+        offset, como en get_session_emotions_array.
+        
+        Args:
+            session_id: ID de la sesión
+            
+        Returns:
+            tuple: (offsets (T,), frame_counts (T,), minimums (T, 6), maximums (T, 6))
+        """
+        rows = self.conn.execute('''
+            SELECT timestamp_offset, frame_count, min_scores, max_scores
+            FROM emotion_snapshots
+            WHERE session_id = ?
+            ORDER BY timestamp_offset
+        ''', (session_id,)).fetchall()
+        
+        size = len(EMOTION_COLUMNS)
+        offsets = np.array([row[0] for row in rows], dtype=np.int64)
+        frame_counts = np.array([row[1] or 1 for row in rows], dtype=np.int64)
+        minimums = np.full((len(rows), size), np.nan)
+        maximums = np.full((len(rows), size), np.nan)
+        for i, (_, _, low, high) in enumerate(rows):
+            if low is not None:
+                minimums[i] = np.frombuffer(low, dtype='<f4', count=size)
+            if high is not None:
+                maximums[i] = np.frombuffer(high, dtype='<f4', count=size)
+        hot = offsets, frame_counts, minimums, maximums
+        
+        archived = self._get_archived_block(session_id, windows=True)
+        if archived is None:
+            return hot
+        archived_offsets, _, archived_counts, archived_minimums, archived_maximums = archived
+        return _merge_by_offset(
+            (archived_offsets, np.maximum(archived_counts, 1),
+             archived_minimums, archived_maximums),
+            hot)
+    
+    def _get_archived_block(self, session_id, windows=False):
+        """
+        Lee y decodifica el bloque archivado de una sesión, si existe.
+        
+        Args:
+            session_id: ID de la sesión
+            windows: Si es True, incluye frames, mínimos y máximos (ver
+                     session_archive.decode_session_windows)
+                     
+        Returns:
+            tuple: (offsets, scores), o (offsets, scores, frame_counts,
+                   minimums, maximums) con windows, o None si la sesión no
+                   está archivada
+        """
+        cursor = self.conn.execute(
+            'SELECT data FROM archived_sessions WHERE session_id = ?',
+            (session_id,)
+        )
+        result = cursor.fetchone()
+        if not result:
+            return None
+        
+        # Importación diferida: session_archive depende de este módulo
+        from therapy_tools.session_archive import decode_session_block, decode_session_windows
+        if windows:
+            return decode_session_windows(result[0])
+        return decode_session_block(result[0])
     
     def save_exercise_results(self, patient_id, results, session_id=None):
         """
@@ -200,24 +863,161 @@ class SessionDatabase:
             patient_id: ID anónimo del paciente
             results: Diccionario con resultados del ejercicio
             session_id: ID de sesión opcional
+            
+        Returns:
+            int: ID del resultado guardado
         """
-        self.conn.execute('''
-            INSERT INTO exercise_results 
-            (session_id, patient_id, exercise_type, initial_anxiety, 
-             final_anxiety, reduction, reduction_percent, success, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            session_id,
-            patient_id,
-            results.get('exercise', 'unknown'),
-            results.get('initial_anxiety', 0),
-            results.get('final_anxiety', 0),
-            results.get('reduction', 0),
-            results.get('reduction_percent', 0),
-            1 if results.get('success', False) else 0,
-            json.dumps(results.get('timeline', []))
-        ))
-        self.conn.commit()
+        # El timeline se guarda como BLOB binario, no como JSON en notes
+        timeline = results.get('timeline')
+        if timeline is not None and not isinstance(timeline, bytes):
+            # Importación diferida: emotion_timeline depende de este módulo
+            from therapy_tools.emotion_timeline import EmotionTimeline
+            if not isinstance(timeline, EmotionTimeline):
+                timeline = EmotionTimeline.from_records(timeline, results.get('timestamps'))
+            timeline = timeline.to_bytes() if len(timeline) else None
+        
+        with self.transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO exercise_results 
+                (session_id, patient_id, exercise_type, initial_anxiety, 
+                 final_anxiety, reduction, reduction_percent, success, notes, timeline)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                session_id,
+                patient_id,
+                results.get('exercise', 'unknown'),
+                results.get('initial_anxiety', 0),
+                results.get('final_anxiety', 0),
+                results.get('reduction', 0),
+                results.get('reduction_percent', 0),
+                1 if results.get('success', False) else 0,
+                results.get('notes', ''),
+                timeline
+            ))
+            return cursor.lastrowid
+    
+    def get_exercise_timeline(self, exercise_id):
+        """
+        Obtiene el timeline de un ejercicio como arrays de NumPy.
+        
+        Los resultados guardados antes del formato binario tienen el timeline
+        como JSON en notes, sin instantes: sus offsets son el índice de la
+        medición.
+        
+        Args:
+            exercise_id: ID del resultado del ejercicio
+            
+        Returns:
+            tuple: (offsets, scores) con offsets float64 (T,) en segundos
+                   desde el inicio del ejercicio y scores (T, 6) en el orden
+                   de EMOTION_COLUMNS
+        """
+        cursor = self.conn.execute(
+            'SELECT timeline, notes FROM exercise_results WHERE id = ?',
+            (exercise_id,)
+        )
+        result = cursor.fetchone()
+        empty = (np.zeros(0), np.zeros((0, len(EMOTION_COLUMNS))))
+        if not result:
+            return empty
+        
+        timeline, notes = result
+        if timeline is not None:
+            # Importación diferida: emotion_timeline depende de este módulo
+            from therapy_tools.emotion_timeline import decode_timeline
+            return decode_timeline(timeline)
+        
+        try:
+            records = json.loads(notes) if notes else None
+        except ValueError:
+            records = None
+        if not isinstance(records, list) or not records:
+            return empty
+        
+        scores = np.array([[float(r.get(e, 0) or 0) for e in EMOTION_COLUMNS] for r in records])
+        return np.arange(len(records), dtype=np.float64), scores
+    
+    def save_calibration(self, patient_id, calibration_data, calibration_date=None):
+        """
+        Guarda una nueva versión de la calibración de un paciente.
+        
+        Las versiones anteriores se conservan: la vigente es la de
+        calibration_date más reciente.
+        
+        Args:
+            patient_id: ID anónimo del paciente
+            calibration_data: Diccionario serializable a JSON
+            calibration_date: Fecha 'YYYY-MM-DD HH:MM:SS' (default: ahora)
+            
+        Returns:
+            int: ID de la versión guardada
+        """
+        calibration_date = calibration_date or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO calibrations (patient_id, calibration_date, data)
+                VALUES (?, ?, ?)
+            ''', (patient_id, calibration_date, json.dumps(calibration_data, ensure_ascii=False)))
+        return cursor.lastrowid
+    
+    def get_calibration_version(self, patient_id):
+        """
+        Obtiene el ID de la calibración vigente sin leer sus datos.
+        
+        Consulta solo el índice: sirve para validar cachés en cada uso.
+        
+        Args:
+            patient_id: ID anónimo del paciente
+            
+        Returns:
+            int: ID de la versión vigente, o None si no hay calibración
+        """
+        cursor = self.conn.execute('''
+            SELECT id FROM calibrations
+            WHERE patient_id = ?
+            ORDER BY calibration_date DESC, id DESC
+            LIMIT 1
+        ''', (patient_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def get_calibration(self, patient_id):
+        """
+        Obtiene la calibración vigente de un paciente.
+        
+        Args:
+            patient_id: ID anónimo del paciente
+            
+        Returns:
+            tuple: (id, calibration_date, datos), o None si no hay calibración
+        """
+        cursor = self.conn.execute('''
+            SELECT id, calibration_date, data FROM calibrations
+            WHERE patient_id = ?
+            ORDER BY calibration_date DESC, id DESC
+            LIMIT 1
+        ''', (patient_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+    
+    def get_calibration_history(self, patient_id):
+        """
+        Lista las versiones de calibración de un paciente (más reciente primero).
+        
+        Args:
+            patient_id: ID anónimo del paciente
+            
+        Returns:
+            list: Tuplas (id, calibration_date)
+        """
+        cursor = self.conn.execute('''
+            SELECT id, calibration_date FROM calibrations
+            WHERE patient_id = ?
+            ORDER BY calibration_date DESC, id DESC
+        ''', (patient_id,))
+        return cursor.fetchall()
     
     def get_patient_exercise_history(self, patient_id, limit=20):
         """
@@ -240,6 +1040,135 @@ class SessionDatabase:
         ''', (patient_id, limit))
         return cursor.fetchall()
     
+    def iter_patient_timeline(self, patient_id, batch_size=1000):
+        """
+        Recorre todas las sesiones de un paciente con sus snapshots.
+        
+        Usa una única consulta ordenada (JOIN de sesiones, snapshots y archivo
+        frío) leída por lotes, así que la memoria no crece con el volumen de
+        datos. Cada grupo de snapshots debe consumirse antes de avanzar a la
+        siguiente sesión.
+        
+        Args:
+            patient_id: ID anónimo del paciente
+            batch_size: Filas leídas del cursor en cada lote
+            
+        Yields:
+            tuple: (session, snapshots) donde session es
+                   (id, timestamp, duration, session_type) y snapshots es un
+                   iterador de tuplas (timestamp_offset, happy, sad, angry,
+                   fear, surprise, disgust)
+        """
+        cursor = self.conn.execute('''
+            SELECT s.id, s.timestamp, s.duration, s.session_type,
+                   a.data,
+                   e.timestamp_offset, e.happy, e.sad, e.angry, e.fear, e.surprise, e.disgust
+            FROM sessions s
+            LEFT JOIN archived_sessions a ON a.session_id = s.id
+            LEFT JOIN emotion_snapshots e ON e.session_id = s.id
+            WHERE s.patient_id = ?
+            ORDER BY s.timestamp DESC, s.id DESC, e.timestamp_offset
+        ''', (patient_id,))
+        
+        rows = self._iter_cursor(cursor, batch_size)
+        for session, group in groupby(rows, key=lambda row: row[:4]):
+            yield session, self._snapshots_from_rows(group)
+    
+    def iter_patient_exercises(self, patient_id, batch_size=1000):
+        """
+        Recorre todo el historial de ejercicios de un paciente sin límite.
+        
+        Args:
+            patient_id: ID del paciente
+            batch_size: Filas leídas del cursor en cada lote
+            
+        Yields:
+            tuple: (exercise_type, timestamp, initial_anxiety, final_anxiety,
+                    reduction_percent, success)
+        """
+        cursor = self.conn.execute('''
+            SELECT exercise_type, timestamp, initial_anxiety, final_anxiety, 
+                   reduction_percent, success
+            FROM exercise_results
+            WHERE patient_id = ?
+            ORDER BY timestamp DESC
+        ''', (patient_id,))
+        return self._iter_cursor(cursor, batch_size)
+    
+    def _iter_cursor(self, cursor, batch_size):
+        """Lee un cursor por lotes de tamaño fijo"""
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            yield from batch
+    
+    def _snapshots_from_rows(self, rows):
+        """
+        Convierte las filas del JOIN de una sesión en snapshots.
+        
+        Cada fila lleva el bloque archivado de la sesión (o None) y, si lo
+        hay, un snapshot activo. El bloque se decodifica una sola vez y se
+        une con los snapshots activos por offset.
+        """
+        first = next(rows, None)
+        if first is None:
+            return
+        hot = (row[5:] for row in chain([first], rows) if row[5] is not None)
+        if first[4] is None:
+            yield from hot
+            return
+        
+        # Importación diferida: session_archive depende de este módulo
+        from therapy_tools.session_archive import decode_session_block
+        offsets, scores = decode_session_block(first[4])
+        archived = (
+            (int(offset),) + tuple(float(v) for v in values)
+            for offset, values in zip(offsets, scores)
+        )
+        yield from heapq.merge(archived, hot, key=itemgetter(0))
+    
+    def get_session_version(self, session_id):
+        """
+        Devuelve una versión de los datos de una sesión.
+        
+        Cambia cuando se añaden snapshots o eventos, se archiva o restaura
+        la sesión, se cierra o se editan sus notas. Permite cachear
+        resultados derivados (dashboard, gráficos) sin releer los snapshots:
+        la consulta solo recorre los índices de la sesión.
+        
+        Args:
+            session_id: ID de la sesión
+            
+        Returns:
+            tuple: Versión comparable con ==
+        """
+        cursor = self.conn.execute('''
+            SELECT (SELECT COUNT(*) FROM emotion_snapshots WHERE session_id = ?),
+                   (SELECT MAX(id) FROM emotion_snapshots WHERE session_id = ?),
+                   (SELECT archived_at FROM archived_sessions WHERE session_id = ?),
+                   (SELECT duration FROM sessions WHERE id = ?),
+                   (SELECT notes FROM sessions WHERE id = ?),
+                   (SELECT MAX(id) FROM session_events WHERE session_id = ?)
+        ''', (session_id, session_id, session_id, session_id, session_id, session_id))
+        return cursor.fetchone()
+    
+    def get_exercise_version(self, patient_id):
+        """
+        Devuelve una versión del historial de ejercicios de un paciente.
+        
+        Args:
+            patient_id: ID del paciente
+            
+        Returns:
+            tuple: (número de ejercicios, último ID)
+        """
+        cursor = self.conn.execute(
+            'SELECT COUNT(*), MAX(id) FROM exercise_results WHERE patient_id = ?',
+            (patient_id,)
+        )
+        return cursor.fetchone()
+    
     def get_session_statistics(self, session_id):
         """
         Calcula estadísticas de una sesión específica.
@@ -250,44 +1179,59 @@ class SessionDatabase:
         Returns:
             dict: Diccionario con estadísticas
         """
-        emotions_data = self.get_session_emotions(session_id)
+        offsets, scores = self.get_session_emotions_array(session_id)
         
-        if not emotions_data:
+        if len(offsets) == 0:
             return None
         
-        # Calcular promedios y estadísticas
-        import numpy as np
-        
-        stats = {
-            'happy': {'mean': 0, 'max': 0, 'min': 0},
-            'sad': {'mean': 0, 'max': 0, 'min': 0},
-            'angry': {'mean': 0, 'max': 0, 'min': 0},
-            'fear': {'mean': 0, 'max': 0, 'min': 0},
-            'surprise': {'mean': 0, 'max': 0, 'min': 0},
-            'disgust': {'mean': 0, 'max': 0, 'min': 0}
-        }
-        
-        emotions = ['happy', 'sad', 'angry', 'fear', 'surprise', 'disgust']
-        
-        for i, emotion in enumerate(emotions):
-            values = [row[i + 1] for row in emotions_data]  # +1 por timestamp_offset
-            if values:
-                stats[emotion] = {
-                    'mean': float(np.mean(values)),
-                    'max': float(np.max(values)),
-                    'min': float(np.min(values)),
-                    'std': float(np.std(values))
-                }
+        # Calcular promedios y estadísticas (vectorizado por columna)
+        means = scores.mean(axis=0)
+        maxs = scores.max(axis=0)
+        mins = scores.min(axis=0)
+        stds = scores.std(axis=0)
         
-        # Encontrar emoción dominante
-        averages = {e: stats[e]['mean'] for e in emotions}
-        dominant = max(averages, key=averages.get)
+        stats = {}
+        for i, emotion in enumerate(EMOTION_COLUMNS):
+            stats[emotion] = {
+                'mean': float(means[i]),
+                'max': float(maxs[i]),
+                'min': float(mins[i]),
+                'std': float(stds[i])
+            }
         
-        stats['dominant_emotion'] = dominant
-        stats['duration_seconds'] = emotions_data[-1][0] if emotions_data else 0
+        # Encontrar emoción dominante
+        stats['dominant_emotion'] = EMOTION_COLUMNS[int(np.argmax(means))]
+        stats['duration_seconds'] = int(offsets[-1])
         
         return stats
     
+    def release_connection(self):
+        """
+        Cierra la conexión del hilo actual.
+        
+        Útil al terminar un hilo de trabajo que ya no usará la base de datos.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            with self._connections_lock:
+                if conn in self._connections:
+                    self._connections.remove(conn)
+            conn.close()
+    
     def close(self):
-        """Cierra la conexión a la base de datos"""
-        self.conn.close()
+        """
+        Cierra todas las conexiones del pool.
+        
+        Antes guarda los episodios de las sesiones que no llegaron a
+        end_session. Si el proceso termina sin close(), sus eventos se
+        pueden reconstruir con rebuild_session_events.
+        """
+        self._finish_detectors()
+        with self._connections_lock:
+            connections = self._connections
+            self._connections = []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+        self._shared_conn = None
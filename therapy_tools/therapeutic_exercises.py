@@ -2,6 +2,7 @@
 # Incluye ejercicios de respiración, grounding, relajación y más
 
 import time
+import threading
 import cv2
 import numpy as np
 from datetime import datetime
@@ -11,6 +12,11 @@ import sys
 # Agregar el directorio padre al path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+from therapy_tools.emotion_timeline import EmotionTimeline
+from therapy_tools.rolling_stats import RollingEmotionStats
+from therapy_tools.exercise_scheduler import ExerciseScheduler
+from therapy_tools.live_plot import LivePlot
+
 # Intentar importar matplotlib
 try:
     import matplotlib.pyplot as plt
@@ -19,6 +25,323 @@ except ImportError:
     MATPLOTLIB_AVAILABLE = False
 
 
+class MeasurementEngine:
+    """
+    Motor de medición compartido por todos los ejercicios.
+    
+    ¿Por qué?
+    - Cada ejercicio tenía su propio bucle camera.read() -> frame_processing
+      -> imshow, y la inferencia iba al ritmo del dibujo
+    - Aquí un hilo en segundo plano captura y mide (sin dibujar la malla)
+      y publica las puntuaciones a los suscriptores
+    - La interfaz del ejercicio dibuja las instrucciones a su propio ritmo
+      con el último frame disponible
+    - Varias medidas (p. ej. ansiedad y bienestar) se calculan con la misma
+      pasada de inferencia
+    """
+    
+    def __init__(self, emotion_system, camera, idle_wait=0.01):
+        """
+        Inicializa el motor (el hilo arranca con start()).
+        
+        Args:
+            emotion_system: Instancia de EmotionRecognitionSystem
+            camera: Instancia de la cámara
+            idle_wait: Segundos de espera cuando la cámara no entrega frame
+        """
+        self.emotion_system = emotion_system
+        self.camera = camera
+        self.idle_wait = idle_wait
+        
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._latest = (None, None, None)  # (timestamp, frame, emociones)
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Arranca el hilo de medición (no hace nada si ya está en marcha)"""
+        if self.is_running():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='MeasurementEngine', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Detiene el hilo de medición y espera a que termine"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        with self._lock:
+            self._latest = (None, None, None)
+    
+    def is_running(self):
+        """Indica si el hilo de medición está en marcha"""
+        return self._thread is not None and self._thread.is_alive()
+    
+    def subscribe(self, callback):
+        """
+        Registra un suscriptor.
+        
+        Args:
+            callback: Función callback(timestamp, emotions) llamada desde el
+                      hilo de medición con cada medición válida
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+    
+    def unsubscribe(self, callback):
+        """Elimina un suscriptor registrado con subscribe()"""
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+    
+    def latest(self):
+        """
+        Devuelve la última medición.
+        
+        Returns:
+            tuple: (timestamp, frame, emotions); emotions es None si no se
+                   detectó rostro en ese frame
+        """
+        with self._lock:
+            return self._latest
+    
+    def _run(self):
+        """Bucle del hilo: captura, mide y publica"""
+        while not self._stop_event.is_set():
+            ret, frame = self.camera.read()
+            if not ret:
+                self._stop_event.wait(self.idle_wait)
+                continue
+            
+            timestamp = time.monotonic()
+            emotions = self._analyze(frame)
+            
+            with self._lock:
+                self._latest = (timestamp, frame, emotions)
+                subscribers = list(self._subscribers)
+            
+            if emotions is not None:
+                for callback in subscribers:
+                    callback(timestamp, emotions)
+    
+    def _analyze(self, frame):
+        """
+        Mide las emociones de un frame sin dibujar.
+        
+        Returns:
+            dict: Puntuaciones de emociones, o None si no hay rostro
+        """
+        try:
+            analysis = self.emotion_system.analyze(frame)
+        except Exception:
+            return None
+        return dict(analysis.scores) if analysis.face_found else None
+
+
+class _EmotionWindow:
+    """Suscriptor que acumula la media de varias emociones durante una ventana"""
+    
+    def __init__(self, emotions):
+        self.emotions = tuple(emotions)
+        self.sums = np.zeros(len(self.emotions))
+        self.count = 0
+    
+    def __call__(self, timestamp, emotions):
+        self.sums += [emotions.get(emotion, 0) for emotion in self.emotions]
+        self.count += 1
+    
+    def means(self):
+        """Medias de la ventana (0 si no hubo mediciones)"""
+        values = self.sums / self.count if self.count else self.sums
+        return {emotion: float(value) for emotion, value in zip(self.emotions, values)}
+
+
+class GuidedExercise:
+    """
+    Base común de los ejercicios guiados.
+    
+    - run() reinicia el timeline, suscribe el registro al motor de medición,
+      delega en _run() de cada ejercicio y muestra sus resultados
+    - _phase() muestra instrucciones sobre el último frame mientras el motor
+      mide en segundo plano, a display_fps y con fechas límite monótonas
+    - _measure() promedia varias emociones en una sola ventana de medición
+    - live_stats ofrece media, tendencia y EWMA de los últimos segundos en
+      cualquier momento, sin detener el ejercicio para medir
+    - live_plot dibuja la traza de ansiedad y bienestar en una esquina del
+      frame (blitting, sin redibujar la figura completa)
+    """
+    
+    window_name = 'Ejercicio'
+    
+    # Fotogramas por segundo de la ventana del ejercicio
+    display_fps = 30
+    
+    # Mostrar la traza en vivo de las emociones medidas (requiere matplotlib)
+    show_live_plot = True
+    
+    # Emociones medidas en cada ventana: miedo (ansiedad) y felicidad (bienestar)
+    measured_emotions = ('fear', 'happy')
+    
+    def __init__(self, parent):
+        """
+        Inicializa el ejercicio.
+        
+        Args:
+            parent: Instancia de TherapeuticExercises
+        """
+        self.parent = parent
+        
+        # Datos de la sesión (array estructurado, no una lista de diccionarios)
+        self.emotion_timeline = EmotionTimeline()
+        
+        # Estadísticas en vivo de ansiedad y bienestar
+        self.live_stats = RollingEmotionStats(self.measured_emotions)
+        
+        # Ritmo de las fases y del dibujo
+        self.scheduler = ExerciseScheduler(fps=self.display_fps)
+        
+        # Traza en vivo (últimos 60 segundos)
+        self.live_plot = None
+        if self.show_live_plot and MATPLOTLIB_AVAILABLE:
+            self.live_plot = LivePlot(self.measured_emotions)
+    
+    @property
+    def engine(self):
+        """Motor de medición compartido"""
+        return self.parent.measurement_engine
+    
+    def run(self):
+        """
+        Ejecuta el ejercicio con guía visual y monitoreo.
+        
+        Returns:
+            dict: Resultados del ejercicio
+        """
+        # Reiniciar datos (los resultados anteriores conservan su timeline)
+        self.emotion_timeline = EmotionTimeline()
+        self.live_stats.reset()
+        self.scheduler.reset()
+        
+        subscribers = [self._record, self.live_stats]
+        if self.live_plot is not None:
+            self.live_plot.clear()
+            subscribers.append(self.live_plot)
+        
+        for subscriber in subscribers:
+            self.engine.subscribe(subscriber)
+        try:
+            results = self._run()
+        finally:
+            # La cámara y la inferencia se liberan antes de mostrar resultados
+            for subscriber in subscribers:
+                self.engine.unsubscribe(subscriber)
+            self.engine.stop()
+            cv2.destroyAllWindows()
+        
+        self._show_results(results)
+        return results
+    
+    def _run(self):
+        """
+        Flujo del ejercicio (implementado por cada ejercicio).
+        
+        Returns:
+            dict: Resultados del ejercicio
+        """
+        raise NotImplementedError
+    
+    def _show_results(self, results):
+        """Muestra resultados del ejercicio (implementado por cada ejercicio)"""
+        raise NotImplementedError
+    
+    def _record(self, timestamp, emotions):
+        """Guarda cada medición en el timeline del ejercicio"""
+        self.emotion_timeline.append(timestamp, emotions)
+    
+    def _phase(self, duration, overlay=None, measure=None, allow_escape=False):
+        """
+        Muestra una fase del ejercicio durante duration segundos.
+        
+        Args:
+            duration: Duración en segundos
+            overlay: Función overlay(frame, elapsed, remaining) que dibuja las
+                     instrucciones sobre el frame
+            measure: Emociones a promediar durante la fase (None = no medir)
+            allow_escape: Si es True, ESC termina la fase antes de tiempo
+            
+        Returns:
+            dict: Medias de las emociones medidas (vacío si measure es None)
+        """
+        self.engine.start()
+        window = _EmotionWindow(measure) if measure else None
+        if window is not None:
+            self.engine.subscribe(window)
+        
+        try:
+            # El planificador duerme hasta el siguiente fotograma (sin girar
+            # aunque la cámara todavía no haya entregado ninguno)
+            for elapsed, remaining in self.scheduler.phase(duration):
+                _, frame, emotions = self.engine.latest()
+                if frame is not None:
+                    frame = frame.copy()
+                    if emotions:
+                        self.parent.emotion_system.emotions_visualization.main(emotions, frame)
+                    if overlay is not None:
+                        overlay(frame, elapsed, remaining)
+                    self._draw_live_plot(frame)
+                    cv2.imshow(self.window_name, frame)
+                
+                if cv2.waitKey(1) == 27 and allow_escape:
+                    break
+        finally:
+            if window is not None:
+                self.engine.unsubscribe(window)
+        
+        return window.means() if window is not None else {}
+    
+    def _draw_live_plot(self, frame):
+        """Dibuja la traza en vivo en la esquina inferior izquierda del frame"""
+        if self.live_plot is None:
+            return
+        plot = self.live_plot.to_image()
+        height, width = plot.shape[:2]
+        if frame.shape[0] >= height and frame.shape[1] >= width:
+            frame[-height:, :width] = plot
+    
+    def _measure(self, duration):
+        """
+        Mide ansiedad y bienestar promedio durante X segundos (una sola pasada).
+        
+        Args:
+            duration: Segundos de medición
+            
+        Returns:
+            dict: Media de cada emoción de measured_emotions
+        """
+        def overlay(frame, elapsed, remaining):
+            cv2.putText(frame, f"Midiendo... {int(remaining)}s", 
+                       (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 
+                       1, (255, 255, 0), 2)
+        
+        return self._phase(duration, overlay, measure=self.measured_emotions)
+    
+    def _measure_anxiety(self, duration):
+        """
+        Mide nivel promedio de ansiedad (miedo) durante X segundos.
+        
+        Args:
+            duration: Segundos de medición
+            
+        Returns:
+            float: Nivel promedio de ansiedad
+        """
+        return self._measure(duration)['fear']
+
+
 class TherapeuticExercises:
     """
     Biblioteca de ejercicios terapéuticos con biofeedback emocional.
@@ -49,6 +372,9 @@ class TherapeuticExercises:
         self.emotion_system = emotion_recognition_system
         self.camera = camera
         
+        # Captura e inferencia en segundo plano, compartidas por los ejercicios
+        self.measurement_engine = MeasurementEngine(emotion_recognition_system, camera)
+        
         # Catálogo de ejercicios disponibles
         self.exercises = {
             'breathing_478': BreathingExercise478(self),
@@ -113,7 +439,7 @@ class TherapeuticExercises:
         }
 
 
-class BreathingExercise478:
+class BreathingExercise478(GuidedExercise):
     """
     Ejercicio de Respiración 4-7-8 (Dr. Andrew Weil)
     
@@ -133,8 +459,18 @@ class BreathingExercise478:
     - Monitorea nivel de miedo/ansiedad en tiempo real
     - Muestra gráfico de reducción de ansiedad
     - Confirma cuando la técnica está funcionando
+    - Ajusta el número de ciclos: termina antes si se alcanza el objetivo
+      o la ansiedad se estabiliza, y continúa hasta 8 si sigue bajando
     """
     
+    window_name = 'Ejercicio de Respiracion'
+    
+    min_cycles = 4
+    max_cycles = 8
+    
+    # Reducción (%) a partir de la cual se considera alcanzado el objetivo
+    goal_reduction_percent = 30
+    
     def __init__(self, parent):
         """
         Inicializa el ejercicio.
@@ -142,23 +478,14 @@ class BreathingExercise478:
         Args:
             parent: Instancia de TherapeuticExercises
         """
-        self.parent = parent
+        super().__init__(parent)
         self.name = "Respiración 4-7-8"
         self.duration = 5
         self.indications = "Ansiedad, estrés, insomnio, ataques de pánico"
         self.goal = "Reducir ansiedad en 30-50%"
-        
-        # Datos de la sesión
-        self.emotion_timeline = []
-        self.timestamps = []
     
-    def run(self):
-        """
-        Ejecuta el ejercicio con guía visual y monitoreo.
-        
-        Returns:
-            dict: Resultados del ejercicio
-        """
+    def _run(self):
+        """Flujo del ejercicio: medición inicial, ciclos y medición final"""
         print("=" * 60)
         print("EJERCICIO: RESPIRACIÓN 4-7-8")
         print("=" * 60)
@@ -170,23 +497,21 @@ class BreathingExercise478:
         
         input("Presione ENTER cuando esté listo...")
         
-        # Reiniciar datos
-        self.emotion_timeline = []
-        self.timestamps = []
-        
         # Medir ansiedad inicial
         print("\n  Midiendo nivel de ansiedad inicial...")
-        initial_anxiety = self._measure_current_anxiety(duration=10)
+        initial_anxiety = self._measure_anxiety(10)
         print(f"Ansiedad inicial: {initial_anxiety:.1f}%")
         
-        # Realizar 6 ciclos de respiración
-        num_cycles = 6
-        for cycle in range(1, num_cycles + 1):
-            print(f"\n  Ciclo {cycle}/{num_cycles}")
+        # Realizar entre min_cycles y max_cycles ciclos de respiración
+        num_cycles = 0
+        while num_cycles < self.max_cycles:
+            num_cycles += 1
+            print(f"\n  Ciclo {num_cycles}/{self.max_cycles}")
             self._breathing_cycle()
             
-            # Medir ansiedad después de cada ciclo
-            current_anxiety = self._measure_current_anxiety(duration=5)
+            # Lectura en vivo de los últimos segundos (sin pausar para medir)
+            current_anxiety = self.live_stats.mean('fear')
+            trend = self.live_stats.slope('fear') * 60  # Puntos por minuto
             reduction = initial_anxiety - current_anxiety
             
             print(f"  Ansiedad actual: {current_anxiety:.1f}% "
@@ -195,11 +520,20 @@ class BreathingExercise478:
             if reduction > 0:
                 print(f"  ¡Bien! La ansiedad está bajando")
             
-            time.sleep(2)  # Pausa entre ciclos
+            if num_cycles >= self.min_cycles:
+                reduction_percent = (reduction / initial_anxiety * 100) if initial_anxiety > 0 else 0
+                if reduction_percent >= self.goal_reduction_percent:
+                    print("  Objetivo alcanzado")
+                    break
+                if reduction > 0 and trend >= 0:
+                    print("  La ansiedad se ha estabilizado")
+                    break
+            
+            self._phase(2)  # Pausa entre ciclos (la ventana sigue actualizándose)
         
         # Medir ansiedad final
         print("\n  Midiendo nivel de ansiedad final...")
-        final_anxiety = self._measure_current_anxiety(duration=10)
+        final_anxiety = self._measure_anxiety(10)
         total_reduction = initial_anxiety - final_anxiety
         reduction_percent = (total_reduction / initial_anxiety * 100) if initial_anxiety > 0 else 0
         
@@ -212,13 +546,10 @@ class BreathingExercise478:
             'reduction_percent': reduction_percent,
             'num_cycles': num_cycles,
             'timeline': self.emotion_timeline,
-            'timestamps': self.timestamps,
+            'timestamps': self.emotion_timeline.timestamps,
             'success': total_reduction > 0
         }
         
-        # Mostrar resumen
-        self._show_results(results)
-        
         return results
     
     def _breathing_cycle(self):
@@ -230,82 +561,34 @@ class BreathingExercise478:
         ]
         
         for phase_name, duration, color in phases:
-            start_time = time.time()
-            
-            while time.time() - start_time < duration:
-                ret, frame = self.parent.camera.read()
-                if not ret:
-                    continue
-                
-                # Procesar emociones
-                frame = self.parent.emotion_system.frame_processing(frame)
-                
-                # Calcular tiempo restante
-                elapsed = time.time() - start_time
-                remaining = duration - elapsed
-                
-                # Dibujar instrucciones grandes
-                cv2.rectangle(frame, (0, 0), (frame.shape[1], 150), (0, 0, 0), -1)
-                
-                cv2.putText(frame, phase_name, 
-                           (50, 80), cv2.FONT_HERSHEY_SIMPLEX, 
-                           2.5, color, 4, cv2.LINE_AA)
-                
-                cv2.putText(frame, f"{remaining:.1f}s", 
-                           (50, 130), cv2.FONT_HERSHEY_SIMPLEX, 
-                           1.5, (255, 255, 255), 3, cv2.LINE_AA)
-                
-                # Barra de progreso
-                progress = elapsed / duration
-                bar_width = int(progress * (frame.shape[1] - 100))
-                cv2.rectangle(frame, (50, 140), (50 + bar_width, 160), color, -1)
-                cv2.rectangle(frame, (50, 140), (frame.shape[1] - 50, 160), (255, 255, 255), 2)
-                
-                cv2.imshow('Ejercicio de Respiracion', frame)
-                cv2.waitKey(1)
+            self._phase(duration, self._breathing_overlay(phase_name, duration, color))
     
-    def _measure_current_anxiety(self, duration=10):
-        """
-        Mide nivel promedio de ansiedad durante X segundos.
-        
-        Args:
-            duration: Segundos de medición
+    def _breathing_overlay(self, phase_name, duration, color):
+        """Devuelve la función que dibuja las instrucciones de una fase"""
+        def overlay(frame, elapsed, remaining):
+            # Dibujar instrucciones grandes
+            cv2.rectangle(frame, (0, 0), (frame.shape[1], 150), (0, 0, 0), -1)
             
-        Returns:
-            float: Nivel promedio de ansiedad
-        """
-        anxiety_samples = []
-        start_time = time.time()
-        
-        while time.time() - start_time < duration:
-            ret, frame = self.parent.camera.read()
-            if not ret:
-                continue
+            cv2.putText(frame, phase_name, 
+                       (50, 80), cv2.FONT_HERSHEY_SIMPLEX, 
+                       2.5, color, 4, cv2.LINE_AA)
             
-            # Procesar frame
-            frame = self.parent.emotion_system.frame_processing(frame)
+            cv2.putText(frame, f"{remaining:.1f}s", 
+                       (50, 130), cv2.FONT_HERSHEY_SIMPLEX, 
+                       1.5, (255, 255, 255), 3, cv2.LINE_AA)
             
-            # Obtener nivel de miedo (proxy de ansiedad)
-            try:
-                emotions = self.parent.emotion_system.emotions_recognition.last_emotions
-                anxiety = emotions.get('fear', 0)
-                anxiety_samples.append(anxiety)
-                
-                # Guardar en timeline
-                self.emotion_timeline.append(emotions.copy())
-                self.timestamps.append(time.time())
-            except:
-                pass
+            # Ansiedad en vivo (EWMA de los últimos segundos)
+            cv2.putText(frame, f"Ansiedad: {self.live_stats.ewma('fear'):.0f}%", 
+                       (frame.shape[1] - 260, 130), cv2.FONT_HERSHEY_SIMPLEX, 
+                       0.8, (255, 255, 255), 2, cv2.LINE_AA)
             
-            # Mostrar medición en progreso
-            remaining = int(duration - (time.time() - start_time))
-            cv2.putText(frame, f"Midiendo... {remaining}s", 
-                       (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 
-                       1, (255, 255, 0), 2)
-            cv2.imshow('Ejercicio de Respiracion', frame)
-            cv2.waitKey(1)
+            # Barra de progreso
+            progress = elapsed / duration
+            bar_width = int(progress * (frame.shape[1] - 100))
+            cv2.rectangle(frame, (50, 140), (50 + bar_width, 160), color, -1)
+            cv2.rectangle(frame, (50, 140), (frame.shape[1] - 50, 160), (255, 255, 255), 2)
         
-        return np.mean(anxiety_samples) if anxiety_samples else 0
+        return overlay
     
     def _show_results(self, results):
         """
@@ -350,8 +633,8 @@ class BreathingExercise478:
         Args:
             results: Diccionario con resultados
         """
-        fear_values = [e.get('fear', 0) for e in results['timeline']]
-        time_points = [(t - results['timestamps'][0]) / 60 for t in results['timestamps']]
+        fear_values = results['timeline']['fear']
+        time_points = (results['timestamps'] - results['timestamps'][0]) / 60
         
         plt.figure(figsize=(10, 6))
         plt.plot(time_points, fear_values, 'b-', linewidth=2, label='Nivel de Ansiedad')
@@ -376,7 +659,7 @@ class BreathingExercise478:
         print(f"\n  Gráfico guardado en: {filename}")
 
 
-class GroundingExercise54321:
+class GroundingExercise54321(GuidedExercise):
     """
     Técnica de Grounding 5-4-3-2-1
     
@@ -400,6 +683,8 @@ class GroundingExercise54321:
     - Identifica qué sentidos son más efectivos
     """
     
+    window_name = 'Grounding Exercise'
+    
     def __init__(self, parent):
         """
         Inicializa el ejercicio.
@@ -407,22 +692,14 @@ class GroundingExercise54321:
         Args:
             parent: Instancia de TherapeuticExercises
         """
-        self.parent = parent
+        super().__init__(parent)
         self.name = "Grounding 5-4-3-2-1"
         self.duration = 8
         self.indications = "Ataques de pánico, disociación, ansiedad aguda"
         self.goal = "Reducir ansiedad y volver al presente"
-        
-        self.emotion_timeline = []
-        self.timestamps = []
     
-    def run(self):
-        """
-        Ejecuta ejercicio de grounding con monitoreo.
-        
-        Returns:
-            dict: Resultados del ejercicio
-        """
+    def _run(self):
+        """Flujo del ejercicio de grounding con monitoreo"""
         print("=" * 60)
         print("EJERCICIO: GROUNDING 5-4-3-2-1")
         print("=" * 60)
@@ -431,10 +708,6 @@ class GroundingExercise54321:
         
         input("Presione ENTER para comenzar...")
         
-        # Reiniciar datos
-        self.emotion_timeline = []
-        self.timestamps = []
-        
         # Medir ansiedad inicial
         initial_anxiety = self._measure_anxiety(10)
         print(f"\n  Ansiedad inicial: {initial_anxiety:.1f}%")
@@ -487,11 +760,10 @@ class GroundingExercise54321:
             'anxiety_per_step': anxiety_per_step,
             'step_data': step_data,
             'timeline': self.emotion_timeline,
-            'timestamps': self.timestamps,
+            'timestamps': self.emotion_timeline.timestamps,
             'success': total_reduction > 0
         }
         
-        self._show_results(results)
         return results
     
     def _measure_anxiety(self, duration):
@@ -504,33 +776,8 @@ class GroundingExercise54321:
         Returns:
             float: Nivel promedio de ansiedad
         """
-        anxiety_samples = []
-        start_time = time.time()
-        
         print(f"     Midiendo nivel de ansiedad ({duration}s)...")
-        
-        while time.time() - start_time < duration:
-            ret, frame = self.parent.camera.read()
-            if not ret:
-                continue
-            
-            # Procesar frame
-            frame = self.parent.emotion_system.frame_processing(frame)
-            
-            try:
-                emotions = self.parent.emotion_system.emotions_recognition.last_emotions
-                anxiety = emotions.get('fear', 0)
-                anxiety_samples.append(anxiety)
-                
-                self.emotion_timeline.append(emotions.copy())
-                self.timestamps.append(time.time())
-            except:
-                pass
-            
-            cv2.imshow('Grounding Exercise', frame)
-            cv2.waitKey(1)
-        
-        return np.mean(anxiety_samples) if anxiety_samples else 0
+        return super()._measure_anxiety(duration)
     
     def _show_results(self, results):
         """
@@ -563,7 +810,7 @@ class GroundingExercise54321:
             print("  Considere repetir o probar otra técnica")
 
 
-class ProgressiveRelaxation:
+class ProgressiveRelaxation(GuidedExercise):
     """
     Relajación Muscular Progresiva (Jacobson)
     
@@ -579,8 +826,10 @@ class ProgressiveRelaxation:
     - Preparar para dormir
     """
     
+    window_name = 'Relajacion Progresiva'
+    
     def __init__(self, parent):
-        self.parent = parent
+        super().__init__(parent)
         self.name = "Relajación Muscular Progresiva"
         self.duration = 15
         self.indications = "Tensión muscular, ansiedad, estrés crónico"
@@ -598,17 +847,9 @@ class ProgressiveRelaxation:
             ("Hombros", "Suba los hombros hacia las orejas"),
             ("Cara", "Arrugue toda la cara")
         ]
-        
-        self.emotion_timeline = []
-        self.timestamps = []
     
-    def run(self):
-        """
-        Ejecuta la relajación progresiva.
-        
-        Returns:
-            dict: Resultados del ejercicio
-        """
+    def _run(self):
+        """Flujo de la relajación progresiva"""
         print("=" * 60)
         print("EJERCICIO: RELAJACIÓN MUSCULAR PROGRESIVA")
         print("=" * 60)
@@ -619,10 +860,6 @@ class ProgressiveRelaxation:
         
         input("Presione ENTER para comenzar...")
         
-        # Reiniciar datos
-        self.emotion_timeline = []
-        self.timestamps = []
-        
         # Medir ansiedad inicial
         initial_anxiety = self._measure_anxiety(10)
         print(f"\n  Ansiedad inicial: {initial_anxiety:.1f}%")
@@ -651,11 +888,10 @@ class ProgressiveRelaxation:
             'reduction_percent': (total_reduction / initial_anxiety * 100) if initial_anxiety > 0 else 0,
             'muscle_groups_completed': len(self.muscle_groups),
             'timeline': self.emotion_timeline,
-            'timestamps': self.timestamps,
+            'timestamps': self.emotion_timeline.timestamps,
             'success': total_reduction > 0
         }
         
-        self._show_results(results)
         return results
     
     def _show_phase(self, phase_name, muscle, duration, color):
@@ -668,56 +904,14 @@ class ProgressiveRelaxation:
             duration: Duración en segundos
             color: Color BGR para la visualización
         """
-        start_time = time.time()
-        
-        while time.time() - start_time < duration:
-            ret, frame = self.parent.camera.read()
-            if not ret:
-                continue
-            
-            frame = self.parent.emotion_system.frame_processing(frame)
-            
-            # Registrar emociones
-            try:
-                emotions = self.parent.emotion_system.emotions_recognition.last_emotions
-                self.emotion_timeline.append(emotions.copy())
-                self.timestamps.append(time.time())
-            except:
-                pass
-            
-            # Overlay
-            remaining = int(duration - (time.time() - start_time))
+        def overlay(frame, elapsed, remaining):
             cv2.rectangle(frame, (0, 0), (frame.shape[1], 100), (0, 0, 0), -1)
             cv2.putText(frame, f"{phase_name}: {muscle}", 
                        (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.5, color, 3)
-            cv2.putText(frame, f"{remaining}s", 
+            cv2.putText(frame, f"{int(remaining)}s", 
                        (50, 90), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-            
-            cv2.imshow('Relajacion Progresiva', frame)
-            cv2.waitKey(1)
-    
-    def _measure_anxiety(self, duration):
-        """Mide ansiedad promedio."""
-        anxiety_samples = []
-        start_time = time.time()
         
-        while time.time() - start_time < duration:
-            ret, frame = self.parent.camera.read()
-            if not ret:
-                continue
-            
-            frame = self.parent.emotion_system.frame_processing(frame)
-            
-            try:
-                emotions = self.parent.emotion_system.emotions_recognition.last_emotions
-                anxiety_samples.append(emotions.get('fear', 0))
-            except:
-                pass
-            
-            cv2.imshow('Relajacion Progresiva', frame)
-            cv2.waitKey(1)
-        
-        return np.mean(anxiety_samples) if anxiety_samples else 0
+        self._phase(duration, overlay)
     
     def _show_results(self, results):
         """Muestra resultados del ejercicio."""
@@ -736,7 +930,7 @@ class ProgressiveRelaxation:
             print("\n  Practique regularmente para mejores resultados")
 
 
-class MindfulnessBreathing:
+class MindfulnessBreathing(GuidedExercise):
     """
     Respiración Consciente (Mindfulness)
     
@@ -752,23 +946,17 @@ class MindfulnessBreathing:
     - Reducir estrés crónico
     """
     
+    window_name = 'Mindfulness'
+    
     def __init__(self, parent):
-        self.parent = parent
+        super().__init__(parent)
         self.name = "Respiración Consciente (Mindfulness)"
         self.duration = 5
         self.indications = "Estrés, rumiación, dificultad de concentración"
         self.goal = "Desarrollar atención plena y calma"
-        
-        self.emotion_timeline = []
-        self.timestamps = []
     
-    def run(self):
-        """
-        Ejecuta la práctica de mindfulness.
-        
-        Returns:
-            dict: Resultados del ejercicio
-        """
+    def _run(self):
+        """Flujo de la práctica de mindfulness"""
         print("=" * 60)
         print("EJERCICIO: RESPIRACIÓN CONSCIENTE (MINDFULNESS)")
         print("=" * 60)
@@ -781,38 +969,18 @@ class MindfulnessBreathing:
         duration_seconds = self.duration * 60  # Convertir a segundos
         input(f"La práctica durará {self.duration} minutos. Presione ENTER para comenzar...")
         
-        # Reiniciar datos
-        self.emotion_timeline = []
-        self.timestamps = []
-        
-        # Medir estado inicial
-        initial_anxiety = self._measure_anxiety(10)
-        initial_happiness = self._measure_happiness(5)
+        # Medir estado inicial (ansiedad y bienestar en la misma ventana)
+        initial = self._measure(10)
+        initial_anxiety = initial['fear']
+        initial_happiness = initial['happy']
         print(f"\n  Ansiedad inicial: {initial_anxiety:.1f}%")
         print(f"  Bienestar inicial: {initial_happiness:.1f}%")
         
         print("\n  Comenzando práctica de mindfulness...")
         
         # Práctica principal
-        start_time = time.time()
-        
-        while time.time() - start_time < duration_seconds:
-            ret, frame = self.parent.camera.read()
-            if not ret:
-                continue
-            
-            frame = self.parent.emotion_system.frame_processing(frame)
-            
-            try:
-                emotions = self.parent.emotion_system.emotions_recognition.last_emotions
-                self.emotion_timeline.append(emotions.copy())
-                self.timestamps.append(time.time())
-            except:
-                pass
-            
+        def overlay(frame, elapsed, remaining):
             # Mostrar tiempo restante y recordatorios suaves
-            elapsed = time.time() - start_time
-            remaining = duration_seconds - elapsed
             remaining_min = int(remaining // 60)
             remaining_sec = int(remaining % 60)
             
@@ -821,17 +989,17 @@ class MindfulnessBreathing:
                        (50, 35), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
             cv2.putText(frame, f"Tiempo restante: {remaining_min}:{remaining_sec:02d}", 
                        (50, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-            
-            cv2.imshow('Mindfulness', frame)
-            
-            # Permitir salir con ESC
-            if cv2.waitKey(1) == 27:
-                break
+        
+        # Permitir salir con ESC
+        start_time = time.monotonic()
+        self._phase(duration_seconds, overlay, allow_escape=True)
+        duration_completed = time.monotonic() - start_time
         
         # Medir estado final
         print("\n  Midiendo estado final...")
-        final_anxiety = self._measure_anxiety(10)
-        final_happiness = self._measure_happiness(5)
+        final = self._measure(10)
+        final_anxiety = final['fear']
+        final_happiness = final['happy']
         
         results = {
             'exercise': 'mindfulness_breathing',
@@ -841,61 +1009,14 @@ class MindfulnessBreathing:
             'final_happiness': final_happiness,
             'anxiety_reduction': initial_anxiety - final_anxiety,
             'happiness_increase': final_happiness - initial_happiness,
-            'duration_completed': time.time() - start_time,
+            'duration_completed': duration_completed,
             'timeline': self.emotion_timeline,
-            'timestamps': self.timestamps,
+            'timestamps': self.emotion_timeline.timestamps,
             'success': (initial_anxiety - final_anxiety) > 0 or (final_happiness - initial_happiness) > 0
         }
         
-        self._show_results(results)
         return results
     
-    def _measure_anxiety(self, duration):
-        """Mide ansiedad promedio."""
-        samples = []
-        start_time = time.time()
-        
-        while time.time() - start_time < duration:
-            ret, frame = self.parent.camera.read()
-            if not ret:
-                continue
-            
-            frame = self.parent.emotion_system.frame_processing(frame)
-            
-            try:
-                emotions = self.parent.emotion_system.emotions_recognition.last_emotions
-                samples.append(emotions.get('fear', 0))
-            except:
-                pass
-            
-            cv2.imshow('Mindfulness', frame)
-            cv2.waitKey(1)
-        
-        return np.mean(samples) if samples else 0
-    
-    def _measure_happiness(self, duration):
-        """Mide felicidad promedio."""
-        samples = []
-        start_time = time.time()
-        
-        while time.time() - start_time < duration:
-            ret, frame = self.parent.camera.read()
-            if not ret:
-                continue
-            
-            frame = self.parent.emotion_system.frame_processing(frame)
-            
-            try:
-                emotions = self.parent.emotion_system.emotions_recognition.last_emotions
-                samples.append(emotions.get('happy', 0))
-            except:
-                pass
-            
-            cv2.imshow('Mindfulness', frame)
-            cv2.waitKey(1)
-        
-        return np.mean(samples) if samples else 0
-    
     def _show_results(self, results):
         """Muestra resultados del ejercicio."""
         cv2.destroyAllWindows()
@@ -1,13 +1,73 @@
 # Dashboard visual para que el terapeuta analice sesiones
 # Usa Tkinter para la interfaz y Matplotlib para gráficos
 
-import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import tkinter as tk
 from tkinter import ttk
 import numpy as np
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from therapy_tools.charts import (
+    EMOTION_COLORS, EMOTION_NAMES_ES, ChartCache, default_chart_cache_dir,
+    session_comparison_figure, session_summary_figure
+)
+from therapy_tools.event_detection import CROSSING, detect_events
+from therapy_tools.live_feed import EmotionBus
+from therapy_tools.live_plot import LivePlot
+
+
+class _PagedTreeview:
+    """
+    Carga las filas de un Treeview por páginas a medida que se desplaza.
+    
+    Solo se consulta la página siguiente cuando la barra de desplazamiento
+    se acerca al final, así que la ventana abre en tiempo constante aunque
+    el paciente tenga cientos de sesiones.
+    """
+    
+    def __init__(self, tree, scrollbar, fetch_page, format_row, threshold=0.9):
+        """
+        Args:
+            tree: ttk.Treeview donde insertar las filas
+            scrollbar: Barra de desplazamiento vertical del Treeview
+            fetch_page: Función fetch_page(cursor) -> (filas, cursor siguiente o None)
+            format_row: Función que convierte una fila en los valores del Treeview
+            threshold: Fracción desplazada a partir de la cual se carga otra página
+        """
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.fetch_page = fetch_page
+        self.format_row = format_row
+        self.threshold = threshold
+        
+        self._cursor = None
+        self._exhausted = False
+        self._pending = False
+        
+        tree.configure(yscrollcommand=self._on_scroll)
+        scrollbar.configure(command=tree.yview)
+        self.load_more()
+    
+    def load_more(self):
+        """Inserta la página siguiente (si queda alguna)"""
+        self._pending = False
+        if self._exhausted:
+            return
+        rows, self._cursor = self.fetch_page(self._cursor)
+        self._exhausted = self._cursor is None
+        for row in rows:
+            self.tree.insert('', 'end', values=self.format_row(row))
+    
+    def _on_scroll(self, first, last):
+        """Actualiza la barra y pide otra página cerca del final"""
+        self.scrollbar.set(first, last)
+        if not self._exhausted and not self._pending and float(last) >= self.threshold:
+            self._pending = True
+            self.tree.after_idle(self.load_more)
+
 
 class TherapistDashboard:
     """
@@ -20,43 +80,53 @@ class TherapistDashboard:
     - Identificación rápida de momentos críticos
     - Comparación visual entre sesiones
     - Reportes profesionales
+    
+    Carga de datos:
+    - Las consultas y la agregación con NumPy se ejecutan en un pool de
+      hilos; el hilo de Tk solo dibuja y consulta el resultado con after()
+    - Los resultados se guardan en una caché LRU con la versión de los
+      datos (get_session_version): reabrir una sesión o alternar entre
+      comparaciones es inmediato y nunca muestra datos desactualizados
     """
     
-    def __init__(self, database):
+    def __init__(self, database, workers=2, cache_size=32, poll_ms=50, chart_cache_dir=None):
         """
         Inicializa el dashboard.
         
         Args:
             database: Instancia de SessionDatabase
+            workers: Hilos para cargar datos fuera de la interfaz
+            cache_size: Resultados guardados en la caché LRU
+            poll_ms: Intervalo para comprobar si una carga terminó
+            chart_cache_dir: Directorio de la caché de gráficos en PNG
+                             (None = junto al archivo de la base de datos)
         """
         self.db = database
         self.window = None
+        self._stop_live = None  # Cancela el monitor en vivo activo
         
-        # Colores de emociones (mismo que el sistema de visualización)
-        self.emotion_colors = {
-            'happy': '#1B97EF',     # Azul
-            'sad': '#BA7704',       # Marrón/Naranja
-            'angry': '#2332DC',     # Azul oscuro
-            'fear': '#80258E',      # Púrpura
-            'surprise': '#B8B753',  # Amarillo/Verde
-            'disgust': '#4FA424'    # Verde
-        }
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dashboard')
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_size = cache_size
+        self.poll_ms = poll_ms
+        self._view = 0  # Se incrementa con cada ventana; descarta cargas obsoletas
         
-        # Nombres en español de las emociones
-        self.emotion_names_es = {
-            'happy': 'Felicidad',
-            'sad': 'Tristeza',
-            'angry': 'Enojo',
-            'fear': 'Miedo',
-            'surprise': 'Sorpresa',
-            'disgust': 'Disgusto'
-        }
+        # Colores y nombres en español de las emociones (ver charts.py)
+        self.emotion_colors = dict(EMOTION_COLORS)
+        self.emotion_names_es = dict(EMOTION_NAMES_ES)
+        
+        # Gráficos de resumen ya dibujados, en disco
+        self.chart_cache = ChartCache(chart_cache_dir or default_chart_cache_dir(database))
     
     def _create_window(self, title="Dashboard Terapéutico", size="1200x800"):
         """Crea o recrea la ventana principal"""
+        if self._stop_live:
+            self._stop_live()
         if self.window:
             self.window.destroy()
         
+        self._view += 1
         self.window = tk.Tk()
         self.window.title(title)
         self.window.geometry(size)
@@ -72,68 +142,77 @@ class TherapistDashboard:
         - Momentos críticos (cuando ansiedad/tristeza fueron altas)
         - Duración total y fecha
         
+        El gráfico se guarda como PNG en chart_cache: reabrir una sesión que
+        no ha cambiado solo carga la imagen.
+        
         Args:
             session_id: ID de la sesión a visualizar
         """
         self._create_window("Resumen de Sesión - Dashboard Terapéutico")
         
-        # Obtener datos de la sesión
-        emotions_data = self.db.get_session_emotions(session_id)
+        self._load_async(
+            ('session_summary', session_id),
+            lambda: self.db.get_session_version(session_id),
+            lambda: self._load_session_summary(session_id),
+            self._render_session_summary
+        )
+    
+    def _load_session_summary(self, session_id):
+        """
+        Lee y agrega los datos de una sesión (se ejecuta en el pool).
         
-        if not emotions_data:
+        Returns:
+            dict: Arrays y estadísticas para dibujar, o None si no hay datos
+        """
+        timestamps, scores = self.db.get_session_emotions_array(session_id)
+        if len(timestamps) == 0:
+            return None
+        
+        emotion_names = ['happy', 'sad', 'angry', 'fear', 'surprise', 'disgust']
+        emotion_avgs = scores.mean(axis=0)
+        
+        # Momentos críticos: cruces del umbral de ansiedad guardados al ingerir
+        # los snapshots. Las sesiones anteriores a session_events no tienen
+        # eventos: se detectan sobre el timeline ya cargado.
+        events = self.db.get_session_events(session_id)
+        if not events:
+            events = detect_events(timestamps, scores)
+        critical_moments = [event[2] for event in events
+                            if event[0] == CROSSING and event[1] == 'fear']
+        
+        return {
+            'timestamps': timestamps,
+            'emotions': {e: scores[:, i] for i, e in enumerate(emotion_names)},
+            'emotion_names': emotion_names,
+            'emotion_avgs': [float(v) for v in emotion_avgs],
+            'critical_moments': critical_moments,
+            'chart_path': self.chart_cache.session_summary_png(self.db, session_id, (timestamps, scores))
+        }
+    
+    def _render_session_summary(self, data):
+        """Dibuja el resumen de una sesión (hilo de Tk)"""
+        if data is None:
             tk.Label(self.window, text="No hay datos para esta sesión", 
                     font=('Arial', 14)).pack(pady=50)
             return
         
-        # Preparar datos para graficar
-        timestamps = [row[0] for row in emotions_data]  # Segundos desde inicio
-        emotions = {
-            'happy': [row[1] for row in emotions_data],
-            'sad': [row[2] for row in emotions_data],
-            'angry': [row[3] for row in emotions_data],
-            'fear': [row[4] for row in emotions_data],
-            'surprise': [row[5] for row in emotions_data],
-            'disgust': [row[6] for row in emotions_data]
-        }
-        
-        # Crear figura de Matplotlib
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
-        
-        # Gráfico 1: Líneas temporales de todas las emociones
-        for emotion, values in emotions.items():
-            ax1.plot(timestamps, values, 
-                    label=self.emotion_names_es[emotion], 
-                    color=self.emotion_colors[emotion],
-                    linewidth=2)
-        
-        ax1.set_xlabel('Tiempo (segundos)', fontsize=12)
-        ax1.set_ylabel('Intensidad (%)', fontsize=12)
-        ax1.set_title('Evolución Emocional Durante la Sesión', fontsize=14, fontweight='bold')
-        ax1.legend(loc='upper right')
-        ax1.grid(True, alpha=0.3)
-        ax1.set_ylim(0, 100)
-        
-        # Gráfico 2: Promedios por emoción (barras)
-        emotion_names = list(emotions.keys())
-        emotion_avgs = [np.mean(values) for values in emotions.values()]
-        colors = [self.emotion_colors[e] for e in emotion_names]
-        
-        ax2.bar([self.emotion_names_es[e] for e in emotion_names], 
-               emotion_avgs, color=colors, alpha=0.7)
-        ax2.set_ylabel('Intensidad Promedio (%)', fontsize=12)
-        ax2.set_title('Resumen: Emociones Promedio de la Sesión', fontsize=14, fontweight='bold')
-        ax2.set_ylim(0, 100)
-        
-        # Agregar valores sobre las barras
-        for i, v in enumerate(emotion_avgs):
-            ax2.text(i, v + 2, f'{v:.1f}%', ha='center', fontweight='bold')
-        
-        plt.tight_layout()
-        
-        # Integrar gráfico en Tkinter
-        canvas = FigureCanvasTkAgg(fig, master=self.window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        timestamps = data['timestamps']
+        emotions = data['emotions']
+        emotion_names = data['emotion_names']
+        emotion_avgs = data['emotion_avgs']
+        
+        # Gráfico ya rasterizado (caché en disco); si la imagen no se puede
+        # cargar, se dibuja la figura
+        try:
+            image = tk.PhotoImage(file=data['chart_path'])
+            chart = tk.Label(self.window, image=image)
+            chart.image = image  # Mantener la referencia
+            chart.pack(fill=tk.BOTH, expand=True)
+        except (tk.TclError, TypeError):
+            fig = session_summary_figure(timestamps, np.column_stack(list(emotions.values())))
+            canvas = FigureCanvasTkAgg(fig, master=self.window)
+            canvas.draw()
+            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
         
         # Panel de estadísticas
         stats_frame = tk.Frame(self.window, bg='#f0f0f0', padx=20, pady=10)
@@ -144,9 +223,9 @@ class TherapistDashboard:
         dominant_idx = emotion_avgs.index(dominant_emotion_value)
         dominant_name = emotion_names[dominant_idx]
         
-        fear_avg = np.mean(emotions['fear'])
-        sad_avg = np.mean(emotions['sad'])
-        happy_avg = np.mean(emotions['happy'])
+        fear_avg = emotion_avgs[emotion_names.index('fear')]
+        sad_avg = emotion_avgs[emotion_names.index('sad')]
+        happy_avg = emotion_avgs[emotion_names.index('happy')]
         wellbeing_score = happy_avg - (fear_avg + sad_avg) / 2
         
         # Mostrar estadísticas
@@ -158,17 +237,21 @@ class TherapistDashboard:
                 text=f"Índice de Bienestar: {wellbeing_score:.1f}% (felicidad - ansiedad/tristeza)",
                 font=('Arial', 11), bg='#f0f0f0').pack(anchor='w')
         
-        duration_min = timestamps[-1] // 60 if timestamps else 0
-        duration_sec = timestamps[-1] % 60 if timestamps else 0
+        duration_min = int(timestamps[-1]) // 60
+        duration_sec = int(timestamps[-1]) % 60
         tk.Label(stats_frame, 
                 text=f"Duración: {duration_min} minutos {duration_sec} segundos",
                 font=('Arial', 11), bg='#f0f0f0').pack(anchor='w')
         
-        # Identificar momentos críticos (ansiedad > 70%)
-        critical_moments = [t for t, f in zip(timestamps, emotions['fear']) if f > 70]
+        # Momentos críticos (la ansiedad superó el 70%)
+        critical_moments = data['critical_moments']
         if critical_moments:
+            times = ', '.join(f"{int(offset) // 60:02d}:{int(offset) % 60:02d}"
+                              for offset in critical_moments[:5])
+            if len(critical_moments) > 5:
+                times += ', ...'
             tk.Label(stats_frame, 
-                    text=f"Momentos de Alta Ansiedad: {len(critical_moments)} detectados",
+                    text=f"Momentos de Alta Ansiedad: {len(critical_moments)} detectados ({times})",
                     font=('Arial', 11), bg='#f0f0f0', fg='red').pack(anchor='w')
     
     def compare_sessions(self, session_id1, session_id2):
@@ -186,42 +269,42 @@ class TherapistDashboard:
         """
         self._create_window("Comparación de Sesiones - Dashboard Terapéutico")
         
-        # Obtener datos de ambas sesiones
-        data1 = self.db.get_session_emotions(session_id1)
-        data2 = self.db.get_session_emotions(session_id2)
+        self._load_async(
+            ('compare', session_id1, session_id2),
+            lambda: (self.db.get_session_version(session_id1),
+                     self.db.get_session_version(session_id2)),
+            lambda: (self._load_session_averages(session_id1),
+                     self._load_session_averages(session_id2)),
+            self._render_comparison
+        )
+    
+    def _load_session_averages(self, session_id):
+        """
+        Promedios de emociones de una sesión (se ejecuta en el pool).
         
-        if not data1 or not data2:
+        Returns:
+            dict: Promedio por emoción, o None si la sesión no tiene datos
+        """
+        _, scores = self.db.get_session_emotions_array(session_id)
+        if len(scores) == 0:
+            return None
+        means = scores.mean(axis=0)
+        return {e: float(means[i])
+                for i, e in enumerate(['happy', 'sad', 'angry', 'fear', 'surprise', 'disgust'])}
+    
+    def _render_comparison(self, averages):
+        """Dibuja la comparación de dos sesiones (hilo de Tk)"""
+        emotions1, emotions2 = averages
+        
+        if not emotions1 or not emotions2:
             tk.Label(self.window, text="No hay datos suficientes para comparar",
                     font=('Arial', 14)).pack(pady=50)
             return
         
-        # Calcular promedios
-        emotions1 = self._calculate_averages(data1)
-        emotions2 = self._calculate_averages(data2)
+        emotion_names = list(emotions1.keys())
         
         # Crear gráfico comparativo
-        fig, ax = plt.subplots(figsize=(10, 6))
-        
-        emotion_names = list(emotions1.keys())
-        x = np.arange(len(emotion_names))
-        width = 0.35
-        
-        bars1 = ax.bar(x - width/2, 
-                      [emotions1[e] for e in emotion_names], 
-                      width, label='Sesión Anterior', alpha=0.8)
-        bars2 = ax.bar(x + width/2, 
-                      [emotions2[e] for e in emotion_names], 
-                      width, label='Sesión Actual', alpha=0.8)
-        
-        ax.set_ylabel('Intensidad Promedio (%)')
-        ax.set_title('Comparación Entre Sesiones', fontweight='bold')
-        ax.set_xticks(x)
-        ax.set_xticklabels([self.emotion_names_es[e] for e in emotion_names])
-        ax.legend()
-        ax.grid(True, alpha=0.3, axis='y')
-        ax.set_ylim(0, 100)
-        
-        plt.tight_layout()
+        fig = session_comparison_figure(emotions1, emotions2)
         
         canvas = FigureCanvasTkAgg(fig, master=self.window)
         canvas.draw()
@@ -248,34 +331,12 @@ class TherapistDashboard:
                     text=f"  {self.emotion_names_es[emotion]}: {arrow}{change:.1f}%",
                     font=('Arial', 11), bg='#f0f0f0', fg=color).pack(anchor='w')
     
-    def _calculate_averages(self, emotion_data):
-        """
-        Calcula promedios de emociones desde datos de sesión.
-        
-        Args:
-            emotion_data: Lista de tuplas con datos de emociones
-            
-        Returns:
-            dict: Diccionario con promedios de cada emoción
-        """
-        if not emotion_data:
-            return {e: 0 for e in ['happy', 'sad', 'angry', 'fear', 'surprise', 'disgust']}
-        
-        return {
-            'happy': np.mean([row[1] for row in emotion_data]),
-            'sad': np.mean([row[2] for row in emotion_data]),
-            'angry': np.mean([row[3] for row in emotion_data]),
-            'fear': np.mean([row[4] for row in emotion_data]),
-            'surprise': np.mean([row[5] for row in emotion_data]),
-            'disgust': np.mean([row[6] for row in emotion_data])
-        }
-    
     def show_patient_history(self, patient_id):
         """
         Muestra historial completo del paciente.
         
         ¿Qué muestra?
-        - Lista de todas las sesiones
+        - Lista de todas las sesiones (cargadas por páginas al desplazarse)
         - Gráfico de tendencia a largo plazo
         - Progreso general del tratamiento
         
@@ -284,7 +345,8 @@ class TherapistDashboard:
         """
         self._create_window(f"Historial del Paciente - Dashboard Terapéutico")
         
-        sessions = self.db.get_patient_sessions(patient_id, limit=20)
+        first_page = self.db.get_patient_sessions_page(patient_id)
+        sessions, _ = first_page
         
         if not sessions:
             tk.Label(self.window, text=f"No hay sesiones para el paciente {patient_id}",
@@ -313,7 +375,7 @@ class TherapistDashboard:
         tree.column('Duración', width=100)
         tree.column('Tipo', width=150)
         
-        for session in sessions:
+        def format_session(session):
             session_id, timestamp, duration, session_type, notes = session
             try:
                 date = datetime.fromisoformat(timestamp).strftime('%Y-%m-%d %H:%M')
@@ -321,9 +383,21 @@ class TherapistDashboard:
                 date = timestamp
             
             duration_min = duration // 60 if duration else 0
-            tree.insert('', 'end', values=(session_id, date, duration_min, session_type or 'N/A'))
-        
-        tree.pack(fill=tk.BOTH, expand=True, pady=10)
+            return (session_id, date, duration_min, session_type or 'N/A')
+        
+        def fetch_page(after):
+            # La primera página ya se leyó para comprobar si había sesiones
+            if after is None:
+                return first_page
+            return self.db.get_patient_sessions_page(patient_id, after=after)
+        
+        # Treeview con barra de desplazamiento que pide páginas al acercarse al final
+        table_frame = tk.Frame(main_frame)
+        table_frame.pack(fill=tk.BOTH, expand=True, pady=10)
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(in_=table_frame, side=tk.LEFT, fill=tk.BOTH, expand=True)
+        _PagedTreeview(tree, scrollbar, fetch_page, format_session)
         
         # Botones de acción
         button_frame = tk.Frame(main_frame)
@@ -349,8 +423,15 @@ class TherapistDashboard:
         """
         self._create_window("Resultados de Ejercicios - Dashboard Terapéutico")
         
-        exercises = self.db.get_patient_exercise_history(patient_id, limit=20)
-        
+        self._load_async(
+            ('exercises', patient_id),
+            lambda: self.db.get_exercise_version(patient_id),
+            lambda: self.db.get_patient_exercise_history(patient_id, limit=20),
+            lambda exercises: self._render_exercise_results(patient_id, exercises)
+        )
+    
+    def _render_exercise_results(self, patient_id, exercises):
+        """Dibuja la tabla de ejercicios (hilo de Tk)"""
         if not exercises:
             tk.Label(self.window, text="No hay ejercicios registrados",
                     font=('Arial', 14)).pack(pady=50)
@@ -389,7 +470,145 @@ class TherapistDashboard:
         
         tree.pack(fill=tk.BOTH, expand=True, pady=10)
     
+    def show_live_monitor(self, source, emotions=None, window_seconds=60, refresh_ms=100):
+        """
+        Muestra la traza en vivo de las emociones durante una sesión.
+        
+        ¿Por qué blitting?
+        - Redibujar la figura completa 10 veces por segundo congela Tk
+        - LivePlot dibuja ejes y leyenda una vez y solo actualiza las líneas
+        
+        Con un EmotionBus el dashboard abre su propia cola acotada y la vacía
+        en cada refresco: el bucle de captura nunca espera a Tk y, si Tk se
+        retrasa, se descartan las mediciones más antiguas.
+        
+        Args:
+            source: EmotionBus, o fuente de mediciones con subscribe(callback)
+                    y unsubscribe(callback), p. ej. un MeasurementEngine
+            emotions: Emociones a trazar (None = todas)
+            window_seconds: Segundos visibles
+            refresh_ms: Intervalo de actualización en milisegundos
+        """
+        self._create_window("Monitor en Vivo - Dashboard Terapéutico")
+        
+        capacity = max(600, window_seconds * 40)
+        plot = LivePlot(emotions or tuple(self.emotion_colors), window_seconds=window_seconds,
+                        capacity=capacity,
+                        figsize=(12, 6), colors=self.emotion_colors,
+                        labels=self.emotion_names_es,
+                        title='Evolución Emocional en Vivo')
+        plot.ax.set_xlabel('Tiempo (segundos)', fontsize=10)
+        plot.ax.set_ylabel('Intensidad (%)', fontsize=10)
+        
+        canvas = FigureCanvasTkAgg(plot.figure, master=self.window)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        
+        # Las mediciones llegan desde el hilo de la fuente; Tk solo redibuja
+        if isinstance(source, EmotionBus):
+            subscription = source.open(maxsize=capacity)
+            unsubscribe = subscription.close
+        else:
+            subscription = None
+            source.subscribe(plot)
+            unsubscribe = lambda: source.unsubscribe(plot)
+        window = self.window
+        state = {'job': None}
+        
+        def tick():
+            if subscription is not None:
+                for timestamp, values in subscription.drain():
+                    plot.append(timestamp, values)
+            plot.refresh(force=True)
+            state['job'] = window.after(refresh_ms, tick)
+        
+        def stop():
+            unsubscribe()
+            if state['job'] is not None:
+                window.after_cancel(state['job'])
+                state['job'] = None
+            self._stop_live = None
+        
+        def on_close():
+            stop()
+            window.destroy()
+            self.window = None
+        
+        self._stop_live = stop
+        window.protocol("WM_DELETE_WINDOW", on_close)
+        tick()
+    
+    def _load_async(self, key, get_version, load, render):
+        """
+        Carga datos en el pool de hilos y los dibuja al terminar.
+        
+        El hilo de Tk muestra "Cargando..." y comprueba el resultado con
+        after() cada poll_ms, sin bloquearse. Si la ventana cambió mientras
+        tanto, el resultado se descarta.
+        
+        Args:
+            key: Clave de caché (p. ej. ('session_summary', session_id))
+            get_version: Función que devuelve la versión actual de los datos
+            load: Función que lee y agrega los datos (en el pool)
+            render: Función que dibuja el resultado (en el hilo de Tk)
+        """
+        window = self.window
+        view = self._view
+        loading = tk.Label(window, text="Cargando...", font=('Arial', 14))
+        loading.pack(pady=50)
+        
+        future = self._executor.submit(self._cached_load, key, get_version, load)
+        
+        def poll():
+            if view != self._view:
+                return
+            if not future.done():
+                window.after(self.poll_ms, poll)
+                return
+            
+            loading.destroy()
+            try:
+                result = future.result()
+            except Exception as e:
+                tk.Label(window, text=f"Error cargando datos: {e}",
+                        font=('Arial', 12), fg='red').pack(pady=50)
+                return
+            render(result)
+        
+        window.after(self.poll_ms, poll)
+    
+    def _cached_load(self, key, get_version, load):
+        """
+        Devuelve el resultado cacheado si la versión de los datos no cambió.
+        
+        Se ejecuta en el pool: la versión se consulta allí también, así que
+        ni siquiera esa consulta bloquea la interfaz.
+        """
+        version = get_version()
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == version:
+                self._cache.move_to_end(key)
+                return cached[1]
+        
+        result = load()
+        
+        with self._cache_lock:
+            self._cache[key] = (version, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+    
+    def clear_cache(self):
+        """Vacía la caché de resultados"""
+        with self._cache_lock:
+            self._cache.clear()
+    
     def run(self):
         """Inicia la interfaz gráfica"""
         if self.window:
-            self.window.mainloop()
+            try:
+                self.window.mainloop()
+            finally:
+                self._executor.shutdown(wait=False)
@@ -0,0 +1,92 @@
+# Agregación de las emociones de cada frame en ventanas de tiempo fijas
+# Una fila por ventana (media, mínimo, máximo y frames válidos) para SessionDatabase
+
+import numpy as np
+
+from therapy_tools.session_database import EMOTION_COLUMNS
+
+
+class EmotionWindowAggregator:
+    """
+    Resume todos los frames de cada intervalo en una sola fila.
+    
+    ¿Por qué?
+    - TherapyVideoStream guardaba las puntuaciones de un único frame por
+      segundo y descartaba todos los demás
+    - Aquí cada frame procesado suma en acumuladores en memoria (suma,
+      mínimo, máximo y número de frames con rostro) y al cerrar la ventana
+      se entrega una fila con la media y el rango del intervalo
+    - Se escribe lo mismo en la base de datos (una fila por ventana) pero
+      la fila representa todos los frames, no uno al azar
+    - Las ventanas se alinean a múltiplos de interval desde el inicio de la
+      sesión; las ventanas sin rostro no producen fila
+      
+    Cada ventana es un diccionario con 'offset' (inicio en segundos),
+    'frame_count' y 'mean', 'min' y 'max' (diccionarios emoción -> valor).
+    """
+    
+    def __init__(self, interval=1.0, emotions=EMOTION_COLUMNS):
+        """
+        Inicializa el agregador.
+        
+        Args:
+            interval: Duración de cada ventana en segundos
+            emotions: Emociones a agregar
+        """
+        self.interval = interval
+        self.emotions = tuple(emotions)
+        self._window = None  # Índice de la ventana en curso
+        self._reset()
+    
+    def add(self, offset, emotions):
+        """
+        Añade las emociones de un frame.
+        
+        Args:
+            offset: Segundos desde el inicio de la sesión
+            emotions: Diccionario de puntuaciones, o None si el frame no tenía rostro
+            
+        Returns:
+            list: Ventanas terminadas antes de este frame (normalmente 0 o 1)
+        """
+        completed = []
+        window = int(offset // self.interval)
+        if window != self._window:
+            completed.extend(self.flush())
+            self._window = window
+        
+        if emotions is not None:
+            values = np.array([emotions.get(emotion, 0) for emotion in self.emotions], dtype=np.float64)
+            self._sum += values
+            np.minimum(self._min, values, out=self._min)
+            np.maximum(self._max, values, out=self._max)
+            self._count += 1
+        return completed
+    
+    def flush(self):
+        """
+        Cierra la ventana en curso (p. ej. al terminar la sesión).
+        
+        Returns:
+            list: La ventana cerrada, o lista vacía si no tenía frames válidos
+        """
+        completed = []
+        if self._count:
+            mean = self._sum / self._count
+            completed.append({
+                'offset': self._window * self.interval,
+                'frame_count': self._count,
+                'mean': dict(zip(self.emotions, mean.tolist())),
+                'min': dict(zip(self.emotions, self._min.tolist())),
+                'max': dict(zip(self.emotions, self._max.tolist()))
+            })
+        self._reset()
+        return completed
+    
+    def _reset(self):
+        """Vacía los acumuladores de la ventana"""
+        size = len(self.emotions)
+        self._sum = np.zeros(size)
+        self._min = np.full(size, np.inf)
+        self._max = np.full(size, -np.inf)
+        self._count = 0